@@ -1,6 +1,7 @@
 import os
 import sys
 import json
+import contextvars
 import cv2
 import numpy as np
 from dotenv import load_dotenv
@@ -22,19 +23,41 @@ def log(msg):
 sys.path.append(os.path.abspath("."))
 
 # ✅ Import modules
-from backend.ai.analyze.video_analysis import analyze_video
+from backend.ai.analyze import cpu_pool
 from backend.ai.analyze.rep_detection import detect_reps
 from backend.ai.analyze.exercise_prediction import predict_exercise
 from backend.ai.analyze.weight_estimation import estimate_weight_from_keyframes as estimate_weight
 from backend.ai.analyze.coaching_feedback import generate_feedback
 from backend.ai.analyze.result_packager import package_result
-from backend.ai.analyze.keyframe_collage import export_keyframe_collages
+from backend.ai.analyze.frame_quality import select_weight_keyframes
+from backend.ai.analyze.deadline import RequestDeadline
+from backend.ai.analyze.image_store import ImageStore
+from backend.utils import metrics
+from backend.ai.analyze.pose_classifier import (
+    classify_exercise_from_pose,
+    log_training_example,
+    POSE_CONFIDENCE_THRESHOLD,
+)
 
 # ✅ Core function to run analysis
-def run_cli_args(args):
+def run_cli_args(args, deadline=None, include_feedback=None):
+    """
+    Runs the full set pipeline: [video_path, user_provided_exercise?, known_exercise_info_json?].
+    `include_feedback` adds coaching feedback; it defaults to GYMVID_COACHING for the CLI.
+    """
+    if include_feedback is None:
+        include_feedback = INCLUDE_FEEDBACK
     if len(args) < 1:
         raise ValueError("No video path provided.")
 
+    # ✅ One deadline for the whole request, split across the model stages
+    if deadline is None:
+        stages = ["exercise_prediction", "weight_estimation"]
+        if include_feedback:
+            # Coaching runs last; without its own share it would only get what the others left over
+            stages.append("coaching_feedback")
+        deadline = RequestDeadline(stages=stages)
+
     video_path = args[0]
     user_provided_exercise = None
     known_exercise_info = None
@@ -49,20 +72,34 @@ def run_cli_args(args):
 
     # ✅ Run each stage
     log("📹 Analyzing video...")
-    video_data = analyze_video(video_path)
+    with metrics.timer("stage_latency_sec", stage="video_analysis"):
+        video_data = cpu_pool.analyze_video(video_path)
 
     log("🔁 Detecting reps...")
-    rep_data = detect_reps(video_data)
+    with metrics.timer("stage_latency_sec", stage="rep_detection"):
+        rep_data = detect_reps(video_data)
+
+    # ✅ Every image this request renders is encoded once and shared by all stages
+    image_store = ImageStore()
 
     log("🖼️ Creating keyframe collages...")
-    collage_paths = export_keyframe_collages(video_path, rep_data)
+    with metrics.timer("stage_latency_sec", stage="keyframe_collages"):
+        collage_paths = cpu_pool.export_collages(video_path, rep_data, image_store)
+
+    # ✅ Sharpest stationary-bar frames for weight estimation (falls back to raw keyframes)
+    try:
+        with metrics.timer("stage_latency_sec", stage="weight_keyframes"):
+            select_weight_keyframes(video_path, rep_data, image_store)
+    except Exception as e:
+        log(f"⚠️ Weight keyframe selection failed, using raw keyframes: {e}")
 
     # ✅ Decide exercise source
     if known_exercise_info:
         log(f"🔒 Using known exercise info from parent exercise: {known_exercise_info}")
         exercise_prediction = known_exercise_info
         movement_name = exercise_prediction.get("movement")
-        weight_prediction = estimate_weight("keyframes", movement_name)
+        weight_prediction = estimate_weight("keyframes", movement_name, deadline=deadline, image_store=image_store,
+                                            equipment=exercise_prediction.get("equipment"))
     elif user_provided_exercise:
         log(f"🏋️ Using manually provided exercise: {user_provided_exercise}")
         exercise_prediction = {
@@ -72,13 +109,20 @@ def run_cli_args(args):
             "confidence": 100
         }
         movement_name = user_provided_exercise
-        weight_prediction = estimate_weight("keyframes", movement_name)
+        weight_prediction = estimate_weight("keyframes", movement_name, deadline=deadline, image_store=image_store)
     else:
-        log("🧠 Predicting exercise type and estimating weight in parallel...")
-        with ThreadPoolExecutor() as executor:
-            future_exercise = executor.submit(predict_exercise, collage_paths[0])
-            # temporarily assign placeholder; will extract movement from exercise_prediction
-            exercise_prediction = future_exercise.result()
+        # ✅ Fast path: local pose-trajectory classifier, GPT only when it isn't confident
+        pose_prediction = classify_exercise_from_pose(video_data)
+        if pose_prediction and pose_prediction["confidence"] >= POSE_CONFIDENCE_THRESHOLD:
+            log(f"🦴 Using pose classifier prediction: {pose_prediction['movement']}")
+            exercise_prediction = pose_prediction
+        else:
+            log("🧠 Predicting exercise type and estimating weight in parallel...")
+            with ThreadPoolExecutor() as executor, metrics.timer("stage_latency_sec", stage="exercise_prediction"):
+                future_exercise = executor.submit(contextvars.copy_context().run, predict_exercise, collage_paths[0], deadline=deadline, image_store=image_store)
+                # temporarily assign placeholder; will extract movement from exercise_prediction
+                exercise_prediction = future_exercise.result()
+            log_training_example(video_data, exercise_prediction, source="gpt")
 
         movement_name = exercise_prediction.get("movement")
         if not movement_name:
@@ -88,16 +132,25 @@ def run_cli_args(args):
                 raise ValueError(f"Missing 'movement' in exercise prediction output: {exercise_prediction}")
 
         # run weight estimation after movement is confirmed
-        weight_prediction = estimate_weight("keyframes", movement_name)
+        with metrics.timer("stage_latency_sec", stage="weight_estimation"):
+            weight_prediction = estimate_weight("keyframes", movement_name, deadline=deadline, image_store=image_store,
+                                                equipment=exercise_prediction.get("equipment"))
 
     log("📦 Packaging result...")
     final_result = package_result(rep_data, exercise_prediction, weight_prediction)
-    final_result["collage_paths"] = collage_paths
 
     # ✅ Optional: Coaching feedback
-    if INCLUDE_FEEDBACK:
+    if include_feedback:
         log("🗣️ Generating coaching feedback...")
-        feedback = generate_feedback(video_data, rep_data, collage_paths)
+        with metrics.timer("stage_latency_sec", stage="coaching_feedback"):
+            feedback = generate_feedback(
+                video_path,
+                "anonymous",
+                {"predicted_exercise": movement_name},
+                rep_data,
+                deadline=deadline,
+                image_store=image_store
+            )
         final_result["coaching_feedback"] = feedback
 
     return final_result
@@ -0,0 +1,351 @@
+import io
+import os
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+
+from backend.ai.analyze.coaching_feedback import finish_feedback
+from backend.ai.analyze.gpt_schemas import parse_locally, repair_with_model, CoachingFeedbackResponse, SchemaError
+from backend.ai.analyze import model_usage
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Deferred coaching: requests are queued as jobs and sent to the provider's batch API in bulk
+BATCH_JOBS_DIR = os.getenv("GYMVID_BATCH_JOBS_DIR", os.path.join(tempfile.gettempdir(), "gymvid_batch_jobs"))
+BATCH_BACKEND = os.getenv("GYMVID_BATCH_BACKEND", "openai")  # "openai" or "local"
+LOCAL_BATCH_DIR = os.getenv("GYMVID_LOCAL_BATCH_DIR", os.path.join(tempfile.gettempdir(), "gymvid_local_batches"))
+
+# A batch is submitted once it has this many jobs or its oldest job has waited this long
+BATCH_MAX_SIZE = int(os.getenv("GYMVID_BATCH_MAX_SIZE", "50"))
+BATCH_FLUSH_INTERVAL_SEC = float(os.getenv("GYMVID_BATCH_FLUSH_INTERVAL_SEC", "60"))
+BATCH_POLL_INTERVAL_SEC = float(os.getenv("GYMVID_BATCH_POLL_INTERVAL_SEC", "15"))
+
+# A job whose batch failed or expired is queued again this many times before it's marked failed
+BATCH_MAX_ATTEMPTS = 2
+
+BATCH_COMPLETION_WINDOW = "24h"
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+
+# ✅ File-backed job store: one JSON file per job, a marker file per queued job
+def _path(*parts):
+    path = os.path.join(BATCH_JOBS_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_job(job_id):
+    return _read_json(_path("jobs", f"{job_id}.json"))
+
+
+def _save_job(job):
+    job["updated_at"] = time.time()
+    _write_json(_path("jobs", f"{job['id']}.json"), job)
+
+
+def _mark_queued(job_id):
+    open(_path("queued", job_id), "w").close()
+
+
+def _claim_queued(limit):
+    """Takes up to `limit` queued jobs, oldest first. The rename makes a claim exclusive across processes."""
+    queued_dir = os.path.dirname(_path("queued", "x"))
+    claimed = []
+    for name in sorted(os.listdir(queued_dir), key=lambda n: _queued_since(n) or 0):
+        if len(claimed) >= limit:
+            break
+        try:
+            os.replace(os.path.join(queued_dir, name), _path("claimed", name))
+        except FileNotFoundError:
+            continue
+        claimed.append(name)
+    return claimed
+
+
+def _queued_since(job_id):
+    try:
+        return os.path.getmtime(_path("queued", job_id))
+    except OSError:
+        return None
+
+
+def _queue_state():
+    """(number of queued jobs, seconds the oldest one has waited)."""
+    queued_dir = os.path.dirname(_path("queued", "x"))
+    stamps = [t for t in (_queued_since(n) for n in os.listdir(queued_dir)) if t is not None]
+    return len(stamps), (time.time() - min(stamps)) if stamps else 0.0
+
+
+class OpenAIBatchBackend:
+    """The provider's batch API: a JSONL file of requests in, a JSONL file of responses out."""
+
+    def __init__(self):
+        from backend.ai.analyze.gpt_client import client
+        self.client = client
+
+    def submit(self, lines):
+        payload = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        input_file = self.client.files.create(file=("coaching_batch.jsonl", io.BytesIO(payload)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata={"source": "gymvid_coaching"},
+        )
+        return batch.id
+
+    def poll(self, batch_id):
+        """Returns None while the batch is running, else (status, output lines)."""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                text = self.client.files.content(file_id).text
+                lines.extend(json.loads(line) for line in text.splitlines() if line.strip())
+        return batch.status, lines
+
+
+class LocalBatchBackend:
+    """
+    File-backed stand-in for the batch API, driven by backend/dev/local_batch_server.py.
+
+    Each batch is a directory holding input.jsonl and status.json; the server writes
+    output.jsonl in the provider's format and marks the batch completed.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or LOCAL_BATCH_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+    def submit(self, lines):
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        batch_dir = os.path.join(self.root, batch_id)
+        os.makedirs(batch_dir)
+        with open(os.path.join(batch_dir, "input.jsonl"), "w") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+        _write_json(os.path.join(batch_dir, "status.json"), {"status": "validating", "created_at": time.time()})
+        return batch_id
+
+    def poll(self, batch_id):
+        batch_dir = os.path.join(self.root, batch_id)
+        status = (_read_json(os.path.join(batch_dir, "status.json")) or {}).get("status", "failed")
+        if status in ("validating", "in_progress", "finalizing"):
+            return None
+        lines = []
+        output_path = os.path.join(batch_dir, "output.jsonl")
+        if os.path.exists(output_path):
+            with open(output_path) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+        return status, lines
+
+
+def get_backend():
+    return LocalBatchBackend() if BATCH_BACKEND == "local" else OpenAIBatchBackend()
+
+
+def enqueue(user_id: str, request_params: dict, meta: dict = None) -> str:
+    """
+    Queues a coaching request for the next batch.
+
+    Args:
+        user_id (str): Owner of the job.
+        request_params (dict): Chat completion body (model, messages, response_format, ...).
+        meta (dict, optional): Values merged into the result once it's parsed (total_tut, rpe).
+
+    Returns:
+        str: The job id to fetch the result with.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    _save_job({
+        "id": job_id,
+        "user_id": user_id,
+        "status": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "completed_at": None,
+        "batch_id": None,
+        "request": request_params,
+        "meta": meta or {},
+        "feedback": None,
+        "error": None,
+    })
+    _mark_queued(job_id)
+    metrics.increment("batch_jobs_total", status="queued")
+    logger.info(f"🗂️ Queued coaching job {job_id} for user {user_id}")
+    ensure_worker()
+    return job_id
+
+
+def get_job(job_id: str):
+    """Public view of a job, or None if there's no such job."""
+    if not job_id or not job_id.isalnum():
+        return None
+    job = _load_job(job_id)
+    if job is None:
+        return None
+    ensure_worker()
+    return {
+        "job_id": job["id"],
+        "user_id": job["user_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "completed_at": job["completed_at"],
+        "feedback": job["feedback"],
+        "error": job["error"],
+    }
+
+
+def flush(backend=None, force=False):
+    """
+    Submits queued jobs as one batch if the batch is full or its oldest job has waited long enough.
+
+    Returns:
+        str: The batch id, or None if nothing was submitted.
+    """
+    count, oldest_wait = _queue_state()
+    if count == 0 or (not force and count < BATCH_MAX_SIZE and oldest_wait < BATCH_FLUSH_INTERVAL_SEC):
+        return None
+
+    jobs = [job for job in (_load_job(job_id) for job_id in _claim_queued(BATCH_MAX_SIZE)) if job]
+    if not jobs:
+        return None
+    lines = [{"custom_id": job["id"], "method": "POST", "url": CHAT_COMPLETIONS_URL, "body": job["request"]} for job in jobs]
+
+    backend = backend or get_backend()
+    try:
+        batch_id = backend.submit(lines)
+    except Exception as e:
+        logger.error(f"❌ Batch submission failed, requeueing {len(jobs)} job(s): {e}")
+        for job in jobs:
+            os.replace(_path("claimed", job["id"]), _path("queued", job["id"]))
+        return None
+
+    for job in jobs:
+        job["status"] = "submitted"
+        job["batch_id"] = batch_id
+        job["attempts"] += 1
+        _save_job(job)
+        os.remove(_path("claimed", job["id"]))
+    _write_json(_path("batches", f"{batch_id}.json"), {"batch_id": batch_id, "job_ids": [job["id"] for job in jobs], "submitted_at": time.time()})
+    metrics.observe("batch_submit_size", len(jobs))
+    metrics.increment("batch_jobs_total", value=len(jobs), status="submitted")
+    logger.info(f"📦 Submitted batch {batch_id} with {len(jobs)} coaching job(s)")
+    return batch_id
+
+
+def _result_for(line):
+    """Pulls the answer text (or an error) out of one batch output line."""
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return None, json.dumps(line.get("error") or response.get("body"))[:500]
+    return response["body"]["choices"][0]["message"]["content"] or "", None
+
+
+def _finish_job(job, line):
+    text, error = _result_for(line) if line else (None, "No result in batch output")
+    if line and (line.get("response") or {}).get("body"):
+        model_usage.record_call(
+            "coaching_feedback", job["request"], line["response"]["body"],
+            request={"endpoint": "feedback_upload_deferred", "user_id": job["user_id"]}, batch=True
+        )
+    if error is None:
+        try:
+            try:
+                parsed, _ = parse_locally(text, CoachingFeedbackResponse)
+            except SchemaError as schema_error:
+                parsed = repair_with_model(text, str(schema_error), CoachingFeedbackResponse, "coaching_feedback", priority="background")
+            job["feedback"] = finish_feedback(parsed.model_dump(), job["meta"].get("total_tut"), job["meta"].get("rpe"))
+        except Exception as parse_error:
+            error = f"Unusable coaching answer: {parse_error}"
+
+    job["status"] = "completed" if error is None else "failed"
+    job["error"] = error
+    job["completed_at"] = time.time()
+    _save_job(job)
+    metrics.increment("batch_jobs_total", status=job["status"])
+    metrics.observe("batch_turnaround_sec", job["completed_at"] - job["created_at"])
+
+
+def poll(backend=None):
+    """Collects results from every submitted batch that has finished. Returns the number of jobs settled."""
+    batches_dir = os.path.dirname(_path("batches", "x"))
+    backend = backend or get_backend()
+    settled = 0
+    for name in os.listdir(batches_dir):
+        if not name.endswith(".json"):
+            continue
+        record = _read_json(os.path.join(batches_dir, name))
+        if not record:
+            continue
+        try:
+            outcome = backend.poll(record["batch_id"])
+        except Exception as e:
+            logger.warning(f"⚠️ Polling batch {record['batch_id']} failed: {e}")
+            continue
+        if outcome is None:
+            continue
+
+        status, lines = outcome
+        by_job = {line.get("custom_id"): line for line in lines}
+        for job_id in record["job_ids"]:
+            job = _load_job(job_id)
+            if not job or job["status"] != "submitted":
+                continue
+            if job_id not in by_job and status != "completed" and job["attempts"] < BATCH_MAX_ATTEMPTS:
+                # The whole batch failed or expired before reaching this job: give it another go
+                job["status"] = "queued"
+                job["batch_id"] = None
+                _save_job(job)
+                _mark_queued(job_id)
+                continue
+            _finish_job(job, by_job.get(job_id))
+            settled += 1
+        os.remove(os.path.join(batches_dir, name))
+        logger.info(f"✅ Batch {record['batch_id']} finished ({status}), {len(lines)} result(s)")
+    return settled
+
+
+# ✅ Background coordinator, started on first use in each process
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _run_worker():
+    backend = get_backend()
+    while True:
+        try:
+            flush(backend)
+            poll(backend)
+        except Exception as e:
+            logger.error(f"❌ Batch coordinator error: {e}")
+        time.sleep(BATCH_POLL_INTERVAL_SEC)
+
+
+def ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="batch-coaching", daemon=True)
+            _worker.start()
@@ -1,127 +1,34 @@
 import os
-import json
 import traceback
 import logging
 from dotenv import load_dotenv
-from openai import OpenAI
 
 BASE_DISK_PATH = "/mnt/data"
 
 from backend.ai.analyze.keyframe_collage import export_keyframe_collages
 from backend.ai.analyze.fallback_keyframes import export_static_keyframe_collage
-from backend.utils.aws_utils import upload_file_to_s3
+from backend.ai.analyze.gpt_schemas import structured_completion, CoachingFeedbackResponse, SchemaError
+from backend.ai.analyze.image_store import ImageStore
+from backend.ai.analyze.gpt_utils import summarise_reps_for_gpt
+from backend.utils.content_store import ContentItem, upload_content
 
 # ✅ Logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# ✅ Load environment and init OpenAI
+# ✅ Load environment
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL_NAME = os.getenv("GYMVID_AI_MODEL", "gpt-4o")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 logger.info(f"Coaching module ready – OpenAI Model: {MODEL_NAME}")
 
-def compress_rep_data_for_gpt(rep_data: list, feedback_depth: str = "standard") -> list:
-    summaries = []
-    for rep in rep_data:
-        rep_num = rep.get("rep")
-        rpe = rep.get("estimated_RPE")
-        stall = rep.get("velocity_stall", False)
-        rom = rep.get("range_of_motion_cm")
-        smooth = min(rep.get("smoothness_score", 0), 100)
-        path = rep.get("path_deviation_cm", 0)
-        asym = rep.get("asymmetry_score", 100)
-        tempo = rep.get("tempo", {})
-        concentric = tempo.get("concentric_sec", 0)
-        eccentric = tempo.get("eccentric_sec", 0)
-
-        summary = f"Rep {rep_num}:"
-
-        if feedback_depth == "simple":
-            if stall:
-                summary += " Minor stall detected mid-rep."
-            elif smooth and smooth < 85:
-                summary += " Slightly inconsistent tempo."
-            else:
-                summary += " Solid execution with good control."
-        elif feedback_depth == "standard":
-            summary += f" RPE {rpe}, ROM {rom}cm, smoothness {smooth}/100."
-            if stall:
-                summary += " Sticking point mid-concentric."
-            if path and path > 3.0:
-                summary += f" Drifted laterally ({path}cm)."
-            if asym is not None and asym < 85:
-                summary += f" Asymmetry score low ({asym}/100)."
-        elif feedback_depth == "advanced":
-            summary += (
-                f" Tempo – Concentric: {concentric:.2f}s, Eccentric: {eccentric:.2f}s. "
-                f"ROM: {rom}cm. Smoothness: {smooth}/100. RPE: {rpe}. "
-            )
-            if stall:
-                summary += "Velocity dipped (possible sticking point). "
-            if path is not None:
-                summary += f"Path deviation: {path}cm. "
-            if asym is not None:
-                summary += f"Asymmetry: {asym}/100."
-
-        summaries.append(summary.strip())
-    return summaries
-
 def calculate_tut_and_rpe(rep_data):
     total_tut = sum([rep.get("duration_sec", 0) for rep in rep_data])
     last_rpe = rep_data[-1].get("estimated_RPE", None) if rep_data else None
     return round(total_tut, 2), last_rpe
 
-def generate_feedback(video_path, user_id, video_data, rep_data) -> dict:
-    try:
-        logger.info(f"🎯 Starting generate_feedback for user {user_id}")
-        logger.info(f"Video path: {video_path}, exists: {os.path.exists(video_path) if video_path else False}")
-        logger.info(f"Video data: {video_data}")
-        logger.info(f"Rep data: {rep_data is not None}, count: {len(rep_data) if rep_data else 0}")
-        
-        if not video_path or not os.path.exists(video_path):
-            raise ValueError("Invalid or missing video path.")
-
-        if not video_data:
-            raise ValueError("No video_data provided.")
-
-        exercise_name = video_data.get("predicted_exercise", "an exercise")
-        feedback_depth = video_data.get("feedback_depth", "standard")
-        
-        logger.info(f"Exercise: {exercise_name}, feedback_depth: {feedback_depth}")
-
-        if rep_data:
-            logger.info("📸 Generating collages from rep data...")
-            collage_paths = export_keyframe_collages(video_path, rep_data)
-            total_tut, last_rpe = calculate_tut_and_rpe(rep_data)
-            rep_summaries = compress_rep_data_for_gpt(rep_data, feedback_depth)
-            logger.info(f"Generated {len(collage_paths)} collage(s): {collage_paths}")
-        else:
-            logger.info("📸 Generating static fallback collage...")
-            collage_paths = [export_static_keyframe_collage(video_path)]
-            total_tut, last_rpe = "N/A", "N/A"
-            rep_summaries = ["No reps were detected in this video."]
-            logger.info(f"Generated fallback collage: {collage_paths}")
-
-        logger.info("☁️ Uploading collages to S3...")
-        collage_urls = []
-        for i, path in enumerate(collage_paths):
-            logger.info(f"Uploading collage {i+1}/{len(collage_paths)}: {path}")
-            try:
-                s3_url = upload_file_to_s3(
-                    local_path=path,
-                    s3_key=f"collages/{user_id}/{os.path.basename(path)}"
-                )
-                collage_urls.append(s3_url)
-                logger.info(f"✅ Uploaded: {s3_url}")
-            except Exception as upload_error:
-                logger.error(f"❌ S3 upload failed for {path}: {upload_error}")
-                raise Exception(f"Failed to upload collage to S3: {upload_error}")
-
-        logger.info(f"🤖 Preparing OpenAI prompt for {len(collage_urls)} images...")
-        prompt = f"""
+def build_coaching_prompt(exercise_name, rep_summaries, collage_urls) -> str:
+    return f"""
 You're a professional lifting coach providing helpful, supportive feedback.
 
 The user just submitted a set of **{exercise_name}**.
@@ -155,43 +62,108 @@ Return JSON only:
 }}
 """.strip()
 
+def coaching_request_params(prompt: str) -> dict:
+    """Chat completion parameters for a coaching prompt (shared by live and batch calls)."""
+    return {
+        "model": MODEL_NAME,
+        "temperature": 0.4,
+        "max_tokens": 1000,
+        "messages": [
+            {"role": "system", "content": "You are a world-class strength coach."},
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+def summarise_set(video_data, rep_data):
+    """Returns (exercise_name, rep_summaries, total_tut, last_rpe) for the coaching prompt."""
+    exercise_name = video_data.get("predicted_exercise", "an exercise")
+    feedback_depth = video_data.get("feedback_depth", "standard")
+    if rep_data:
+        total_tut, last_rpe = calculate_tut_and_rpe(rep_data)
+        rep_summaries = summarise_reps_for_gpt(rep_data, feedback_depth)
+    else:
+        total_tut, last_rpe = "N/A", "N/A"
+        rep_summaries = ["No reps were detected in this video."]
+    return exercise_name, rep_summaries, total_tut, last_rpe
+
+def finish_feedback(parsed: dict, total_tut, last_rpe) -> dict:
+    result = parsed["coaching_feedback"]
+    result["total_tut"] = total_tut
+    result["rpe"] = last_rpe
+    return result
+
+def generate_feedback(video_path, user_id, video_data, rep_data, deadline=None, image_store=None) -> dict:
+    try:
+        logger.info(f"🎯 Starting generate_feedback for user {user_id}")
+        logger.info(f"Video path: {video_path}, exists: {os.path.exists(video_path) if video_path else False}")
+        logger.info(f"Video data: {video_data}")
+        logger.info(f"Rep data: {rep_data is not None}, count: {len(rep_data) if rep_data else 0}")
+        
+        if not video_path or not os.path.exists(video_path):
+            raise ValueError("Invalid or missing video path.")
+
+        if not video_data:
+            raise ValueError("No video_data provided.")
+
+        exercise_name, rep_summaries, total_tut, last_rpe = summarise_set(video_data, rep_data)
+        logger.info(f"Exercise: {exercise_name}, feedback_depth: {video_data.get('feedback_depth', 'standard')}")
+
+        # ✅ Reuse collages the caller already rendered (and uploaded) instead of rebuilding them
+        collage_urls = list(video_data.get("collage_urls") or [])
+        if collage_urls:
+            logger.info(f"♻️ Reusing {len(collage_urls)} already-uploaded collage(s)")
+        else:
+            if image_store is None:
+                image_store = ImageStore()
+            collage_names = image_store.names("collage_") or image_store.names("fallback_collage")
+            if collage_names:
+                logger.info(f"♻️ Reusing {len(collage_names)} collage(s) from the request image store")
+            elif rep_data:
+                logger.info("📸 Generating collages from rep data...")
+                collage_names = export_keyframe_collages(video_path, rep_data, image_store=image_store)
+                logger.info(f"Generated {len(collage_names)} collage(s): {collage_names}")
+            else:
+                logger.info("📸 Generating static fallback collage...")
+                collage_names = [export_static_keyframe_collage(video_path, image_store=image_store)]
+                logger.info(f"Generated fallback collage: {collage_names}")
+
+            logger.info(f"☁️ Uploading {len(collage_names)} collage(s) to S3 in parallel...")
+            uploads = upload_content([
+                ContentItem(f"collages/{user_id}/{name}", "collages", data=image_store.get(name).data)
+                for name in collage_names
+            ])
+            for upload in uploads:
+                if upload.ok:
+                    collage_urls.append(upload.url)
+                    logger.info(f"✅ Uploaded: {upload.url} ({upload.seconds:.2f}s)")
+                else:
+                    logger.error(f"❌ S3 upload failed for {upload.item.s3_key}: {upload.error}")
+            if not collage_urls:
+                raise Exception(f"Failed to upload collage to S3: {uploads[0].error if uploads else 'no collages'}")
+
+        logger.info(f"🤖 Preparing OpenAI prompt for {len(collage_urls)} images...")
+        prompt = build_coaching_prompt(exercise_name, rep_summaries, collage_urls)
+
         logger.info(f"🎤 Making OpenAI API call with model: {MODEL_NAME}")
         logger.info(f"Prompt length: {len(prompt)} chars, Images: {len(collage_urls)}")
         
         try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                temperature=0.4,
-                max_tokens=1000,
-                messages=[
-                    {"role": "system", "content": "You are a world-class strength coach."},
-                    {"role": "user", "content": prompt}
-                ]
+            parsed = structured_completion(
+                stage="coaching_feedback",
+                schema_cls=CoachingFeedbackResponse,
+                deadline=deadline,
+                **coaching_request_params(prompt)
             )
             logger.info("✅ OpenAI API call successful")
+        except SchemaError as schema_error:
+            logger.error(f"❌ Coaching feedback failed schema validation: {schema_error}")
+            raise Exception(f"Failed to parse JSON response: {schema_error}")
         except Exception as openai_error:
             logger.error(f"❌ OpenAI API call failed: {openai_error}")
             raise Exception(f"OpenAI API error: {openai_error}")
 
-        text = response.choices[0].message.content
-        logger.info(f"📝 Received response from OpenAI: {text[:200]}...")
-        
-        json_start = text.find('{')
-        json_end = text.rfind('}')
-        if json_start == -1 or json_end == -1:
-            logger.error(f"❌ No valid JSON found in OpenAI response: {text}")
-            raise ValueError("No valid JSON response from GPT")
-
-        try:
-            parsed = json.loads(text[json_start:json_end + 1])
-            result = parsed["coaching_feedback"]
-            result["total_tut"] = total_tut
-            result["rpe"] = last_rpe
-            logger.info(f"✅ Successfully parsed feedback: form_rating={result.get('form_rating')}")
-        except Exception as json_error:
-            logger.error(f"❌ JSON parsing failed: {json_error}")
-            logger.error(f"Raw text: {text}")
-            raise Exception(f"Failed to parse JSON response: {json_error}")
+        result = finish_feedback(parsed, total_tut, last_rpe)
+        logger.info(f"✅ Successfully parsed feedback: form_rating={result.get('form_rating')}")
 
         logger.info("✅ Coaching feedback successfully generated")
         return result
@@ -0,0 +1,165 @@
+import math
+import logging
+import cv2
+import numpy as np
+
+from backend.ai.analyze.vision_tokens import (
+    estimate_image_tokens,
+    LOW_DETAIL_TOKENS,
+    TILE_TOKENS,
+    MAX_LONG_SIDE,
+    MAX_SHORT_SIDE,
+)
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cheapest possible high-detail image (one 512px tile); below this only low detail fits
+MIN_HIGH_DETAIL_TOKENS = LOW_DETAIL_TOKENS + TILE_TOKENS
+
+# Low-detail images are downscaled by the API to fit 512x512, so there's no point sending more
+LOW_DETAIL_MAX_SIDE = 512
+
+# Encoded size target; quality is stepped down until the collage fits
+DEFAULT_MAX_BYTES = 300 * 1024
+JPEG_QUALITY_LADDER = [85, 75, 65, 55]
+
+
+class RenderedCollage:
+    """A collage encoded for a vision call, with what it will cost."""
+
+    def __init__(self, data, width, height, cols, rows, tile_size, quality, detail, estimated_tokens):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.cols = cols
+        self.rows = rows
+        self.tile_size = tile_size
+        self.quality = quality
+        self.detail = detail
+        self.estimated_tokens = estimated_tokens
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.data)
+
+    def save(self, path: str) -> str:
+        with open(path, "wb") as f:
+            f.write(self.data)
+        return path
+
+
+def _useful_width(aspect: float, detail: str) -> int:
+    """Widest collage (for this aspect) whose pixels survive the API's own downscaling."""
+    if detail == "low":
+        return int(LOW_DETAIL_MAX_SIDE if aspect >= 1 else LOW_DETAIL_MAX_SIDE * aspect)
+    if aspect >= 1:
+        return int(min(MAX_LONG_SIDE, MAX_SHORT_SIDE * aspect))
+    return int(min(MAX_LONG_SIDE, MAX_SHORT_SIDE / aspect) * aspect)
+
+
+def _largest_width_within(aspect: float, token_budget: int, max_width: int) -> int:
+    """Binary-searches the widest collage that still costs no more than `token_budget`."""
+    low, high = 0, max_width
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_image_tokens(mid, max(1, round(mid / aspect))) <= token_budget:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def plan_layout(frame_count: int, tile_aspect: float, token_budget: int, cols: int = None) -> dict:
+    """
+    Picks the grid, tile size and detail level that give each frame the most pixels
+    without the collage costing more than `token_budget` prompt tokens.
+
+    Args:
+        frame_count (int): Number of tiles to place.
+        tile_aspect (float): Width / height of a single frame.
+        token_budget (int): Maximum image tokens for the whole collage.
+        cols (int, optional): Force a column count (e.g. 3 for start/peak/stop rows).
+    """
+    detail = "high" if token_budget >= MIN_HIGH_DETAIL_TOKENS else "low"
+    candidates = [cols] if cols else range(1, frame_count + 1)
+
+    best = None
+    for c in candidates:
+        r = math.ceil(frame_count / c)
+        aspect = (c * tile_aspect) / r
+        max_width = _useful_width(aspect, detail)
+        width = max_width if detail == "low" else _largest_width_within(aspect, token_budget, max_width)
+        tile_w = width // c
+        tile_h = int(tile_w / tile_aspect)
+        if tile_w < 1 or tile_h < 1:
+            continue
+
+        empty_cells = c * r - frame_count
+        score = (tile_w * tile_h, -empty_cells)
+        if best is None or score > best["score"]:
+            best = {"cols": c, "rows": r, "tile_size": (tile_w, tile_h), "detail": detail, "score": score}
+
+    if best is None:
+        raise ValueError(f"No collage layout fits a {token_budget}-token budget")
+    return best
+
+
+def render_collage(frames: list, token_budget: int, cols: int = None, max_bytes: int = DEFAULT_MAX_BYTES, stage: str = "collage") -> RenderedCollage:
+    """
+    Lays out frames into one JPEG collage sized for a vision-model token budget.
+
+    Args:
+        frames (list): BGR frames in reading order; None leaves a black tile.
+        token_budget (int): Maximum estimated image tokens for the collage.
+        cols (int, optional): Fixed column count; otherwise the best grid is chosen.
+        max_bytes (int): Encoded size target used to pick the JPEG quality.
+        stage (str): Call site name used when reporting bytes and tokens.
+
+    Returns:
+        RenderedCollage
+    """
+    valid = [f for f in frames if f is not None]
+    if not valid:
+        raise ValueError("No frames to render into a collage")
+
+    height, width = valid[0].shape[:2]
+    layout = plan_layout(len(frames), width / height, token_budget, cols=cols)
+    tile_w, tile_h = layout["tile_size"]
+
+    canvas = np.zeros((tile_h * layout["rows"], tile_w * layout["cols"], 3), dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        if frame is None:
+            continue
+        row, col = divmod(i, layout["cols"])
+        canvas[row * tile_h:(row + 1) * tile_h, col * tile_w:(col + 1) * tile_w] = cv2.resize(
+            frame, (tile_w, tile_h), interpolation=cv2.INTER_AREA
+        )
+
+    for quality in JPEG_QUALITY_LADDER:
+        ok, encoded = cv2.imencode(".jpg", canvas, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("Failed to encode collage")
+        if encoded.nbytes <= max_bytes:
+            break
+
+    collage = RenderedCollage(
+        data=encoded.tobytes(),
+        width=canvas.shape[1],
+        height=canvas.shape[0],
+        cols=layout["cols"],
+        rows=layout["rows"],
+        tile_size=layout["tile_size"],
+        quality=quality,
+        detail=layout["detail"],
+        estimated_tokens=estimate_image_tokens(canvas.shape[1], canvas.shape[0], layout["detail"]),
+    )
+
+    metrics.observe("collage_bytes", collage.size_bytes, stage=stage)
+    metrics.observe("collage_estimated_tokens", collage.estimated_tokens, stage=stage)
+    logger.info(
+        f"🧩 {stage}: {collage.cols}x{collage.rows} of {tile_w}x{tile_h} tiles, "
+        f"{collage.width}x{collage.height} q{quality} detail={collage.detail} → "
+        f"{collage.size_bytes / 1024:.1f}KB, ~{collage.estimated_tokens} tokens (budget {token_budget})"
+    )
+    return collage
@@ -0,0 +1,266 @@
+import os
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ CPU-bound stages (pose extraction, frame decoding, collage rendering) run in warm worker processes,
+# so they scale with cores instead of sharing one GIL with the event loop
+CPU_WORKERS = int(os.getenv("GYMVID_CPU_WORKERS", str(os.cpu_count() or 1)))
+# Tasks allowed to wait for a free worker; past this, requests are turned away instead of piling up
+CPU_QUEUE_MAX = int(os.getenv("GYMVID_CPU_QUEUE_MAX", str(CPU_WORKERS * 2)))
+# Landmark arrays come back through files here rather than being pickled through the result pipe
+CPU_SCRATCH_DIR = os.getenv("GYMVID_CPU_SCRATCH_DIR", tempfile.gettempdir())
+
+# The analyze_set.py subprocess (GYMVID_MODE=subprocess) is already its own process; it doesn't start a pool
+POOL_ENABLED = CPU_WORKERS > 0 and os.getenv("GYMVID_MODE") != "subprocess"
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(CPU_WORKERS, 1) + CPU_QUEUE_MAX)
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+# Set in worker processes only
+_worker_pose = None
+_in_worker = False
+
+
+class CpuPoolBusy(RuntimeError):
+    """Every worker is busy and the wait queue is full; the caller should retry later."""
+
+
+# ✅ Worker side
+
+def warm_worker():
+    """
+    Pool initializer: imports OpenCV and MediaPipe and builds the Pose graph once per
+    worker, so a task starts on a graph that's already loaded instead of paying for it.
+    Other long-lived worker processes (set_workers) call it too; CPU stages then run
+    in-process on the warm graph instead of going to a pool of their own.
+    """
+    global _worker_pose, _in_worker
+    _in_worker = True
+    import cv2
+    # Parallelism comes from the processes; OpenCV's own threads would only oversubscribe the cores
+    cv2.setNumThreads(1)
+    try:
+        import mediapipe as mp
+        from backend.ai.analyze.video_analysis import POSE_OPTIONS
+        _worker_pose = mp.solutions.pose.Pose(**POSE_OPTIONS)
+        # One blank frame loads the model and allocates the graph's buffers
+        _worker_pose.process(np.zeros((256, 256, 3), dtype=np.uint8))
+    except Exception as e:
+        _worker_pose = None
+        logging.getLogger(__name__).warning(f"⚠️ CPU worker {os.getpid()} has no warm Pose graph: {e}")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _analyze_video_task(video_path: str) -> dict:
+    """Runs pose extraction with the worker's warm graph and writes the trajectories to an .npz file."""
+    from backend.ai.analyze.video_analysis import analyze_video
+    video_data = analyze_video(video_path, pose=_worker_pose)
+
+    arrays = {
+        "raw_y": np.asarray(video_data.pop("raw_y"), dtype=np.float64),
+        "raw_left_y": np.asarray(video_data.pop("raw_left_y"), dtype=np.float64),
+        "raw_right_y": np.asarray(video_data.pop("raw_right_y"), dtype=np.float64),
+    }
+    names = list(video_data["landmark_y"])
+    arrays["landmark_y"] = np.asarray([video_data["landmark_y"][name] for name in names], dtype=np.float64)
+    arrays["landmark_x"] = np.asarray([video_data["landmark_x"][name] for name in names], dtype=np.float64)
+    video_data.pop("landmark_y")
+    video_data.pop("landmark_x")
+
+    with tempfile.NamedTemporaryFile(suffix=".npz", prefix="landmarks_", dir=CPU_SCRATCH_DIR, delete=False) as f:
+        np.savez(f, **arrays)
+        video_data["arrays_path"] = f.name
+    video_data["landmark_names"] = names
+    return video_data
+
+
+def _collage_task(kind: str, video_path: str, rep_data: list) -> tuple:
+    """Renders rep-based ("reps") or evenly spaced ("static") collages; returns their names and encoded images."""
+    from backend.ai.analyze.image_store import ImageStore
+    image_store = ImageStore()
+    if kind == "reps":
+        from backend.ai.analyze.keyframe_collage import export_keyframe_collages
+        names = export_keyframe_collages(video_path, rep_data, image_store=image_store)
+    else:
+        from backend.ai.analyze.fallback_keyframes import export_static_keyframe_collage
+        names = [export_static_keyframe_collage(video_path, image_store=image_store)]
+    images = [(name, image_store.get(name).data, image_store.get(name).detail) for name in image_store.names()]
+    return names, images
+
+
+# ✅ Parent side
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: workers must not inherit the server's threads, sockets or a half-initialised MediaPipe
+            _pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_worker,
+            )
+            logger.info(f"🧮 Started CPU pool with {CPU_WORKERS} workers (queue limit {CPU_QUEUE_MAX})")
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drops a pool whose worker died (e.g. a native crash); the next task starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            metrics.increment("cpu_pool_restarts_total")
+            logger.error("❌ A CPU worker died; restarting the CPU pool")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def start():
+    """Starts the pool and warms every worker in the background (call at app startup)."""
+    if not POOL_ENABLED:
+        return
+    pool = _get_pool()
+    # Submitted together, so each lands on (and spawns) its own worker
+    for _ in range(CPU_WORKERS):
+        pool.submit(_ping)
+
+
+def _track(delta: int):
+    global _inflight
+    with _inflight_lock:
+        _inflight += delta
+        metrics.set_gauge("cpu_pool_inflight", _inflight)
+
+
+def _submit(fn, args):
+    _track(1)
+    start_time = time.monotonic()
+    try:
+        pool = _get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            pool = _get_pool()
+            future = pool.submit(fn, *args)
+    except BaseException:
+        # Nothing was queued, so the slot and the in-flight count are given back here
+        _track(-1)
+        _slots.release()
+        raise
+
+    def done(f):
+        _track(-1)
+        _slots.release()
+        metrics.observe("cpu_pool_task_sec", time.monotonic() - start_time, task=fn.__name__)
+        if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+            _discard_pool(pool)
+
+    future.add_done_callback(done)
+    return future
+
+
+def run(fn, *args):
+    """
+    Runs a module-level function in the CPU pool and returns its result. Blocks while the
+    queue is full, which is the backpressure background workers want.
+    """
+    if not POOL_ENABLED or _in_worker:
+        return fn(*args)
+    _slots.acquire()
+    return _submit(fn, args).result()
+
+
+async def run_async(fn, *args):
+    """
+    Awaits a module-level function run in the CPU pool.
+
+    Raises:
+        CpuPoolBusy: Every worker is busy and CPU_QUEUE_MAX tasks are already waiting.
+    """
+    if not POOL_ENABLED:
+        return await asyncio.to_thread(fn, *args)
+    if not _slots.acquire(blocking=False):
+        metrics.increment("cpu_pool_rejected_total", task=fn.__name__)
+        raise CpuPoolBusy("The server is busy analysing other videos. Please try again shortly.")
+    return await asyncio.wrap_future(_submit(fn, args))
+
+
+# ✅ Stage helpers
+
+def _load_video_data(video_data: dict) -> dict:
+    """Reads a worker's .npz back into the dict shape analyze_video returns, then removes the file."""
+    path = video_data.pop("arrays_path", None)
+    if path is None:
+        return video_data
+    names = video_data.pop("landmark_names")
+    try:
+        with np.load(path) as arrays:
+            video_data["raw_y"] = arrays["raw_y"].tolist()
+            video_data["raw_left_y"] = arrays["raw_left_y"].tolist()
+            video_data["raw_right_y"] = arrays["raw_right_y"].tolist()
+            video_data["landmark_y"] = dict(zip(names, arrays["landmark_y"].tolist()))
+            video_data["landmark_x"] = dict(zip(names, arrays["landmark_x"].tolist()))
+    finally:
+        os.remove(path)
+    return video_data
+
+
+def analyze_video(video_path: str) -> dict:
+    """video_analysis.analyze_video, run in the CPU pool (blocking)."""
+    if not POOL_ENABLED or _in_worker:
+        from backend.ai.analyze.video_analysis import analyze_video as analyze_in_process
+        return analyze_in_process(video_path, pose=_worker_pose)
+    return _load_video_data(run(_analyze_video_task, video_path))
+
+
+async def analyze_video_async(video_path: str) -> dict:
+    """video_analysis.analyze_video, awaited from the event loop."""
+    if not POOL_ENABLED:
+        from backend.ai.analyze.video_analysis import analyze_video as analyze_in_process
+        return await asyncio.to_thread(analyze_in_process, video_path)
+    return _load_video_data(await run_async(_analyze_video_task, video_path))
+
+
+def _store_collages(result: tuple, image_store) -> list:
+    names, images = result
+    for name, data, detail in images:
+        image_store.put_bytes(name, data, detail=detail)
+    return names
+
+
+def export_collages(video_path: str, rep_data: list, image_store, kind: str = "reps") -> list:
+    """
+    Renders collages in the CPU pool into `image_store` (blocking).
+
+    Args:
+        kind (str): "reps" for export_keyframe_collages (its per-rep keyframes are stored too),
+                    "static" for export_static_keyframe_collage.
+
+    Returns:
+        list: The collage names in `image_store`.
+    """
+    return _store_collages(run(_collage_task, kind, video_path, rep_data), image_store)
+
+
+async def export_collages_async(video_path: str, rep_data: list, image_store, kind: str = "reps") -> list:
+    """export_collages, awaited from the event loop."""
+    return _store_collages(await run_async(_collage_task, kind, video_path, rep_data), image_store)
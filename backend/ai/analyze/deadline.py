@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+
+# ✅ Request-wide deadline, split across the model stages a request will run
+DEFAULT_REQUEST_DEADLINE_SEC = float(os.getenv("GYMVID_REQUEST_DEADLINE_SEC", "90"))
+
+# Relative weight of each model stage when the remaining time is divided up
+STAGE_BUDGET_SHARES = {
+    "exercise_prediction": 1.0,
+    "weight_estimation": 1.0,
+    "coaching_feedback": 2.0,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage has no time left in its budget."""
+
+
+class RequestDeadline:
+    """
+    Tracks the time left for one request and hands out per-stage budgets.
+
+    Each stage gets its share of whatever time is still remaining, weighted against
+    the stages that have not started yet. Time a fast stage does not use therefore
+    flows on to the stages after it.
+
+    Args:
+        total_sec (float): Total wall-clock budget for the request.
+        stages (list): Names of the model stages this request expects to run.
+    """
+
+    def __init__(self, total_sec: float = None, stages: list = None):
+        self.total_sec = total_sec if total_sec is not None else DEFAULT_REQUEST_DEADLINE_SEC
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.total_sec
+        self._pending = list(stages) if stages else list(STAGE_BUDGET_SHARES)
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def begin(self, stage: str) -> float:
+        """
+        Marks `stage` as started and returns the seconds it may spend.
+
+        Raises:
+            DeadlineExceeded: If the request deadline has already passed.
+        """
+        with self._lock:
+            remaining = self.remaining()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Request deadline passed before stage '{stage}' started")
+
+            pending = self._pending if stage in self._pending else self._pending + [stage]
+            total_share = sum(STAGE_BUDGET_SHARES.get(s, 1.0) for s in pending)
+            budget = remaining * STAGE_BUDGET_SHARES.get(stage, 1.0) / total_share
+
+            if stage in self._pending:
+                self._pending.remove(stage)
+            return budget
@@ -2,28 +2,39 @@ import os
 import base64
 import json
 import time
-from openai import OpenAI
-from dotenv import load_dotenv
+import logging
+import cv2
+import numpy as np
 
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+from backend.ai.analyze.gpt_schemas import structured_completion, ExercisePrediction
+from backend.utils import metrics
 
-def predict_exercise(image_path: str, model: str = "gpt-4o") -> dict:
-    try:
-        with open(image_path, "rb") as f:
-            image_data = f.read()
-            b64 = base64.b64encode(image_data).decode("utf-8")
-    except Exception as e:
-        return {
-            "movement": "Unknown",
-            "equipment": "Unknown",
-            "confidence": 0,
-            "error": f"Failed to read image: {str(e)}"
-        }
+logger = logging.getLogger(__name__)
+
+EQUIPMENT_OPTIONS = ["Barbell", "Dumbbell", "Kettlebell", "Cable", "Pin-Loaded Machine", "Plate-Loaded Machine", "Bodyweight", "Resistance Band"]
+
+# ✅ Cascade: a cheap model on a small collage first, the full model only when it's unsure
+CASCADE_ENABLED = os.getenv("GYMVID_CASCADE_ENABLED", "true") == "true"
+CASCADE_FAST_MODEL = os.getenv("GYMVID_CASCADE_FAST_MODEL", "gpt-4o-mini")
+CASCADE_FAST_MAX_SIDE = 512
+CASCADE_FAST_TIMEOUT_SEC = float(os.getenv("GYMVID_CASCADE_FAST_TIMEOUT_SEC", "8"))
 
-    prompt = """
-You are an expert fitness AI analyzing a 2x2 collage of gym keyframes showing a person performing an exercise.
+# Minimum fast-tier confidence to accept its answer, per equipment class. Machines and bands
+# are easy to confuse at low resolution, so they need more certainty before skipping gpt-4o.
+CASCADE_THRESHOLDS = {
+    "Barbell": 80,
+    "Dumbbell": 80,
+    "Kettlebell": 85,
+    "Cable": 85,
+    "Pin-Loaded Machine": 90,
+    "Plate-Loaded Machine": 90,
+    "Bodyweight": 85,
+    "Resistance Band": 90,
+}
+CASCADE_THRESHOLDS.update(json.loads(os.getenv("GYMVID_CASCADE_THRESHOLDS", "{}")))
+
+PROMPT = """
+You are an expert fitness AI analyzing a collage of gym keyframes showing a person performing an exercise.
 
 Focus closely on:
 - The angle of the bench or platform (incline, flat, or decline)
@@ -44,40 +55,136 @@ Return your analysis in strict JSON format only:
 }
 """
 
-    try:
-        start = time.time()
-        response = client.chat.completions.create(
-            model=model,
-            temperature=0,
-            max_tokens=500,
-            messages=[
-                { "role": "system", "content": "You are a helpful AI fitness assistant." },
-                {
-                    "role": "user",
-                    "content": [
-                        { "type": "text", "text": prompt },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{b64}"
-                            }
+
+def shrink_jpeg(image_data: bytes, max_side: int = CASCADE_FAST_MAX_SIDE, quality: int = 70) -> bytes:
+    """Downscales a JPEG so its long side is at most `max_side` pixels."""
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return image_data
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes() if ok else image_data
+
+
+def is_valid_prediction(parsed: dict) -> bool:
+    """Schema check used to decide whether a cheap answer can be trusted."""
+    confidence = parsed.get("confidence")
+    return (
+        parsed.get("equipment") in EQUIPMENT_OPTIONS
+        and isinstance(parsed.get("movement"), str)
+        and bool(parsed["movement"].strip())
+        and isinstance(confidence, (int, float))
+        and 0 <= confidence <= 100
+    )
+
+
+def _request_prediction(b64: str, model: str, detail: str, deadline, priority, budget_cap=None, repair=True) -> dict:
+    return structured_completion(
+        stage="exercise_prediction",
+        schema_cls=ExercisePrediction,
+        deadline=deadline,
+        priority=priority,
+        budget_cap=budget_cap,
+        repair=repair,
+        model=model,
+        temperature=0,
+        max_tokens=500,
+        messages=[
+            { "role": "system", "content": "You are a helpful AI fitness assistant." },
+            {
+                "role": "user",
+                "content": [
+                    { "type": "text", "text": PROMPT },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{b64}",
+                            "detail": detail
                         }
-                    ]
-                }
-            ]
-        )
+                    }
+                ]
+            }
+        ]
+    )
 
-        message = response.choices[0].message.content.strip()
-        json_start = message.find('{')
-        json_end = message.rfind('}') + 1
-        parsed = json.loads(message[json_start:json_end])
 
-        parsed["movement"] = parsed.get("movement") or "Unknown"
-        parsed["equipment"] = parsed.get("equipment") or "Unknown"
-        parsed["variation"] = parsed.get("variation", "")
-        parsed["confidence"] = parsed.get("confidence", 0)
+def _run_fast_tier(image_data: bytes, deadline, priority):
+    """
+    Runs the cheap model on a shrunken, low-detail copy of the collage.
 
-        return parsed
+    Returns:
+        tuple: (accepted answer or None if it must escalate, raw fast-tier answer)
+    """
+    start = time.monotonic()
+    try:
+        small_b64 = base64.b64encode(shrink_jpeg(image_data)).decode("utf-8")
+        # A malformed cheap answer just escalates, so don't spend a repair call on it
+        parsed = _request_prediction(small_b64, CASCADE_FAST_MODEL, "low", deadline, priority,
+                                     budget_cap=CASCADE_FAST_TIMEOUT_SEC, repair=False)
+    except Exception as e:
+        logger.warning(f"⚠️ Fast exercise tier failed, escalating: {e}")
+        parsed = {}
+    metrics.observe("exercise_cascade_latency_sec", time.monotonic() - start, tier="fast")
+
+    equipment = parsed.get("equipment", "invalid")
+    if not is_valid_prediction(parsed):
+        metrics.increment("exercise_cascade_total", tier="fast", outcome="invalid")
+        return None, parsed
+    if parsed["confidence"] < CASCADE_THRESHOLDS.get(equipment, 90):
+        metrics.increment("exercise_cascade_total", tier="fast", outcome="low_confidence", equipment=equipment)
+        return None, parsed
+
+    metrics.increment("exercise_cascade_total", tier="fast", outcome="accepted", equipment=equipment)
+    parsed["model_tier"] = "fast"
+    return parsed, parsed
+
+
+def predict_exercise(image_path: str, model: str = "gpt-4o", deadline=None, priority: str = None, cascade: bool = None, image_store=None, budget_cap: float = None) -> dict:
+    try:
+        # Borrow the already-encoded collage when the request has an image store
+        if image_store is not None and image_path in image_store:
+            stored = image_store.get(image_path)
+            image_data, b64, detail = stored.data, stored.b64, stored.detail
+        else:
+            detail = "auto"
+            with open(image_path, "rb") as f:
+                image_data = f.read()
+                b64 = base64.b64encode(image_data).decode("utf-8")
+    except Exception as e:
+        return {
+            "movement": "Unknown",
+            "equipment": "Unknown",
+            "confidence": 0,
+            "error": f"Failed to read image: {str(e)}"
+        }
+
+    try:
+        cascade = CASCADE_ENABLED if cascade is None else cascade
+        fast_answer = None
+        if cascade and model != CASCADE_FAST_MODEL:
+            accepted, fast_answer = _run_fast_tier(image_data, deadline, priority)
+            if accepted:
+                return _normalise(accepted)
+
+        start = time.monotonic()
+        parsed = _request_prediction(b64, model, detail, deadline, priority, budget_cap=budget_cap)
+        metrics.observe("exercise_cascade_latency_sec", time.monotonic() - start, tier="full")
+        metrics.increment("exercise_cascade_total", tier="full", outcome="answered")
+        parsed["model_tier"] = "full"
+
+        # Record whether the cheap model would have been right, so thresholds can be tuned from data
+        if fast_answer and is_valid_prediction(fast_answer):
+            agreed = fast_answer.get("movement", "").lower() == str(parsed.get("movement", "")).lower()
+            metrics.increment(
+                "exercise_cascade_agreement_total",
+                equipment=fast_answer["equipment"],
+                agreed=agreed,
+            )
+
+        return _normalise(parsed)
 
     except Exception as e:
         return {
@@ -86,3 +193,11 @@ Return your analysis in strict JSON format only:
             "confidence": 0,
             "error": str(e)
         }
+
+
+def _normalise(parsed: dict) -> dict:
+    parsed["movement"] = parsed.get("movement") or "Unknown"
+    parsed["equipment"] = parsed.get("equipment") or "Unknown"
+    parsed["variation"] = parsed.get("variation", "")
+    parsed["confidence"] = parsed.get("confidence", 0)
+    return parsed
@@ -1,12 +1,16 @@
 import os
 import cv2
-import numpy as np
+
+from backend.ai.analyze.collage_renderer import render_collage
 
 # Use Render's mounted disk for speed and consistency
 BASE_DISK_PATH = "/mnt/data"
 
-def export_static_keyframe_collage(video_path: str, output_dir: str = os.path.join(BASE_DISK_PATH, "fallback_collages")) -> str:
-    os.makedirs(output_dir, exist_ok=True)
+FALLBACK_COLLAGE_TOKEN_BUDGET = int(os.getenv("GYMVID_FALLBACK_COLLAGE_TOKEN_BUDGET", "765"))
+
+def export_static_keyframe_collage(video_path: str, output_dir: str = os.path.join(BASE_DISK_PATH, "fallback_collages"), image_store=None) -> str:
+    if image_store is None:
+        os.makedirs(output_dir, exist_ok=True)
 
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
@@ -24,23 +28,18 @@ def export_static_keyframe_collage(video_path: str, output_dir: str = os.path.jo
         cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
         ret, frame = cap.read()
         if ret:
-            resized = cv2.resize(frame, (256, 256))
-            frames.append(resized)
+            frames.append(frame)
 
     cap.release()
 
     if len(frames) != 9:
         raise ValueError("Not enough frames extracted for fallback collage")
 
-    # Build 3x3 collage
-    collage_rows = []
-    for i in range(0, 9, 3):
-        row = np.hstack(frames[i:i + 3])
-        collage_rows.append(row)
+    collage = render_collage(frames, FALLBACK_COLLAGE_TOKEN_BUDGET, stage="fallback_collage")
 
-    collage = np.vstack(collage_rows)
+    if image_store is not None:
+        image_store.put_bytes("fallback_collage.jpg", collage.data, detail=collage.detail)
+        return "fallback_collage.jpg"
 
     collage_path = os.path.join(output_dir, "fallback_collage.jpg")
-    cv2.imwrite(collage_path, collage, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
-
-    return collage_path
+    return collage.save(collage_path)
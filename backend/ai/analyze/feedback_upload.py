@@ -1,15 +1,28 @@
 from fastapi import APIRouter, UploadFile, File, Form
-from backend.ai.analyze.coaching_feedback import generate_feedback
-from backend.ai.analyze.video_analysis import analyze_video
+from fastapi.responses import JSONResponse
+from backend.ai.analyze.coaching_feedback import (
+    generate_feedback,
+    summarise_set,
+    build_coaching_prompt,
+    coaching_request_params,
+)
+from backend.ai.analyze import batch_coaching, model_usage
 from backend.ai.analyze.rep_detection import run_rep_detection_from_landmark_y
-from backend.ai.analyze.keyframe_collage import export_keyframe_collages
-from backend.ai.analyze.fallback_keyframes import export_static_keyframe_collage
-from backend.utils.aws_utils import upload_file_to_s3
+from backend.ai.analyze import cpu_pool
+from backend.ai.analyze.deadline import RequestDeadline
+from backend.ai.analyze.image_store import ImageStore
+from backend.ai.analyze.gpt_schemas import track_submission, response_format_for, CoachingFeedbackResponse
+from backend.utils.content_store import ContentItem, upload_content
+from backend.utils.upload_sink import save_upload, UploadRejected
+from backend.utils.resumable_uploads import claim_upload
+from backend.utils import metrics
 
 import os
 import logging
+from typing import Optional
 import traceback
 import asyncio
+import contextvars
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 
 # Set up logging
@@ -17,52 +30,69 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(leve
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-executor = ThreadPoolExecutor(max_workers=2)
+# Pose extraction and collage rendering run in cpu_pool; these threads only carry rep detection and the coaching call
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("GYMVID_FEEDBACK_THREADS", "8")))
 
 # Use mounted disk path for large temporary files
 DISK_BASE_PATH = "/mnt/data"
 
 @router.post("/feedback_upload")
 async def feedback_upload(
-    video: UploadFile = File(...),
+    video: Optional[UploadFile] = File(None),
     user_id: str = Form(...),
-    movement: str = Form(...)
+    movement: str = Form(...),
+    deferred: bool = Form(False),
+    upload_id: Optional[str] = Form(None)
 ):
     logger.info(f"=== FEEDBACK_UPLOAD ENDPOINT CALLED ===")
     logger.info(f"user_id: {user_id}")
     logger.info(f"movement: {movement}")
-    logger.info(f"video filename: {video.filename}")
-    logger.info(f"video content_type: {video.content_type}")
+    logger.info(f"deferred: {deferred}")
+    logger.info(f"upload_id: {upload_id}")
+    if video:
+        logger.info(f"video filename: {video.filename}")
+        logger.info(f"video content_type: {video.content_type}")
 
     tmp_path = None
+    deadline = RequestDeadline(stages=["coaching_feedback"])
     try:
-        if not video.filename:
+        if not upload_id and not (video and video.filename):
             return {"success": False, "error": "No video file provided", "error_type": "invalid_input"}
 
         if not user_id or not movement:
             return {"success": False, "error": "Missing required parameters: user_id or movement", "error_type": "invalid_input"}
 
-        video_data = await video.read()
-
         MAX_FILE_SIZE = 200 * 1024 * 1024
-        if len(video_data) > MAX_FILE_SIZE:
-            logger.warning(f"Video file too large: {len(video_data) / 1024 / 1024:.2f}MB")
-            return {"success": False, "error": "Video file is too large. Please use a video under 200MB.", "error_type": "file_too_large"}
-
-        os.makedirs(DISK_BASE_PATH, exist_ok=True)
-        tmp_path = os.path.join(DISK_BASE_PATH, f"upload_{user_id}_{video.filename}")
-        with open(tmp_path, "wb") as f:
-            f.write(video_data)
+        try:
+            if upload_id:
+                # A finished resumable upload is moved into place rather than sent again
+                tmp_path = os.path.join(DISK_BASE_PATH, f"upload_{user_id}_{upload_id}")
+                # Checked before the upload is consumed, so an oversized one isn't lost
+                saved = claim_upload(upload_id, tmp_path, user_id, max_bytes=MAX_FILE_SIZE)
+            else:
+                tmp_path = os.path.join(DISK_BASE_PATH, f"upload_{user_id}_{os.path.basename(video.filename)}")
+                saved = await save_upload(video, tmp_path, MAX_FILE_SIZE)
+        except UploadRejected as rejected:
+            if rejected.error_type == "file_too_large":
+                return {"success": False, "error": "Video file is too large. Please use a video under 200MB.", "error_type": "file_too_large"}
+            return {"success": False, "error": str(rejected), "error_type": rejected.error_type}
 
         logger.info(f"Video saved to: {tmp_path}")
-        logger.info(f"File size: {os.path.getsize(tmp_path)} bytes")
+        track_submission(tmp_path, "feedback_upload", fingerprint=saved.sha256)
+        model_usage.set_request("feedback_upload", user_id)
+        logger.info(f"File size: {saved.size} bytes ({saved.container}), sha256 {saved.sha256}")
 
         # Step 1: Analyze video
         try:
             loop = asyncio.get_event_loop()
-            video_data = await loop.run_in_executor(executor, analyze_video, tmp_path)
+            with metrics.timer("stage_latency_sec", stage="video_analysis"):
+                video_data = await cpu_pool.analyze_video_async(tmp_path)
             logger.info(f"Video analysis complete. FPS: {video_data.get('fps')}, Best landmark: {video_data.get('best_landmark')}")
             logger.info(f"Raw Y points: {len(video_data.get('raw_y', []))}")
+        except cpu_pool.CpuPoolBusy as busy:
+            logger.warning(f"⚠️ {busy}")
+            return JSONResponse(status_code=503, headers={"Retry-After": "10"},
+                                content={"success": False, "error": str(busy), "error_type": "server_busy"})
         except Exception as video_error:
             logger.error(f"Video analysis failed: {str(video_error)}")
             return {"success": False, "error": f"Video analysis failed: {str(video_error)}", "error_type": "video_analysis_failed"}
@@ -70,10 +100,11 @@ async def feedback_upload(
         # Step 2: Rep detection
         rep_data = None
         try:
-            rep_data = await loop.run_in_executor(
-                executor, run_rep_detection_from_landmark_y,
-                video_data["raw_y"], video_data["fps"]
-            )
+            with metrics.timer("stage_latency_sec", stage="rep_detection"):
+                rep_data = await loop.run_in_executor(
+                    executor, run_rep_detection_from_landmark_y,
+                    video_data["raw_y"], video_data["fps"]
+                )
             if rep_data and isinstance(rep_data, list):
                 logger.info(f"Detected {len(rep_data)} reps")
             else:
@@ -83,48 +114,66 @@ async def feedback_upload(
             logger.warning(f"[⚠️] Rep detection failed: {str(rep_error)}")
             rep_data = None
 
-        # Step 3: Generate keyframe collages and upload to S3
+        # Step 3: Generate keyframe collages (in memory) and upload to S3
+        image_store = ImageStore()
         try:
             if isinstance(rep_data, list) and len(rep_data) > 0:
                 try:
-                    local_collages = await loop.run_in_executor(
-                        executor, export_keyframe_collages, tmp_path, rep_data
-                    )
+                    local_collages = await cpu_pool.export_collages_async(tmp_path, rep_data, image_store)
                     logger.info(f"Generated {len(local_collages)} collages from rep data")
                 except Exception as collage_error:
                     logger.warning(f"Failed to generate rep-based collages: {str(collage_error)}")
-                    local_collages = [await loop.run_in_executor(
-                        executor, export_static_keyframe_collage, tmp_path
-                    )]
+                    local_collages = await cpu_pool.export_collages_async(tmp_path, None, image_store, kind="static")
             else:
                 logger.info("Using fallback keyframe due to missing rep data")
-                local_collages = [await loop.run_in_executor(
-                    executor, export_static_keyframe_collage, tmp_path
-                )]
-
-            collage_paths = []
-            for local_path in local_collages:
-                filename = os.path.basename(local_path)
-                s3_key = f"collages/{user_id}/{filename}"
-                s3_url = upload_file_to_s3(local_path, s3_key)
-                collage_paths.append(s3_url)
+                local_collages = await cpu_pool.export_collages_async(tmp_path, None, image_store, kind="static")
+
+            # All collages go up in parallel; a failed one is dropped rather than failing the request
+            with metrics.timer("stage_latency_sec", stage="collage_upload"):
+                uploads = upload_content([
+                    ContentItem(f"collages/{user_id}/{name}", "collages", data=image_store.get(name).data)
+                    for name in local_collages
+                ])
+            collage_paths = [upload.url for upload in uploads if upload.ok]
+            if not collage_paths:
+                raise Exception(f"Failed to upload collages: {uploads[0].error if uploads else 'no collages'}")
 
         except Exception as keyframe_error:
             logger.error(f"Keyframe generation failed: {str(keyframe_error)}")
             return {"success": False, "error": "Failed to generate or upload keyframe collage.", "error_type": "keyframe_generation_failed"}
 
+        # Step 4 (deferred): queue the coaching call for the next batch and hand back a job id
+        if deferred:
+            exercise_name, rep_summaries, total_tut, last_rpe = summarise_set(
+                {"predicted_exercise": movement, "feedback_depth": "standard"}, rep_data
+            )
+            request_params = coaching_request_params(build_coaching_prompt(exercise_name, rep_summaries, collage_paths))
+            request_params["response_format"] = response_format_for(CoachingFeedbackResponse)
+            job_id = batch_coaching.enqueue(user_id, request_params, meta={"total_tut": total_tut, "rpe": last_rpe, "video_sha256": saved.sha256})
+            return {
+                "success": True,
+                "deferred": True,
+                "job_id": job_id,
+                "status": "queued",
+                "movement": movement
+            }
+
         # Step 4: Generate coaching feedback
         try:
-            feedback = await loop.run_in_executor(
-                executor, generate_feedback,
-                tmp_path, user_id,
-                {
-                    "predicted_exercise": movement,
-                    "feedback_depth": "standard",
-                    "collage_urls": collage_paths
-                },
-                rep_data
-            )
+            # Run in a copy of this request's context so a parse failure is tied to its submission
+            with metrics.timer("stage_latency_sec", stage="coaching_feedback"):
+                feedback = await loop.run_in_executor(
+                    executor, contextvars.copy_context().run, generate_feedback,
+                    tmp_path, user_id,
+                    {
+                        "predicted_exercise": movement,
+                        "feedback_depth": "standard",
+                        "collage_urls": collage_paths
+                    },
+                    rep_data,
+                    deadline,
+                    image_store
+                )
         except Exception as feedback_error:
             logger.error(f"Feedback generation failed: {str(feedback_error)}")
             return {
@@ -163,3 +212,12 @@ async def feedback_upload(
                 os.remove(tmp_path)
             except Exception as cleanup_error:
                 logger.warning(f"Failed to cleanup temp file: {cleanup_error}")
+
+
+@router.get("/feedback_jobs/{job_id}")
+async def feedback_job(job_id: str):
+    """Status of a deferred coaching job; `feedback` is filled in once the job completes."""
+    job = batch_coaching.get_job(job_id)
+    if job is None:
+        return {"success": False, "error": "Unknown feedback job", "error_type": "job_not_found"}
+    return {"success": True, **job}
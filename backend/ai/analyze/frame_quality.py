@@ -0,0 +1,204 @@
+import os
+import logging
+import cv2
+import numpy as np
+
+from backend.ai.analyze.keyframe_collage import get_video_rotation, rotate_frame_if_needed
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Frames sent to weight estimation
+WEIGHT_MAX_FRAMES = 3
+
+# Long side of each selected frame. 768 keeps a portrait phone frame to two 512px tiles at
+# high detail while leaving plate rims and printed numbers legible.
+PLATE_TILE_SIDE = int(os.getenv("GYMVID_PLATE_TILE_SIDE", "768"))
+
+# Extra frames are only sent if they score at least this fraction of the best one
+QUALITY_KEEP_RATIO = 0.75
+
+# Candidate offsets (in frames) around each rep's start and stop, where the bar is stationary
+CANDIDATE_OFFSETS = [-6, -3, 0, 3, 6]
+
+# Selected frames must be at least this many frames apart so they show different moments
+MIN_FRAME_GAP = 10
+
+# Frames are scored on a small greyscale copy; blur and exposure survive the downscale
+SCORE_SIDE = 256
+
+SCORE_WEIGHTS = {"sharpness": 0.6, "exposure": 0.2, "bar_visibility": 0.2}
+
+
+def _to_score_stack(frames: list) -> np.ndarray:
+    """Greyscale, equally sized float32 stack of the frames, shape (N, H, W)."""
+    height, width = frames[0].shape[:2]
+    scale = SCORE_SIDE / max(height, width)
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    grey = [
+        cv2.resize(cv2.cvtColor(f, cv2.COLOR_BGR2GRAY), size, interpolation=cv2.INTER_AREA)
+        for f in frames
+    ]
+    return np.stack(grey).astype(np.float32)
+
+
+def score_frames(frames: list) -> dict:
+    """
+    Scores how readable each frame is for plate and bar identification.
+
+    All frames are scored in one batch of numpy operations:
+    - sharpness: variance of the 4-neighbour Laplacian (motion blur flattens it)
+    - exposure: penalises crushed shadows, blown highlights and an off-centre mean
+    - bar_visibility: how strongly one horizontal band dominates the vertical-gradient
+      profile, which is what a visible bar and plate stack look like
+
+    Args:
+        frames (list): BGR frames, all from the same video.
+
+    Returns:
+        dict: {"sharpness", "exposure", "bar_visibility", "score"} arrays of length N, where
+        "score" is the weighted combination of the per-batch normalised components.
+    """
+    stack = _to_score_stack(frames)
+
+    laplacian = (
+        stack[:, :-2, 1:-1] + stack[:, 2:, 1:-1] + stack[:, 1:-1, :-2] + stack[:, 1:-1, 2:]
+        - 4 * stack[:, 1:-1, 1:-1]
+    )
+    sharpness = laplacian.reshape(len(stack), -1).var(axis=1)
+
+    clipped = ((stack < 8) | (stack > 247)).reshape(len(stack), -1).mean(axis=1)
+    mean_offset = np.abs(stack.reshape(len(stack), -1).mean(axis=1) - 128) / 128
+    exposure = np.clip(1.0 - 2.0 * clipped - 0.5 * mean_offset, 0.0, 1.0)
+
+    row_energy = np.abs(np.diff(stack, axis=1)).mean(axis=2)
+    bar_visibility = row_energy.max(axis=1) / (np.median(row_energy, axis=1) + 1e-3)
+
+    def normalise(values):
+        spread = values.max() - values.min()
+        return (values - values.min()) / spread if spread > 1e-9 else np.ones_like(values)
+
+    score = (
+        SCORE_WEIGHTS["sharpness"] * normalise(sharpness)
+        + SCORE_WEIGHTS["exposure"] * exposure
+        + SCORE_WEIGHTS["bar_visibility"] * normalise(bar_visibility)
+    )
+    return {"sharpness": sharpness, "exposure": exposure, "bar_visibility": bar_visibility, "score": score}
+
+
+def pick_best(scores: np.ndarray, positions: list, max_frames: int = WEIGHT_MAX_FRAMES, min_gap: int = MIN_FRAME_GAP) -> list:
+    """
+    Picks up to `max_frames` indices by score, skipping near-duplicates of frames already
+    chosen and anything well below the best frame.
+
+    Args:
+        scores (np.ndarray): Combined quality score per candidate.
+        positions (list): Frame number of each candidate, used for the minimum gap.
+    """
+    order = np.argsort(-scores)
+    best = scores[order[0]]
+    chosen = []
+    for i in order:
+        if len(chosen) >= max_frames:
+            break
+        if chosen and scores[i] < best * QUALITY_KEEP_RATIO:
+            break
+        if any(abs(positions[i] - positions[j]) < min_gap for j in chosen):
+            continue
+        chosen.append(int(i))
+    return chosen
+
+
+def candidate_frame_numbers(rep_data: list, frame_count: int) -> list:
+    """Frame numbers around each rep's start and stop, clipped to the video and de-duplicated."""
+    candidates = set()
+    for rep in rep_data:
+        for key in ("start_frame", "stop_frame"):
+            frame_no = rep.get(key)
+            if frame_no is None:
+                continue
+            for offset in CANDIDATE_OFFSETS:
+                candidates.add(min(max(frame_no + offset, 0), max(frame_count - 1, 0)))
+    return sorted(candidates)
+
+
+def resize_for_plates(frame, max_side: int = PLATE_TILE_SIDE):
+    height, width = frame.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1:
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def select_weight_keyframes(video_path: str, rep_data: list, image_store, max_frames: int = WEIGHT_MAX_FRAMES) -> list:
+    """
+    Chooses the 1–3 clearest stationary-bar frames for weight estimation.
+
+    Candidates are read around each rep's start and stop, scored together, and the winners
+    are stored as "weight_frames/NN.jpg" (high detail, long side PLATE_TILE_SIDE).
+
+    Returns:
+        list: Image store names of the selected frames (empty if nothing could be read).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Unable to open video: {video_path}")
+
+    rotation = get_video_rotation(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    frames, positions = [], []
+    next_frame = None
+    for frame_no in candidate_frame_numbers(rep_data, frame_count):
+        # Candidates are clustered, so only seek when we can't just read forward
+        if next_frame is None or not 0 <= frame_no - next_frame <= 6:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
+            next_frame = frame_no
+        while next_frame < frame_no:
+            cap.grab()
+            next_frame += 1
+        ret, frame = cap.read()
+        next_frame += 1
+        if not ret or frame is None:
+            continue
+        frames.append(rotate_frame_if_needed(frame, rotation))
+        positions.append(frame_no)
+    cap.release()
+
+    if not frames:
+        return []
+
+    scores = score_frames(frames)
+    chosen = pick_best(scores["score"], positions, max_frames=max_frames)
+    metrics.observe("weight_keyframe_candidates", len(frames))
+    metrics.observe("weight_keyframes_selected", len(chosen))
+
+    names = []
+    for rank, i in enumerate(chosen):
+        name = f"weight_frames/{rank:02d}.jpg"
+        image_store.put_array(name, resize_for_plates(frames[i]), quality=90, detail="high")
+        names.append(name)
+
+    logger.info(
+        f"🔎 Weight keyframes: picked frames {[positions[i] for i in chosen]} of {len(frames)} candidates "
+        f"(sharpness {[round(float(scores['sharpness'][i]), 1) for i in chosen]})"
+    )
+    return names
+
+
+def rank_image_files(paths: list, max_frames: int = WEIGHT_MAX_FRAMES) -> list:
+    """Orders saved keyframe JPEGs best-first and keeps up to `max_frames` of them."""
+    frames, kept = [], []
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is not None:
+            frames.append(frame)
+            kept.append(path)
+    if not frames:
+        return []
+    if len({f.shape for f in frames}) > 1:
+        frames = [cv2.resize(f, (frames[0].shape[1], frames[0].shape[0])) for f in frames]
+
+    scores = score_frames(frames)["score"]
+    chosen = pick_best(scores, list(range(0, len(kept) * MIN_FRAME_GAP, MIN_FRAME_GAP)), max_frames=max_frames)
+    return [kept[i] for i in chosen]
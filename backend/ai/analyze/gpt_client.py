@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import OpenAI, APIStatusError, APITimeoutError, APIConnectionError, RateLimitError
+from dotenv import load_dotenv
+
+from backend.ai.analyze.deadline import DeadlineExceeded
+from backend.ai.analyze.llm_scheduler import scheduler
+from backend.ai.analyze.vision_tokens import estimate_request_tokens
+from backend.ai.analyze import model_usage
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Shared OpenAI client for every model stage
+load_dotenv()
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Retries are handled here (hedged duplicate on failure, 429 backoff in the scheduler)
+# so the SDK must not retry on its own
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL, max_retries=0)
+
+# ✅ Hedging configuration
+HEDGING_ENABLED = os.getenv("GYMVID_HEDGING_ENABLED", "true") == "true"
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SEC = float(os.getenv("GYMVID_HEDGE_MIN_DELAY_SEC", "1.5"))
+
+# Used until a stage has enough latency samples to compute its own p95
+HEDGE_DEFAULT_DELAY_SEC = {
+    "exercise_prediction": 6.0,
+    "weight_estimation": 6.0,
+    "coaching_feedback": 15.0,
+}
+
+# Scheduler lane for each stage unless the caller picks one
+STAGE_DEFAULT_LANE = {
+    "exercise_prediction": "standard",
+    "weight_estimation": "standard",
+    "coaching_feedback": "background",
+}
+
+# Used when a caller has no request deadline
+DEFAULT_STAGE_TIMEOUT_SEC = float(os.getenv("GYMVID_STAGE_TIMEOUT_SEC", "60"))
+
+_hedge_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GYMVID_HEDGE_POOL_SIZE", "16")),
+    thread_name_prefix="gpt-call",
+)
+
+
+def _latency_tags(stage: str, model: str = None) -> dict:
+    # Per model as well as per stage: a cascade's cheap and full tiers share a stage but not a latency profile
+    return {"stage": stage, "model": model} if model else {"stage": stage}
+
+
+def hedge_delay_for(stage: str, model: str = None) -> float:
+    """Seconds to wait on the primary request before sending a duplicate: the stage's observed p95 for `model`."""
+    tags = _latency_tags(stage, model)
+    if metrics.sample_count("gpt_latency_sec", **tags) >= HEDGE_MIN_SAMPLES:
+        delay = metrics.percentile("gpt_latency_sec", HEDGE_PERCENTILE, **tags)
+    else:
+        delay = HEDGE_DEFAULT_DELAY_SEC.get(stage, 10.0)
+    return max(HEDGE_MIN_DELAY_SEC, delay)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 429s and 5xx are worth sending again; other 4xx would fail the same way."""
+    if isinstance(error, (APITimeoutError, APIConnectionError, RateLimitError, DeadlineExceeded, TimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def chat_completion(stage: str, deadline=None, hedge: bool = None, priority: str = None, budget_cap: float = None, **params):
+    """
+    Runs a chat completion for one pipeline stage within its deadline budget.
+
+    Every attempt is admitted by the shared LLM scheduler, which orders calls by
+    priority lane and keeps us inside the account's request and token quotas.
+
+    If the first request is still outstanding after the stage's p95 latency (or fails with a
+    timeout, 429 or 5xx), a duplicate request is sent and whichever response arrives first is
+    used. Any other error (bad request, auth, content policy) is raised straight away.
+
+    Args:
+        stage (str): Stage name used for budgets and latency tracking (e.g. "exercise_prediction").
+        deadline (RequestDeadline, optional): Request-wide deadline to draw the stage budget from.
+        hedge (bool, optional): Override the global hedging switch for this call.
+        priority (str, optional): Scheduler lane ("interactive", "standard", "background").
+        budget_cap (float, optional): Upper bound on this call's budget, so a first attempt
+            (e.g. a cascade's cheap tier) leaves time for the stage to try again.
+        **params: Passed straight to `client.chat.completions.create`.
+
+    Returns:
+        The OpenAI chat completion response.
+
+    Raises:
+        DeadlineExceeded: If no response arrived within the stage budget.
+    """
+    budget = deadline.begin(stage) if deadline else DEFAULT_STAGE_TIMEOUT_SEC
+    if budget_cap is not None:
+        budget = min(budget, budget_cap)
+    hedge = HEDGING_ENABLED if hedge is None else hedge
+    start = time.monotonic()
+    end = start + budget
+    latency_tags = _latency_tags(stage, params.get("model"))
+    hedge_at = start + hedge_delay_for(stage, params.get("model"))
+    lane = priority or STAGE_DEFAULT_LANE.get(stage, "standard")
+    estimated_tokens = estimate_request_tokens(params)
+    # Captured here: attempts run on pool threads, outside this request's context
+    request = model_usage.current_request()
+
+    def send():
+        timeout = max(0.1, end - time.monotonic())
+        return client.chat.completions.create(timeout=timeout, **params)
+
+    def attempt(number):
+        sent_at = time.monotonic()
+        response = scheduler.run(lane, estimated_tokens, send, give_up_at=end)
+        # Every completed attempt is billed, including a hedge that lost the race
+        model_usage.record_call(stage, params, response, time.monotonic() - sent_at, request=request, hedge=number > 1)
+        return number, response
+
+    pending = {_hedge_pool.submit(attempt, 1)}
+    hedged = not hedge
+    last_error = None
+
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+
+        wait_for = end - now
+        if not hedged:
+            wait_for = min(wait_for, max(0.0, hedge_at - now))
+
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                number, response = future.result()
+                latency = time.monotonic() - start
+                metrics.observe("gpt_latency_sec", latency, **latency_tags)
+                if number > 1:
+                    metrics.increment("gpt_hedge_wins_total", stage=stage)
+                return response
+            last_error = error
+            logger.warning(f"⚠️ {stage} model call failed: {error}")
+            if not is_retryable(error):
+                metrics.increment("gpt_errors_total", stage=stage, retryable=False)
+                raise error
+
+        if not hedged and (time.monotonic() >= hedge_at or not pending):
+            hedged = True
+            metrics.increment("gpt_hedges_total", stage=stage)
+            logger.info(f"🪃 Sending hedged {stage} request after {time.monotonic() - start:.2f}s")
+            pending.add(_hedge_pool.submit(attempt, 2))
+        elif not pending:
+            raise last_error
+
+    metrics.increment("gpt_deadline_exceeded_total", stage=stage)
+    raise DeadlineExceeded(f"{stage} model call exceeded its {budget:.1f}s budget")
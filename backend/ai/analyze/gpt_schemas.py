@@ -0,0 +1,316 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from backend.ai.analyze.gpt_client import chat_completion, STAGE_DEFAULT_LANE
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Structured outputs: the API constrains decoding to our JSON schema
+STRUCTURED_OUTPUTS_ENABLED = os.getenv("GYMVID_STRUCTURED_OUTPUTS", "true") == "true"
+
+# Cheap text-only call that fixes a malformed answer instead of re-running the stage
+SCHEMA_REPAIR_MODEL = os.getenv("GYMVID_SCHEMA_REPAIR_MODEL", "gpt-4o-mini")
+SCHEMA_REPAIR_TIMEOUT_SEC = float(os.getenv("GYMVID_SCHEMA_REPAIR_TIMEOUT_SEC", "8"))
+
+# A submission of the same video within this window of a parse failure counts as a resubmission
+RESUBMISSION_WINDOW_SEC = 30 * 60
+MAX_TRACKED_FAILURES = 1000
+
+EQUIPMENT = Literal["Barbell", "Dumbbell", "Kettlebell", "Cable", "Pin-Loaded Machine", "Plate-Loaded Machine", "Bodyweight", "Resistance Band"]
+MOVEMENT_PATTERN = Literal["Push - Horizontal", "Push - Vertical", "Push - Incline", "Pull - Horizontal", "Pull - Vertical", "Squat", "Hinge", "Isolation", "Core", "Carry"]
+
+
+def _match_literal(value, options):
+    """Case/whitespace-insensitive match of a model's answer onto a Literal's options."""
+    if isinstance(value, str):
+        wanted = re.sub(r"\s+", " ", value).strip().lower()
+        for option in options:
+            if option.lower() == wanted:
+                return option
+    return value
+
+
+class ExercisePrediction(BaseModel):
+    equipment: EQUIPMENT
+    movement_pattern: MOVEMENT_PATTERN
+    variation: Optional[str]
+    movement: str = Field(min_length=1)
+    confidence: int = Field(ge=0, le=100)
+
+    @field_validator("equipment", mode="before")
+    @classmethod
+    def _equipment(cls, value):
+        return _match_literal(value, EQUIPMENT.__args__)
+
+    @field_validator("movement_pattern", mode="before")
+    @classmethod
+    def _pattern(cls, value):
+        return _match_literal(value, MOVEMENT_PATTERN.__args__)
+
+
+class WeightEstimate(BaseModel):
+    equipment: str
+    estimated_weight_kg: float = Field(ge=0)
+    confidence: int = Field(ge=0, le=100)
+
+
+class CoachingObservation(BaseModel):
+    header: str
+    observation: str
+    tip: str
+
+
+class CoachingFeedback(BaseModel):
+    form_rating: int = Field(ge=1, le=10)
+    observations: List[CoachingObservation]
+    summary: str
+
+
+class CoachingFeedbackResponse(BaseModel):
+    coaching_feedback: CoachingFeedback
+
+
+class SchemaError(ValueError):
+    """Raised when a model answer can't be turned into a valid schema instance."""
+
+
+# Keywords the strict json_schema mode rejects; Pydantic still enforces them after parsing
+_UNSUPPORTED_KEYWORDS = {"title", "default", "minimum", "maximum", "minLength", "maxLength", "minItems", "maxItems"}
+
+
+def _strict(schema):
+    if isinstance(schema, list):
+        return [_strict(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    strict = {}
+    for key, value in schema.items():
+        if key in ("properties", "$defs"):
+            # Maps of names to sub-schemas: keep every name, clean each sub-schema
+            strict[key] = {name: _strict(sub) for name, sub in value.items()}
+        elif key not in _UNSUPPORTED_KEYWORDS:
+            strict[key] = _strict(value)
+    if strict.get("type") == "object" and "properties" in strict:
+        strict["required"] = list(strict["properties"])
+        strict["additionalProperties"] = False
+    return strict
+
+
+def response_format_for(schema_cls) -> dict:
+    """OpenAI `response_format` that makes the model emit exactly `schema_cls`'s JSON shape."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": schema_cls.__name__,
+            "strict": True,
+            "schema": _strict(schema_cls.model_json_schema()),
+        },
+    }
+
+
+def _extract_json(text: str):
+    match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if match:
+        text = match.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end == -1:
+        raise SchemaError("No JSON object in model answer")
+    return json.loads(text[start:end + 1])
+
+
+def _coerce(data, errors):
+    """Fixes the mistakes models make most often: "85%" for 85, out-of-range numbers, stray units."""
+    for error in errors:
+        target = data
+        for key in error["loc"][:-1]:
+            target = target[key]
+        key = error["loc"][-1] if error["loc"] else None
+        if key is None:
+            continue
+        value = target.get(key) if isinstance(target, dict) else target[key]
+        if error["type"] in ("int_parsing", "float_parsing", "int_from_float") and isinstance(value, (str, float)):
+            number = re.search(r"-?\d+(\.\d+)?", str(value))
+            if number:
+                parsed = float(number.group())
+                target[key] = round(parsed) if error["type"] != "float_parsing" else parsed
+        elif error["type"] in ("greater_than_equal", "greater_than") and isinstance(value, (int, float)):
+            target[key] = error["ctx"].get("ge", error["ctx"].get("gt"))
+        elif error["type"] in ("less_than_equal", "less_than") and isinstance(value, (int, float)):
+            target[key] = error["ctx"].get("le", error["ctx"].get("lt"))
+    return data
+
+
+def _wrap_if_unwrapped(data, schema_cls):
+    """{"form_rating": ...} where {"coaching_feedback": {...}} was expected."""
+    fields = schema_cls.model_fields
+    if isinstance(data, dict) and len(fields) == 1:
+        (name, field), = fields.items()
+        if name not in data and isinstance(field.annotation, type) and issubclass(field.annotation, BaseModel):
+            return {name: data}
+    return data
+
+
+def parse_locally(text: str, schema_cls):
+    """
+    Validates a model answer, repairing it locally if it's close.
+
+    Returns:
+        tuple: (schema instance, "ok" | "repaired_local")
+
+    Raises:
+        SchemaError: With the validation errors, if local repair wasn't enough.
+    """
+    try:
+        return schema_cls.model_validate_json(text), "ok"
+    except ValidationError:
+        pass
+
+    try:
+        data = _wrap_if_unwrapped(_extract_json(text), schema_cls)
+    except (json.JSONDecodeError, SchemaError) as e:
+        raise SchemaError(f"Unparseable JSON: {e}")
+
+    for _ in range(3):
+        try:
+            return schema_cls.model_validate(data), "repaired_local"
+        except ValidationError as e:
+            errors = e.errors()
+            try:
+                data = _coerce(data, errors)
+            except (KeyError, IndexError, TypeError):
+                break
+    raise SchemaError(f"Schema validation failed: {json.dumps([{'loc': list(err['loc']), 'msg': err['msg']} for err in errors])}")
+
+
+def repair_with_model(text: str, problem: str, schema_cls, stage: str, deadline=None, priority: str = None):
+    """
+    Asks a cheap model to rewrite a broken answer to the schema. No images are resent.
+    The repair runs in the same scheduler lane as the stage it repairs.
+    """
+    response = chat_completion(
+        stage="schema_repair",
+        deadline=deadline,
+        hedge=False,
+        priority=priority or STAGE_DEFAULT_LANE.get(stage, "standard"),
+        budget_cap=SCHEMA_REPAIR_TIMEOUT_SEC,
+        model=SCHEMA_REPAIR_MODEL,
+        temperature=0,
+        max_tokens=1000,
+        response_format=response_format_for(schema_cls),
+        messages=[
+            {"role": "system", "content": "You fix malformed JSON so it matches a schema. Keep every value the original answer intended."},
+            {"role": "user", "content": f"This {stage} answer failed validation ({problem}).\n\nOriginal answer:\n{text}"},
+        ],
+    )
+    return schema_cls.model_validate_json(response.choices[0].message.content)
+
+
+def structured_completion(stage: str, schema_cls, deadline=None, priority: str = None, budget_cap: float = None,
+                          repair: bool = True, **params):
+    """
+    Runs a model stage whose answer must match `schema_cls`.
+
+    The call uses strict structured outputs (unless disabled), so well-behaved answers
+    validate directly. Anything else gets local repair, then one cheap text-only repair
+    call, so a formatting slip never sends the user back to re-upload the video.
+
+    Args:
+        stage (str): Pipeline stage, passed to chat_completion and used for metrics.
+        schema_cls: Pydantic model the answer must match.
+        repair (bool): Allow the model repair call (callers with their own fallback, like a
+            cascade's cheap tier, can turn it off).
+        **params: Passed to chat_completion.
+
+    Returns:
+        dict: The validated answer.
+
+    Raises:
+        SchemaError: If the answer couldn't be validated or repaired.
+    """
+    if STRUCTURED_OUTPUTS_ENABLED:
+        params.setdefault("response_format", response_format_for(schema_cls))
+    response = chat_completion(stage=stage, deadline=deadline, priority=priority, budget_cap=budget_cap, **params)
+    text = response.choices[0].message.content or ""
+
+    try:
+        parsed, outcome = parse_locally(text, schema_cls)
+        metrics.increment("gpt_parse_total", stage=stage, outcome=outcome)
+        return parsed.model_dump()
+    except SchemaError as e:
+        problem = str(e)
+        logger.warning(f"⚠️ {stage} answer failed schema validation: {problem}")
+
+    if repair:
+        try:
+            parsed = repair_with_model(text, problem, schema_cls, stage, deadline=deadline, priority=priority)
+            metrics.increment("gpt_parse_total", stage=stage, outcome="repaired_model")
+            logger.info(f"🩹 Repaired {stage} answer with {SCHEMA_REPAIR_MODEL}")
+            return parsed.model_dump()
+        except Exception as repair_error:
+            problem = f"{problem}; repair failed: {repair_error}"
+
+    metrics.increment("gpt_parse_total", stage=stage, outcome="failed")
+    _record_failed_submission()
+    raise SchemaError(problem)
+
+
+# ✅ Resubmission tracking: did a parse failure make the user upload the same video again?
+_current_submission = contextvars.ContextVar("gymvid_submission", default=None)
+_failed_submissions = OrderedDict()
+_failed_lock = threading.Lock()
+
+
+def video_fingerprint(path: str) -> str:
+    """Cheap identity for an uploaded video: its size plus hashes of its first and last 256KB."""
+    digest = hashlib.sha1()
+    size = os.path.getsize(path)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(256 * 1024))
+        if size > 512 * 1024:
+            f.seek(-256 * 1024, os.SEEK_END)
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def track_submission(video_path: str, endpoint: str, fingerprint: str = None):
+    """
+    Marks the current request as a submission of `video_path` so a parse failure can be
+    tied to it, and counts it as a resubmission if the same video recently failed to parse.
+    Pass `fingerprint` (e.g. the content hash taken while saving the upload) to skip re-reading the file.
+    """
+    if fingerprint is None:
+        try:
+            fingerprint = video_fingerprint(video_path)
+        except OSError:
+            return None
+    _current_submission.set(fingerprint)
+    with _failed_lock:
+        failed_at = _failed_submissions.pop(fingerprint, None)
+    if failed_at is not None and time.time() - failed_at <= RESUBMISSION_WINDOW_SEC:
+        metrics.increment("gpt_parse_resubmissions_total", endpoint=endpoint)
+        logger.info(f"🔁 Resubmission after a parse failure on {endpoint}")
+    metrics.increment("gpt_submissions_total", endpoint=endpoint)
+    return fingerprint
+
+
+def _record_failed_submission():
+    fingerprint = _current_submission.get()
+    if not fingerprint:
+        return
+    with _failed_lock:
+        _failed_submissions[fingerprint] = time.time()
+        _failed_submissions.move_to_end(fingerprint)
+        while len(_failed_submissions) > MAX_TRACKED_FAILURES:
+            _failed_submissions.popitem(last=False)
@@ -1,14 +1,32 @@
+import os
+import math
+import statistics
+
+from backend.ai.analyze.vision_tokens import CHARS_PER_TOKEN
+
+# ✅ Rough prompt budget for the rep summary block; long sets are summarised to fit it
+REP_SUMMARY_TOKEN_BUDGET = int(os.getenv("GYMVID_REP_SUMMARY_TOKEN_BUDGET", "400"))
+
+# Consecutive reps are grouped while they stay within these tolerances of the group's first rep
+GROUP_RPE_TOLERANCE = 0.5
+GROUP_ROM_TOLERANCE = 0.10  # fraction of the first rep's ROM
+
+# A rep is an outlier when it's this many median absolute deviations from the set median.
+# The MAD is floored at a fraction of the median so very consistent sets don't flag noise.
+OUTLIER_MADS = 2.5
+OUTLIER_MIN_MAD_FRACTION = 0.03
+
+
 def compress_rep_data_for_gpt(rep_data: list, feedback_depth: str = "standard") -> list:
     summaries = []
-
     for rep in rep_data:
         rep_num = rep.get("rep")
         rpe = rep.get("estimated_RPE")
         stall = rep.get("velocity_stall", False)
         rom = rep.get("range_of_motion_cm")
-        smooth = rep.get("smoothness_score")
-        path = rep.get("path_deviation_cm")
-        asym = rep.get("asymmetry_score")
+        smooth = min(rep.get("smoothness_score") or 0, 100)
+        path = rep.get("path_deviation_cm", 0)
+        asym = rep.get("asymmetry_score", 100)
         tempo = rep.get("tempo", {})
         concentric = tempo.get("concentric_sec", 0)
         eccentric = tempo.get("eccentric_sec", 0)
@@ -18,11 +36,10 @@ def compress_rep_data_for_gpt(rep_data: list, feedback_depth: str = "standard")
         if feedback_depth == "simple":
             if stall:
                 summary += " Minor stall detected mid-rep."
-            elif smooth < 85:
+            elif smooth and smooth < 85:
                 summary += " Slightly inconsistent tempo."
             else:
                 summary += " Solid execution with good control."
-
         elif feedback_depth == "standard":
             summary += f" RPE {rpe}, ROM {rom}cm, smoothness {smooth}/100."
             if stall:
@@ -31,7 +48,6 @@ def compress_rep_data_for_gpt(rep_data: list, feedback_depth: str = "standard")
                 summary += f" Drifted laterally ({path}cm)."
             if asym is not None and asym < 85:
                 summary += f" Asymmetry score low ({asym}/100)."
-
         elif feedback_depth == "advanced":
             summary += (
                 f" Tempo – Concentric: {concentric:.2f}s, Eccentric: {eccentric:.2f}s. "
@@ -45,5 +61,170 @@ def compress_rep_data_for_gpt(rep_data: list, feedback_depth: str = "standard")
                 summary += f"Asymmetry: {asym}/100."
 
         summaries.append(summary.strip())
-
     return summaries
+
+
+def estimate_text_tokens(lines: list) -> int:
+    return math.ceil(sum(len(line) + 1 for line in lines) / CHARS_PER_TOKEN)
+
+
+def _values(rep_data: list, key: str) -> list:
+    return [rep.get(key) for rep in rep_data if isinstance(rep.get(key), (int, float))]
+
+
+def _fmt(value) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def _span(values: list, unit: str = "") -> str:
+    low, high = min(values), max(values)
+    return f"{_fmt(low)}{unit}" if low == high else f"{_fmt(low)}–{_fmt(high)}{unit}"
+
+
+def _rep_ranges(numbers: list, limit: int = 8) -> str:
+    """[3, 4, 5, 9] -> "3–5, 9"; long lists are cut off with a count of what's left."""
+    ranges = []
+    for n in sorted(numbers):
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    text = [f"{a}" if a == b else f"{a}–{b}" for a, b in ranges[:limit]]
+    if len(ranges) > limit:
+        text.append(f"+{len(ranges) - limit} more")
+    return ", ".join(text)
+
+
+def _overview(rep_data: list) -> list:
+    lines = [f"Set of {len(rep_data)} reps."]
+
+    rpes = _values(rep_data, "estimated_RPE")
+    if rpes:
+        third = max(1, len(rpes) // 3)
+        early, late = statistics.mean(rpes[:third]), statistics.mean(rpes[-third:])
+        trend = "rising" if late - early >= 0.5 else "falling" if early - late >= 0.5 else "flat"
+        lines.append(f"RPE {_span(rpes)}, {trend} (first third avg {early:.1f}, last third avg {late:.1f}).")
+
+    roms = _values(rep_data, "range_of_motion_cm")
+    if roms:
+        q = statistics.quantiles(roms, n=4) if len(roms) > 1 else [roms[0]] * 3
+        lines.append(f"ROM median {q[1]:.1f}cm, middle half {q[0]:.1f}–{q[2]:.1f}cm, range {_span(roms, 'cm')}.")
+
+    smooth = _values(rep_data, "smoothness_score")
+    if smooth:
+        lines.append(f"Smoothness median {statistics.median(smooth):.0f}/100, range {_span(smooth, '/100')}.")
+
+    concentric = [r.get("tempo", {}).get("concentric_sec") for r in rep_data]
+    eccentric = [r.get("tempo", {}).get("eccentric_sec") for r in rep_data]
+    concentric = [v for v in concentric if isinstance(v, (int, float))]
+    eccentric = [v for v in eccentric if isinstance(v, (int, float))]
+    if concentric and eccentric:
+        lines.append(f"Median tempo: concentric {statistics.median(concentric):.2f}s, eccentric {statistics.median(eccentric):.2f}s.")
+
+    stalls = [r.get("rep") for r in rep_data if r.get("velocity_stall")]
+    lines.append(f"Sticking points on reps {_rep_ranges(stalls)}." if stalls else "No sticking points detected.")
+    return lines
+
+
+def _groups(rep_data: list, rpe_tolerance: float, rom_tolerance: float) -> list:
+    """Runs of consecutive reps with similar RPE, ROM and stall status."""
+    groups = []
+    for rep in rep_data:
+        if groups:
+            first = groups[-1][0]
+            same_rpe = abs((rep.get("estimated_RPE") or 0) - (first.get("estimated_RPE") or 0)) <= rpe_tolerance
+            first_rom = first.get("range_of_motion_cm") or 0
+            same_rom = abs((rep.get("range_of_motion_cm") or 0) - first_rom) <= rom_tolerance * max(abs(first_rom), 1)
+            same_stall = bool(rep.get("velocity_stall")) == bool(first.get("velocity_stall"))
+            if same_rpe and same_rom and same_stall:
+                groups[-1].append(rep)
+                continue
+        groups.append([rep])
+    return groups
+
+
+def _group_line(group: list) -> str:
+    first, last = group[0].get("rep"), group[-1].get("rep")
+    label = f"Rep {first}" if first == last else f"Reps {first}–{last}"
+    parts = []
+    for key, name, unit in [("estimated_RPE", "RPE", ""), ("range_of_motion_cm", "ROM", "cm"), ("smoothness_score", "smoothness", "/100")]:
+        values = _values(group, key)
+        if values:
+            parts.append(f"{name} {_span(values, unit)}")
+    if group[0].get("velocity_stall"):
+        parts.append("sticking point each rep")
+    return f"{label}: {', '.join(parts)}."
+
+
+def _outlier_reps(rep_data: list) -> list:
+    """Reps worth describing individually, most severe first (ties broken by rep number)."""
+    def deviation(key):
+        values = _values(rep_data, key)
+        if len(values) < 3:
+            return {}
+        median = statistics.median(values)
+        mad = max(statistics.median(abs(v - median) for v in values), OUTLIER_MIN_MAD_FRACTION * abs(median), 1e-6)
+        return {id(r): abs(r[key] - median) / mad for r in rep_data if isinstance(r.get(key), (int, float))}
+
+    rom_dev = deviation("range_of_motion_cm")
+    smooth_dev = deviation("smoothness_score")
+
+    scored = []
+    for rep in rep_data:
+        severity = 0.0
+        severity += max(0.0, rom_dev.get(id(rep), 0) - OUTLIER_MADS)
+        severity += max(0.0, smooth_dev.get(id(rep), 0) - OUTLIER_MADS)
+        if (rep.get("path_deviation_cm") or 0) > 3.0:
+            severity += 1.0
+        asym = rep.get("asymmetry_score")
+        if asym is not None and asym < 85:
+            severity += 1.0
+        if severity > 0:
+            scored.append((-severity, rep.get("rep") or 0, rep))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [rep for _, _, rep in scored]
+
+
+def summarise_reps_for_gpt(rep_data: list, feedback_depth: str = "standard", token_budget: int = REP_SUMMARY_TOKEN_BUDGET) -> list:
+    """
+    Rep summary lines for the coaching prompt, bounded to roughly `token_budget` tokens.
+
+    Short sets keep one line per rep. Longer sets get a set overview (RPE trend, ROM
+    spread, tempo, sticking-point positions), runs of similar consecutive reps, and
+    individual lines only for outlier reps. The output depends only on the input, so
+    the same set always produces the same prompt.
+
+    Args:
+        rep_data (list): Rep dicts from detect_reps.
+        feedback_depth (str): "simple", "standard" or "advanced"; used for per-rep lines.
+        token_budget (int): Approximate upper bound for the returned lines.
+
+    Returns:
+        list: Summary lines.
+    """
+    per_rep = compress_rep_data_for_gpt(rep_data, feedback_depth)
+    if estimate_text_tokens(per_rep) <= token_budget:
+        return per_rep
+
+    lines = _overview(rep_data)
+
+    # Widen the grouping tolerances until the groups fit in half of what's left
+    group_budget = max(0, token_budget - estimate_text_tokens(lines)) // 2
+    rpe_tol, rom_tol = GROUP_RPE_TOLERANCE, GROUP_ROM_TOLERANCE
+    for _ in range(6):
+        group_lines = [_group_line(g) for g in _groups(rep_data, rpe_tol, rom_tol)]
+        if estimate_text_tokens(group_lines) <= group_budget:
+            break
+        rpe_tol, rom_tol = rpe_tol * 2, rom_tol * 2
+    else:
+        group_lines = []
+    lines.extend(group_lines)
+
+    # Spend whatever is left on the most unusual individual reps
+    for rep in _outlier_reps(rep_data):
+        line = "Outlier " + compress_rep_data_for_gpt([rep], feedback_depth)[0]
+        if estimate_text_tokens(lines + [line]) > token_budget:
+            break
+        lines.append(line)
+
+    return lines
@@ -0,0 +1,79 @@
+import base64
+import threading
+from functools import cached_property
+import cv2
+
+from backend.ai.analyze.vision_tokens import jpeg_dimensions
+
+
+class StoredImage:
+    """One rendered JPEG, plus its base64 data URL computed at most once."""
+
+    def __init__(self, name: str, data: bytes, detail: str = "auto"):
+        self.name = name
+        self.data = data
+        self.detail = detail
+        self.width, self.height = jpeg_dimensions(data) or (None, None)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.data)
+
+    @cached_property
+    def b64(self) -> str:
+        return base64.b64encode(self.data).decode("utf-8")
+
+    @cached_property
+    def data_url(self) -> str:
+        return f"data:image/jpeg;base64,{self.b64}"
+
+
+class ImageStore:
+    """
+    Per-request home for every image the pipeline renders.
+
+    Frames are encoded to JPEG once when they're rendered; model callers borrow the
+    cached data URL and S3 uploaders borrow the bytes, so nothing is re-read from disk
+    or re-encoded between stages. Because the store belongs to a single request, one
+    user's keyframes can never leak into another user's weight estimate.
+    """
+
+    def __init__(self):
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def put_bytes(self, name: str, data: bytes, detail: str = "auto") -> StoredImage:
+        image = StoredImage(name, data, detail)
+        with self._lock:
+            self._images[name] = image
+        return image
+
+    def put_array(self, name: str, frame, quality: int = 85, detail: str = "auto") -> StoredImage:
+        """Encodes a BGR frame (as read by OpenCV) to JPEG and stores it."""
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError(f"Failed to encode image {name}")
+        return self.put_bytes(name, encoded.tobytes(), detail)
+
+    def put_file(self, name: str, path: str, detail: str = "auto") -> StoredImage:
+        with open(path, "rb") as f:
+            return self.put_bytes(name, f.read(), detail)
+
+    def get(self, name: str) -> StoredImage:
+        with self._lock:
+            return self._images[name]
+
+    def __contains__(self, name) -> bool:
+        with self._lock:
+            return name in self._images
+
+    def names(self, prefix: str = "") -> list:
+        """Stored image names starting with `prefix`, in insertion order."""
+        with self._lock:
+            return [name for name in self._images if name.startswith(prefix)]
+
+    def write_file(self, name: str, path: str) -> str:
+        """Writes an image to disk for callers that still need a file path."""
+        with open(path, "wb") as f:
+            f.write(self.get(name).data)
+        return path
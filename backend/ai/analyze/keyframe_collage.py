@@ -1,14 +1,18 @@
 import os
 import cv2
-import numpy as np
 import subprocess
 import logging
 import shutil
 
+from backend.ai.analyze.collage_renderer import render_collage
+
 logger = logging.getLogger(__name__)
 
 BASE_DISK_PATH = "/mnt/data"
 
+# Image-token budget per collage; the renderer picks tile size, quality and detail to fit it
+COLLAGE_TOKEN_BUDGET = int(os.getenv("GYMVID_COLLAGE_TOKEN_BUDGET", "765"))
+
 def get_video_rotation(video_path):
     try:
         cmd = [
@@ -33,58 +37,80 @@ def rotate_frame_if_needed(frame, rotation):
         return cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
     return frame
 
-def export_keyframe_collages(video_path: str, rep_data: list, user_id: str = "anonymous", output_dir: str = os.path.join(BASE_DISK_PATH, "keyframe_collages")) -> list:
+# Long side of the individual keyframes kept for weight estimation (plates need detail)
+KEYFRAME_MAX_SIDE = 768
+
+def export_keyframe_collages(video_path: str, rep_data: list, user_id: str = "anonymous", output_dir: str = os.path.join(BASE_DISK_PATH, "keyframe_collages"), image_store=None) -> list:
     """
-    Extracts and saves keyframe collages to local disk and returns file paths.
+    Extracts keyframe collages and returns where they were saved.
 
     Rules:
     - 1–4 reps: return 1 collage of all reps
     - 5–7 reps: 2 collages (first 1 rep + final 4 reps)
     - 8+ reps: 2 collages (first 4 reps + last 4 reps)
 
+    With an `image_store`, nothing is written to disk: each collage is stored as
+    "collage_<suffix>.jpg" and every rep's start/peak/stop frame as "keyframes/repNN_<phase>.jpg",
+    all read from the video in the same pass.
+
     Returns:
-        List of local collage image file paths
+        List of local collage image file paths (or image store names)
     """
-    # Clean output dir
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
-    os.makedirs(output_dir, exist_ok=True)
+    if image_store is None:
+        # Clean output dir
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
 
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise ValueError(f"Unable to open video: {video_path}")
 
     rotation = get_video_rotation(video_path)
-    vid_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    vid_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    frame_size = (216, 384) if vid_height > vid_width else (384, 216)
 
     total_reps = len(rep_data)
     collage_paths = []
 
-    def build_collage(rep_slice, suffix):
-        collage_height = frame_size[1] * len(rep_slice)
-        collage_width = frame_size[0] * 3
-        collage = np.zeros((collage_height, collage_width, 3), dtype=np.uint8)
+    def store_keyframe(rep, phase, frame):
+        name = f"keyframes/rep{rep.get('rep', 0):02d}_{phase}.jpg"
+        if name in image_store:
+            return
+        height, width = frame.shape[:2]
+        scale = min(1.0, KEYFRAME_MAX_SIDE / max(height, width))
+        if scale < 1:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        image_store.put_array(name, frame, quality=90)
 
-        for i, rep in enumerate(rep_slice):
-            for j, phase in enumerate(["start", "peak", "stop"]):
+    def build_collage(rep_slice, suffix):
+        # One row per rep: start | peak | stop
+        frames = []
+        for rep in rep_slice:
+            for phase in ["start", "peak", "stop"]:
+                frame = None
                 frame_no = rep.get(f"{phase}_frame")
                 if frame_no is not None:
                     cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
                     ret, frame = cap.read()
                     if not ret or frame is None:
                         logger.warning(f"Frame {frame_no} could not be read.")
-                        continue
-                    frame = rotate_frame_if_needed(frame, rotation)
-                    resized = cv2.resize(frame, frame_size)
-                    y = i * frame_size[1]
-                    x = j * frame_size[0]
-                    collage[y:y + frame_size[1], x:x + frame_size[0]] = resized
+                        frame = None
+                    else:
+                        frame = rotate_frame_if_needed(frame, rotation)
+                        if image_store is not None:
+                            store_keyframe(rep, phase, frame)
+                frames.append(frame)
+
+        collage = render_collage(frames, COLLAGE_TOKEN_BUDGET, cols=3, stage="keyframe_collage")
 
         filename = f"collage_{suffix}.jpg"
+        if image_store is not None:
+            image_store.put_bytes(filename, collage.data, detail=collage.detail)
+            logger.info(f"✅ Stored collage in memory: {filename}")
+            collage_paths.append(filename)
+            return
+
         local_path = os.path.join(output_dir, filename)
-        cv2.imwrite(local_path, collage)
+        collage.save(local_path)
         logger.info(f"✅ Saved collage locally: {local_path}")
         collage_paths.append(local_path)
 
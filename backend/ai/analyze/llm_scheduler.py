@@ -0,0 +1,229 @@
+import os
+import re
+import time
+import heapq
+import itertools
+import logging
+import threading
+from openai import RateLimitError
+
+from backend.ai.analyze.deadline import DeadlineExceeded
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Priority lanes: lower number is served first
+LANES = {
+    "interactive": 0,   # e.g. /quick_exercise_prediction, someone is staring at a spinner
+    "standard": 1,      # full set analysis
+    "background": 2,    # coaching feedback and other heavy calls
+}
+
+# Fraction of the token bucket each lane must leave untouched, so heavy lanes can't
+# drain the quota that interactive calls depend on
+LANE_TOKEN_RESERVE = {
+    "interactive": 0.0,
+    "standard": 0.1,
+    "background": 0.25,
+}
+
+DEFAULT_LANE = "standard"
+
+# ✅ Account quotas (per minute)
+OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "30000"))
+
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("GYMVID_RATE_LIMIT_RETRIES", "3"))
+DEFAULT_RATE_LIMIT_BACKOFF_SEC = 2.0
+
+
+class TokenBucket:
+    """Refills continuously at `capacity` units per minute, up to `capacity`."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.refill_per_sec = capacity / 60.0
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def available(self, now: float) -> float:
+        elapsed = now - self.updated_at
+        self.level = min(self.capacity, self.level + elapsed * self.refill_per_sec)
+        self.updated_at = now
+        return self.level
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        missing = amount - self.available(now)
+        return max(0.0, missing / self.refill_per_sec)
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def drain(self):
+        self.level = min(self.level, 0.0)
+
+
+def parse_reset_duration(value: str):
+    """Parses rate-limit reset values such as '20ms', '1.5s' or '6m0s' into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+def retry_after_seconds(error: RateLimitError) -> float:
+    """Reads how long to back off from a 429 response's headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = parse_reset_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return DEFAULT_RATE_LIMIT_BACKOFF_SEC
+
+
+class LLMScheduler:
+    """
+    Central admission control for model calls.
+
+    Callers wait in a single priority queue. The request at the head of the queue is
+    admitted once both the requests-per-minute and tokens-per-minute buckets can cover
+    it (minus its lane's reserve). A 429 from any call pauses every lane for the
+    backoff the provider asked for, instead of letting each feature hammer the API.
+    """
+
+    def __init__(self, rpm: float = OPENAI_RPM_LIMIT, tpm: float = OPENAI_TPM_LIMIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+    def _queue_depths(self):
+        depths = {lane: 0 for lane in LANES}
+        names = {v: k for k, v in LANES.items()}
+        for priority, _ in self._queue:
+            depths[names[priority]] += 1
+        return depths
+
+    def _publish_depths(self):
+        for lane, depth in self._queue_depths().items():
+            metrics.set_gauge("llm_queue_depth", depth, lane=lane)
+
+    def acquire(self, lane: str, estimated_tokens: int, timeout: float):
+        """
+        Blocks until the call may be sent.
+
+        Raises:
+            DeadlineExceeded: If the call could not be admitted within `timeout` seconds.
+        """
+        ticket = (LANES.get(lane, LANES[DEFAULT_LANE]), next(self._sequence))
+        reserve = LANE_TOKEN_RESERVE.get(lane, 0.0) * self.tokens.capacity
+        needed = min(estimated_tokens, self.tokens.capacity - reserve)
+        start = time.monotonic()
+        give_up_at = start + timeout
+
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self._publish_depths()
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait_for = 0.25
+                    if self._queue[0] == ticket:
+                        if now < self._paused_until:
+                            wait_for = self._paused_until - now
+                        else:
+                            wait_for = max(
+                                self.requests.seconds_until(1, now),
+                                self.tokens.seconds_until(needed + reserve, now),
+                            )
+                            if wait_for == 0:
+                                self.requests.take(1)
+                                self.tokens.take(needed)
+                                break
+
+                    if now >= give_up_at:
+                        metrics.increment("llm_queue_timeouts_total", lane=lane)
+                        raise DeadlineExceeded(f"Timed out waiting {timeout:.1f}s for {lane} model quota")
+                    self._cond.wait(min(wait_for, give_up_at - now))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._publish_depths()
+                self._cond.notify_all()
+
+        metrics.observe("llm_queue_wait_sec", time.monotonic() - start, lane=lane)
+        metrics.increment("llm_requests_total", lane=lane)
+        return needed
+
+    def settle(self, reserved_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the real usage of a call is known."""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self.tokens.take(actual_tokens - reserved_tokens)
+            self._cond.notify_all()
+
+    def back_off(self, seconds: float):
+        """Pauses every lane after a 429."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens.drain()
+            self._cond.notify_all()
+
+    def run(self, lane: str, estimated_tokens: int, call, give_up_at: float):
+        """
+        Sends `call()` through the scheduler, retrying on 429 with the provider's backoff.
+
+        Args:
+            lane (str): Priority lane name (see LANES).
+            estimated_tokens (int): Prompt + image + completion token estimate.
+            call (callable): Performs the model call and returns the response.
+            give_up_at (float): time.monotonic() value after which the call is abandoned.
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            reserved = self.acquire(lane, estimated_tokens, timeout=give_up_at - time.monotonic())
+            try:
+                response = call()
+            except RateLimitError as e:
+                delay = retry_after_seconds(e)
+                metrics.increment("llm_rate_limited_total", lane=lane)
+                logger.warning(f"⏳ 429 on {lane} lane, pausing all lanes for {delay:.2f}s")
+                self.back_off(delay)
+                if attempt == MAX_RATE_LIMIT_RETRIES or time.monotonic() + delay >= give_up_at:
+                    raise
+                continue
+
+            usage = getattr(response, "usage", None)
+            self.settle(reserved, getattr(usage, "total_tokens", None))
+            return response
+
+    def status(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "queue_depth": self._queue_depths(),
+                "requests_available": round(self.requests.available(now), 1),
+                "tokens_available": round(self.tokens.available(now), 1),
+                "paused_for_sec": round(max(0.0, self._paused_until - now), 2),
+                "rpm_limit": self.requests.capacity,
+                "tpm_limit": self.tokens.capacity,
+            }
+
+
+# ✅ One scheduler per process, shared by every model call
+scheduler = LLMScheduler()
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, defaultdict
+
+from backend.ai.analyze.vision_tokens import (
+    data_url_dimensions,
+    estimate_image_tokens,
+    estimate_request_tokens,
+    LOW_DETAIL_TOKENS,
+    UNKNOWN_IMAGE_TOKENS,
+)
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ USD per 1M tokens (input, output). Override with GYMVID_MODEL_PRICES='{"gpt-4o": [2.5, 10]}'
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+MODEL_PRICES.update({name: tuple(price) for name, price in json.loads(os.getenv("GYMVID_MODEL_PRICES", "{}")).items()})
+DEFAULT_PRICE = MODEL_PRICES["gpt-4o"]
+
+# The provider's batch API bills at half the interactive rate
+BATCH_DISCOUNT = 0.5
+
+# Daily rollups kept in memory, and users tracked per day (heaviest users are kept)
+ROLLUP_DAYS = int(os.getenv("GYMVID_USAGE_ROLLUP_DAYS", "14"))
+MAX_USERS_PER_DAY = 2000
+
+# Endpoint and user of the request a model call belongs to
+_request = contextvars.ContextVar("gymvid_usage_request", default=None)
+
+_lock = threading.Lock()
+_daily = OrderedDict()  # day -> {"stages": {...}, "endpoints": {...}, "users": {...}}
+
+
+def set_request(endpoint: str, user_id: str = None):
+    """Tags every model call made from the current context with `endpoint` and `user_id`."""
+    _request.set({"endpoint": endpoint, "user_id": user_id})
+
+
+def current_request() -> dict:
+    return _request.get() or {"endpoint": "unknown", "user_id": None}
+
+
+def price_for(model: str):
+    """(input, output) USD per 1M tokens; dated snapshots (gpt-4o-2024-08-06) use their family's price."""
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model == name or (model or "").startswith(name + "-"):
+            return MODEL_PRICES[name]
+    return DEFAULT_PRICE
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float:
+    input_price, output_price = price_for(model)
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+def describe_images(params: dict) -> dict:
+    """Counts the images in a request and estimates their encoded bytes and prompt tokens."""
+    count, size_bytes, tokens = 0, 0, 0
+    for message in params.get("messages", []):
+        content = message.get("content")
+        if not isinstance(content, list):
+            continue
+        for part in content:
+            if part.get("type") != "image_url":
+                continue
+            image = part.get("image_url", {})
+            url, detail = image.get("url", ""), image.get("detail", "auto")
+            count += 1
+            if url.startswith("data:"):
+                size_bytes += len(url.split(",", 1)[-1]) * 3 // 4
+            size = data_url_dimensions(url)
+            if detail == "low":
+                tokens += LOW_DETAIL_TOKENS
+            elif size:
+                tokens += estimate_image_tokens(size[0], size[1], detail)
+            else:
+                tokens += UNKNOWN_IMAGE_TOKENS
+    return {"count": count, "bytes": size_bytes, "tokens": tokens}
+
+
+def _empty_bucket():
+    return {
+        "calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "image_tokens": 0,
+        "images": 0,
+        "image_bytes": 0,
+        "cost_usd": 0.0,
+        "latency_sec_total": 0.0,
+    }
+
+
+def _add(bucket, usage):
+    bucket["calls"] += 1
+    for key in ("prompt_tokens", "completion_tokens", "image_tokens", "images", "image_bytes", "cost_usd"):
+        bucket[key] += usage[key]
+    bucket["latency_sec_total"] += usage["latency_sec"]
+
+
+def _rollup(day: str):
+    if day not in _daily:
+        _daily[day] = {
+            "stages": defaultdict(_empty_bucket),
+            "endpoints": defaultdict(_empty_bucket),
+            "models": defaultdict(_empty_bucket),
+            "users": defaultdict(_empty_bucket),
+        }
+        while len(_daily) > ROLLUP_DAYS:
+            _daily.popitem(last=False)
+    return _daily[day]
+
+
+def record_call(stage: str, params: dict, response=None, latency_sec: float = 0.0, request: dict = None,
+                batch: bool = False, hedge: bool = False):
+    """
+    Records the token usage and estimated cost of one model call.
+
+    Uses the provider's reported usage when the response carries it and the request's
+    own estimate otherwise (e.g. a hedged duplicate that was abandoned).
+
+    Args:
+        stage (str): Pipeline stage (e.g. "exercise_prediction").
+        params (dict): The chat completion parameters that were sent.
+        response: The completion (or a dict in the API's JSON shape), if one arrived.
+        latency_sec (float): Time the call took.
+        request (dict, optional): {"endpoint", "user_id"}; defaults to the current context's.
+        batch (bool): Billed through the batch API.
+        hedge (bool): The call was a hedged duplicate.
+
+    Returns:
+        dict: The usage that was recorded.
+    """
+    request = request or current_request()
+    model = params.get("model", "unknown")
+    images = describe_images(params)
+
+    usage = getattr(response, "usage", None)
+    if isinstance(response, dict):
+        usage = response.get("usage")
+    if isinstance(usage, dict):
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+    else:
+        prompt_tokens, completion_tokens = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    estimated = prompt_tokens is None
+    if estimated:
+        prompt_tokens = estimate_request_tokens({**params, "max_tokens": 0})
+        completion_tokens = 0
+
+    record = {
+        "prompt_tokens": int(prompt_tokens),
+        "completion_tokens": int(completion_tokens or 0),
+        "image_tokens": images["tokens"],
+        "images": images["count"],
+        "image_bytes": images["bytes"],
+        "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens or 0, batch=batch),
+        "latency_sec": latency_sec,
+    }
+
+    endpoint, user_id = request.get("endpoint") or "unknown", request.get("user_id")
+    tags = {"stage": stage, "endpoint": endpoint}
+    metrics.increment("gpt_calls_total", model=model, hedge=hedge, batch=batch, estimated=estimated, **tags)
+    metrics.increment("gpt_prompt_tokens_total", record["prompt_tokens"], **tags)
+    metrics.increment("gpt_completion_tokens_total", record["completion_tokens"], **tags)
+    metrics.increment("gpt_image_tokens_total", record["image_tokens"], **tags)
+    metrics.increment("gpt_images_total", record["images"], **tags)
+    metrics.increment("gpt_image_bytes_total", record["image_bytes"], **tags)
+    metrics.increment("gpt_cost_usd_total", record["cost_usd"], **tags)
+
+    day = time.strftime("%Y-%m-%d", time.gmtime())
+    with _lock:
+        rollup = _rollup(day)
+        _add(rollup["stages"][stage], record)
+        _add(rollup["endpoints"][endpoint], record)
+        _add(rollup["models"][model], record)
+        if user_id and (user_id in rollup["users"] or len(rollup["users"]) < MAX_USERS_PER_DAY):
+            _add(rollup["users"][user_id], record)
+    return record
+
+
+def _round(bucket):
+    rounded = {k: (round(v, 6) if isinstance(v, float) else v) for k, v in bucket.items()}
+    calls = bucket["calls"] or 1
+    rounded["avg_latency_sec"] = round(bucket["latency_sec_total"] / calls, 3)
+    rounded["avg_cost_usd"] = round(bucket["cost_usd"] / calls, 6)
+    return rounded
+
+
+def daily_rollups(days: int = 7, top_users: int = 20) -> dict:
+    """
+    Per-day usage by stage, endpoint and model (plus the heaviest users), newest day first.
+
+    Returns:
+        dict: {day: {"stages": {...}, "endpoints": {...}, "models": {...}, "top_users": {...}, "total": {...}}}
+    """
+    with _lock:
+        selected = list(_daily.items())[-days:]
+        result = {}
+        for day, rollup in reversed(selected):
+            total = _empty_bucket()
+            for bucket in rollup["stages"].values():
+                for key in total:
+                    total[key] += bucket[key]
+            users = sorted(rollup["users"].items(), key=lambda item: item[1]["cost_usd"], reverse=True)[:top_users]
+            result[day] = {
+                "total": _round(total),
+                "stages": {name: _round(b) for name, b in rollup["stages"].items()},
+                "endpoints": {name: _round(b) for name, b in rollup["endpoints"].items()},
+                "models": {name: _round(b) for name, b in rollup["models"].items()},
+                "top_users": {name: _round(b) for name, b in users},
+            }
+    return result
+
+
+def reset():
+    with _lock:
+        _daily.clear()
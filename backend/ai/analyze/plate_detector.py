@@ -0,0 +1,209 @@
+import os
+import time
+import logging
+import cv2
+import numpy as np
+
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Detector answers at or above this confidence skip the GPT weight call.
+# Off by default: it has only been checked against synthetic fixtures drawn from PLATES itself
+# (backend/dev/make_plate_fixtures.py), and non-plate colour blocks can read as loaded bars.
+# Enable it once it has been validated on real labelled frames.
+PLATE_DETECTOR_ENABLED = os.getenv("GYMVID_PLATE_DETECTOR_ENABLED", "false") == "true"
+PLATE_CONFIDENCE_THRESHOLD = float(os.getenv("GYMVID_PLATE_CONFIDENCE_THRESHOLD", "80"))
+
+BAR_WEIGHT_KG = 20.0
+
+# IPF/IWF colour coding. Thickness is the edge-on width of one disc as a fraction of the
+# 450mm competition diameter; the 5kg disc is smaller, so it also has its own height range.
+PLATES = {
+    "red":    {"kg": 25.0, "thickness": 0.12, "height": (0.75, 1.25)},
+    "blue":   {"kg": 20.0, "thickness": 0.10, "height": (0.75, 1.25)},
+    "yellow": {"kg": 15.0, "thickness": 0.08, "height": (0.75, 1.25)},
+    "green":  {"kg": 10.0, "thickness": 0.06, "height": (0.75, 1.25)},
+    "white":  {"kg": 5.0,  "thickness": 0.06, "height": (0.35, 0.75)},
+}
+
+# OpenCV HSV ranges (H is 0–179); red wraps around 0 so it has two
+HSV_RANGES = {
+    "red":    [((0, 110, 70), (8, 255, 255)), ((170, 110, 70), (179, 255, 255))],
+    "blue":   [((100, 110, 50), (130, 255, 255))],
+    "yellow": [((18, 110, 110), (35, 255, 255))],
+    "green":  [((40, 90, 50), (85, 255, 255))],
+    "white":  [((0, 0, 170), (179, 50, 255))],
+}
+
+# Frames are downscaled to this long side first; plates are large, so detail isn't needed
+DETECT_MAX_SIDE = 640
+
+# A plate must be at least this tall relative to the frame to be considered
+MIN_PLATE_HEIGHT_FRAC = 0.08
+
+# Blobs wider than this fraction of their height are plate faces, not edges: the discs
+# behind them are hidden, so they can't be counted reliably
+FACE_ON_ASPECT = 0.6
+
+# The two sleeves are a grip width apart (~1.3m, about 3 plate diameters)
+SIDE_GAP_PLATE_HEIGHTS = 1.5
+
+
+def _colour_blobs(hsv: np.ndarray, frame_height: int) -> list:
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    # Plates are tall; a vertical opening strips the (often light grey) bar out of the masks
+    vertical = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(3, int(frame_height * MIN_PLATE_HEIGHT_FRAC / 2))))
+    blobs = []
+    for colour, ranges in HSV_RANGES.items():
+        mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+        for low, high in ranges:
+            mask |= cv2.inRange(hsv, np.array(low), np.array(high))
+        # Close first so sensor noise inside thin plate edges doesn't split them, then drop specks
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, vertical)
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        for x, y, w, h, area in stats[1:count]:
+            if h < MIN_PLATE_HEIGHT_FRAC * frame_height * min(PLATES[colour]["height"]):
+                continue
+            if area < 0.5 * w * h * (np.pi / 4):
+                # Too sparse to be a disc or a disc edge
+                continue
+            blobs.append({"colour": colour, "x": int(x), "y": int(y), "w": int(w), "h": int(h)})
+    return blobs
+
+
+def _bar_visible(grey: np.ndarray, bar_y: float, plate_height: float) -> bool:
+    """Looks for a long, roughly horizontal line at the height of the plate centres."""
+    top = max(0, int(bar_y - plate_height / 2))
+    band = grey[top:int(bar_y + plate_height / 2)]
+    if band.size == 0:
+        return False
+    edges = cv2.Canny(band, 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=60,
+                            minLineLength=int(plate_height * 1.5), maxLineGap=int(plate_height / 4) + 1)
+    if lines is None:
+        return False
+    return any(abs(y2 - y1) < 0.1 * abs(x2 - x1) for x1, y1, x2, y2 in lines.reshape(-1, 4))
+
+
+def detect_plates(frame: np.ndarray) -> dict:
+    """
+    Estimates barbell load in one BGR frame from colour-coded competition plates.
+
+    Plates are segmented by HSV colour, kept only if they share the height and vertical
+    centre of the main plate stack (all 10–25kg bumpers have the same diameter), split
+    into left and right sleeves at the widest gap, and counted from their edge-on width.
+
+    Returns:
+        dict: {"estimated_weight_kg", "confidence", "plates": {side: {colour: count}},
+        "face_on", "bar_visible"}, or None if no plates were found.
+    """
+    scale = DETECT_MAX_SIDE / max(frame.shape[:2])
+    if scale < 1:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height = frame.shape[0]
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    blobs = _colour_blobs(hsv, height)
+
+    full_size = [b["h"] for b in blobs if b["colour"] != "white"]
+    if not full_size:
+        return None
+    plate_height = float(np.median(full_size))
+
+    bar_y = float(np.median([b["y"] + b["h"] / 2 for b in blobs if b["colour"] != "white"]))
+    plates = []
+    for b in blobs:
+        low, high = PLATES[b["colour"]]["height"]
+        centred = abs(b["y"] + b["h"] / 2 - bar_y) < 0.15 * plate_height
+        if centred and low * plate_height <= b["h"] <= high * plate_height:
+            plates.append(b)
+    if not plates:
+        return None
+
+    # Split into sleeves at the widest horizontal gap, if it's wide enough to be the grip
+    plates.sort(key=lambda b: b["x"])
+    gaps = [plates[i + 1]["x"] - (plates[i]["x"] + plates[i]["w"]) for i in range(len(plates) - 1)]
+    if gaps and max(gaps) > SIDE_GAP_PLATE_HEIGHTS * plate_height:
+        split = int(np.argmax(gaps)) + 1
+        sides = {"left": plates[:split], "right": plates[split:]}
+    else:
+        sides = {"visible": plates}
+
+    face_on = False
+    ambiguous = 0
+    per_side = {}
+    side_kg = {}
+    for side, side_plates in sides.items():
+        counts = {}
+        for b in side_plates:
+            if b["w"] > FACE_ON_ASPECT * b["h"]:
+                face_on = True
+                n = 1.0
+            else:
+                n = b["w"] / (plate_height * PLATES[b["colour"]]["thickness"])
+            if abs(n - round(n)) > 0.35 and n > 1:
+                ambiguous += 1
+            counts[b["colour"]] = counts.get(b["colour"], 0) + max(1, int(round(n)))
+        per_side[side] = counts
+        side_kg[side] = sum(PLATES[c]["kg"] * n for c, n in counts.items())
+
+    confidence = 95
+    if len(side_kg) == 2:
+        if side_kg["left"] != side_kg["right"]:
+            confidence -= 30
+        loaded_side = max(side_kg.values())
+    else:
+        confidence -= 15
+        loaded_side = side_kg["visible"]
+    if face_on:
+        confidence -= 35
+    confidence -= 10 * ambiguous
+
+    bar_visible = _bar_visible(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), bar_y, plate_height)
+    if not bar_visible:
+        confidence -= 10
+
+    return {
+        "estimated_weight_kg": BAR_WEIGHT_KG + 2 * loaded_side,
+        "confidence": int(max(0, min(100, confidence))),
+        "plates": per_side,
+        "face_on": face_on,
+        "bar_visible": bar_visible,
+    }
+
+
+def estimate_weight_from_plates(frames: list) -> dict:
+    """
+    Runs the plate detector over several frames of the same set and combines them.
+
+    The most common per-frame load wins; its confidence is the best confidence among the
+    frames that agree, reduced when other frames disagree.
+
+    Returns:
+        dict: Same shape as the GPT weight estimate plus "source", or None if no frame
+        contained recognisable plates.
+    """
+    start = time.monotonic()
+    results = [r for r in (detect_plates(f) for f in frames if f is not None) if r]
+    metrics.observe("plate_detector_latency_sec", time.monotonic() - start)
+    if not results:
+        return None
+
+    loads = [r["estimated_weight_kg"] for r in results]
+    values, counts = np.unique(loads, return_counts=True)
+    load = float(values[np.argmax(counts)])
+    agreeing = [r for r in results if r["estimated_weight_kg"] == load]
+    confidence = max(r["confidence"] for r in agreeing) - 20 * (len(results) - len(agreeing))
+
+    best = max(agreeing, key=lambda r: r["confidence"])
+    logger.info(f"🎨 Plate detector: {load}kg ({confidence}%) from {len(results)} frame(s), plates {best['plates']}")
+    return {
+        "equipment": "Barbell",
+        "estimated_weight_kg": load,
+        "confidence": int(max(0, confidence)),
+        "source": "plate_detector",
+        "plates": best["plates"],
+    }
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Model + dataset locations
+POSE_MODEL_PATH = os.getenv("GYMVID_POSE_MODEL_PATH", "backend/ai/models/pose_knn.npz")
+POSE_DATASET_PATH = os.getenv("GYMVID_POSE_DATASET_PATH")  # JSONL of logged sets; unset = don't log
+
+# Predictions at or above this confidence skip the GPT collage call
+POSE_CONFIDENCE_THRESHOLD = float(os.getenv("GYMVID_POSE_CONFIDENCE_THRESHOLD", "85"))
+
+# Bump whenever extract_trajectory_features changes so old logged rows are ignored
+FEATURE_VERSION = 1
+
+LANDMARK_ORDER = [
+    "left_wrist", "right_wrist", "left_elbow", "right_elbow",
+    "left_shoulder", "right_shoulder", "left_knee", "right_knee",
+    "left_ankle", "right_ankle", "hip", "head",
+]
+
+LABEL_FIELDS = ["equipment", "movement_pattern", "variation", "movement"]
+
+_model_cache = {}
+_dataset_lock = threading.Lock()
+
+
+def _nan_range(values):
+    valid = values[~np.isnan(values)]
+    if len(valid) < 2:
+        return np.nan
+    return np.percentile(valid, 95) - np.percentile(valid, 5)
+
+
+def extract_trajectory_features(video_data: dict):
+    """
+    Turns the landmark trajectories from analyze_video into a fixed-length feature vector.
+
+    Positions are expressed relative to the hip and scaled by torso length, so the
+    features describe posture and which joints move rather than where the lifter
+    stands in frame or how far the camera is.
+
+    Returns:
+        np.ndarray or None: Feature vector, or None if the torso was never tracked.
+    """
+    landmark_y = video_data.get("landmark_y")
+    landmark_x = video_data.get("landmark_x")
+    if not landmark_y or not landmark_x:
+        return None
+
+    ys = np.array([landmark_y.get(name, []) for name in LANDMARK_ORDER], dtype=float)
+    xs = np.array([landmark_x.get(name, []) for name in LANDMARK_ORDER], dtype=float)
+    if ys.ndim != 2 or ys.shape[1] == 0:
+        return None
+
+    hip = LANDMARK_ORDER.index("hip")
+    shoulders = [LANDMARK_ORDER.index("left_shoulder"), LANDMARK_ORDER.index("right_shoulder")]
+    shoulder_x = np.nanmean(xs[shoulders], axis=0) if not np.all(np.isnan(xs[shoulders])) else xs[shoulders[0]]
+    shoulder_y = np.nanmean(ys[shoulders], axis=0) if not np.all(np.isnan(ys[shoulders])) else ys[shoulders[0]]
+
+    torso_dx = shoulder_x - xs[hip]
+    torso_dy = shoulder_y - ys[hip]
+    torso_len = np.hypot(torso_dx, torso_dy)
+    if np.all(np.isnan(torso_len)):
+        return None
+    scale = max(float(np.nanmedian(torso_len)), 1e-3)
+
+    with np.errstate(all="ignore"):
+        rel_x = (xs - xs[hip]) / scale
+        rel_y = (ys - ys[hip]) / scale
+
+        features = []
+        features.extend(np.nanmean(rel_x, axis=1))
+        features.extend(np.nanmean(rel_y, axis=1))
+        features.extend(_nan_range(row) / scale for row in ys)
+        features.extend(_nan_range(row) / scale for row in xs)
+
+        # Torso orientation: upright (squat, curl) vs lying (bench) vs hinged (deadlift)
+        angle = np.arctan2(np.abs(torso_dx), -torso_dy)
+        features.append(np.nanmean(np.sin(angle)))
+        features.append(np.nanmean(np.cos(angle)))
+
+        # Do the wrists move with the hips (squat, deadlift) or on their own (curl, press)?
+        wrist_y = ys[LANDMARK_ORDER.index("left_wrist")]
+        both = ~np.isnan(wrist_y) & ~np.isnan(ys[hip])
+        if both.sum() > 2 and np.std(wrist_y[both]) > 0 and np.std(ys[hip][both]) > 0:
+            features.append(np.corrcoef(wrist_y[both], ys[hip][both])[0, 1])
+        else:
+            features.append(np.nan)
+
+        features.append(float(np.mean(~np.isnan(ys[hip]))))
+
+    return np.array(features, dtype=float)
+
+
+def fit_knn(features: np.ndarray, labels: list, label_info: dict, k: int = 5) -> dict:
+    """
+    Builds a distance-weighted k-nearest-neighbour model.
+
+    Args:
+        features (np.ndarray): (n_samples, n_features) training vectors (NaN allowed).
+        labels (list): Movement name for each row.
+        label_info (dict): movement name -> {equipment, movement_pattern, variation, movement}.
+        k (int): Neighbours consulted per prediction.
+    """
+    mean = np.nanmean(features, axis=0)
+    std = np.nanstd(features, axis=0)
+    std[~np.isfinite(std) | (std < 1e-6)] = 1.0
+    mean[~np.isfinite(mean)] = 0.0
+    X = np.nan_to_num((features - mean) / std)
+
+    names = sorted(set(labels))
+    y = np.array([names.index(label) for label in labels])
+
+    # Typical distance to the nearest *other* sample; far-away queries get their confidence reduced
+    nearest = np.full(len(X), np.inf)
+    for start in range(0, len(X), 512):
+        block = np.linalg.norm(X[start:start + 512, None, :] - X[None, :, :], axis=2)
+        block[np.arange(len(block)), np.arange(start, start + len(block))] = np.inf
+        nearest[start:start + len(block)] = block.min(axis=1)
+    radius = float(np.percentile(nearest[np.isfinite(nearest)], 95)) if np.isfinite(nearest).any() else 1.0
+
+    return {
+        "X": X, "y": y, "mean": mean, "std": std, "k": k, "radius": radius,
+        "names": names, "label_info": [label_info[name] for name in names],
+        "feature_version": FEATURE_VERSION,
+    }
+
+
+def save_model(model: dict, path: str = POSE_MODEL_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(
+        path,
+        X=model["X"], y=model["y"], mean=model["mean"], std=model["std"],
+        meta=json.dumps({
+            "k": model["k"], "radius": model["radius"], "names": model["names"],
+            "label_info": model["label_info"], "feature_version": model["feature_version"],
+        }),
+    )
+
+
+def load_model(path: str = POSE_MODEL_PATH):
+    """Loads (and caches) the trained model, or returns None if none has been trained yet."""
+    if path in _model_cache:
+        return _model_cache[path]
+    if not os.path.exists(path):
+        return None
+    try:
+        data = np.load(path)
+        meta = json.loads(str(data["meta"]))
+        model = {"X": data["X"], "y": data["y"], "mean": data["mean"], "std": data["std"], **meta}
+        if model.get("feature_version") != FEATURE_VERSION:
+            logger.warning(f"Pose model at {path} uses feature version {model.get('feature_version')}, ignoring it")
+            model = None
+    except Exception as e:
+        logger.warning(f"Failed to load pose model from {path}: {e}")
+        model = None
+    _model_cache[path] = model
+    return model
+
+
+def predict_features(model: dict, features: np.ndarray, exclude_index: int = None) -> dict:
+    """Classifies one feature vector; `exclude_index` leaves a training row out (for evaluation)."""
+    x = np.nan_to_num((features - model["mean"]) / model["std"])
+    dists = np.linalg.norm(model["X"] - x, axis=1)
+    if exclude_index is not None:
+        dists[exclude_index] = np.inf
+
+    k = min(model["k"], int(np.isfinite(dists).sum()))
+    nearest = np.argsort(dists)[:k]
+    weights = 1.0 / (dists[nearest] + 1e-6)
+    votes = np.bincount(model["y"][nearest], weights=weights, minlength=len(model["names"]))
+    best = int(np.argmax(votes))
+
+    share = votes[best] / votes.sum()
+    closeness = min(1.0, model["radius"] / max(dists[nearest[0]], 1e-6))
+    confidence = round(float(share * closeness * 100))
+
+    prediction = {field: model["label_info"][best].get(field) for field in LABEL_FIELDS}
+    prediction["confidence"] = confidence
+    prediction["source"] = "pose_classifier"
+    return prediction
+
+
+def classify_exercise_from_pose(video_data: dict):
+    """
+    Fast on-CPU exercise prediction from landmark trajectories.
+
+    Returns:
+        dict or None: Same shape as predict_exercise's output plus "source", or None if no
+        model is available or the trajectories are unusable.
+    """
+    model = load_model()
+    if model is None:
+        return None
+
+    start = time.monotonic()
+    features = extract_trajectory_features(video_data)
+    if features is None:
+        return None
+    prediction = predict_features(model, features)
+    metrics.observe("pose_classifier_latency_sec", time.monotonic() - start)
+    logger.info(f"🦴 Pose classifier: {prediction['movement']} ({prediction['confidence']}%)")
+    return prediction
+
+
+def log_training_example(video_data: dict, exercise_prediction: dict, source: str = "gpt"):
+    """Appends this set's features and its (GPT or user) label to the training dataset, if enabled."""
+    if not POSE_DATASET_PATH or not exercise_prediction.get("movement") or "error" in exercise_prediction:
+        return
+    features = extract_trajectory_features(video_data)
+    if features is None:
+        return
+
+    row = {
+        "feature_version": FEATURE_VERSION,
+        "features": [None if np.isnan(v) else round(float(v), 5) for v in features],
+        "label": {field: exercise_prediction.get(field) for field in LABEL_FIELDS},
+        "label_confidence": exercise_prediction.get("confidence"),
+        "source": source,
+        "logged_at": time.time(),
+    }
+    try:
+        os.makedirs(os.path.dirname(POSE_DATASET_PATH) or ".", exist_ok=True)
+        with _dataset_lock, open(POSE_DATASET_PATH, "a") as f:
+            f.write(json.dumps(row) + "\n")
+    except Exception as e:
+        logger.warning(f"Failed to log pose training example: {e}")
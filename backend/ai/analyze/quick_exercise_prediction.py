@@ -2,16 +2,65 @@ from fastapi import APIRouter, UploadFile, File
 from fastapi.responses import JSONResponse
 import tempfile
 import os
+import time
+import asyncio
 import cv2
-import numpy as np
 
 # Use a more reliable base path that works across different environments
 BASE_DISK_PATH = os.path.join(tempfile.gettempdir(), "gymvid_temp")
 
-from backend.ai.analyze.exercise_prediction import predict_exercise
+from backend.ai.analyze.exercise_prediction import (
+    predict_exercise,
+    is_valid_prediction,
+    CASCADE_FAST_MODEL,
+    CASCADE_THRESHOLDS,
+)
+from backend.ai.analyze.deadline import RequestDeadline
+from backend.ai.analyze.collage_renderer import render_collage
+from backend.ai.analyze.image_store import ImageStore
+from backend.ai.analyze.gpt_schemas import track_submission
+from backend.ai.analyze import model_usage
+from backend.utils import metrics
+from backend.utils.upload_sink import save_upload, MAX_VIDEO_UPLOAD_BYTES
+
+# Quick prediction is interactive, so it gets a much tighter deadline than full analysis
+QUICK_PREDICTION_DEADLINE_SEC = float(os.getenv("GYMVID_QUICK_DEADLINE_SEC", "20"))
+
+# Single 512px tile at high detail
+QUICK_COLLAGE_TOKEN_BUDGET = int(os.getenv("GYMVID_QUICK_COLLAGE_TOKEN_BUDGET", "255"))
+
+# ✅ Progressive mode: a tiny low-detail strip first, a detailed collage only when it's unsure
+QUICK_PROGRESSIVE_ENABLED = os.getenv("GYMVID_QUICK_PROGRESSIVE", "true") == "true"
+QUICK_STRIP_FRAMES = 3
+QUICK_STRIP_TOKEN_BUDGET = 85  # one low-detail image
+QUICK_STRIP_TIMEOUT_SEC = float(os.getenv("GYMVID_QUICK_STRIP_TIMEOUT_SEC", "4"))
+QUICK_DETAIL_FRAMES = 6
+QUICK_DETAIL_TOKEN_BUDGET = int(os.getenv("GYMVID_QUICK_DETAIL_TOKEN_BUDGET", "765"))
 
 app = APIRouter()
 
+def read_evenly_spaced_frames(video_path: str, total_frames: int) -> list:
+    """Reads `total_frames` evenly spaced BGR frames; unreadable positions come back as None."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Unable to open video: {video_path}")
+
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if frame_count == 0:
+        cap.release()
+        raise ValueError("Video contains no frames")
+
+    frames = []
+    for i in range(total_frames):
+        frame_index = int(frame_count * ((i + 1) / (total_frames + 1)))
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        ret, frame = cap.read()
+        frames.append(frame if ret else None)
+
+    cap.release()
+    return frames
+
+
 def simple_export_evenly_spaced_collage(video_path: str, total_frames: int = 4, output_dir: str = None) -> list:
     """
     Simple, robust collage generation using only OpenCV (no ffmpeg or PIL dependencies)
@@ -21,49 +70,13 @@ def simple_export_evenly_spaced_collage(video_path: str, total_frames: int = 4,
         
     try:
         os.makedirs(output_dir, exist_ok=True)
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Unable to open video: {video_path}")
-
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if frame_count == 0:
-            raise ValueError("Video contains no frames")
+        frames = read_evenly_spaced_frames(video_path, total_frames)
 
-        # Determine frame size - portrait or landscape
-        vid_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        vid_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
-        if vid_height > vid_width:
-            frame_size = (192, 256)  # Portrait
-        else:
-            frame_size = (256, 192)  # Landscape
-            
-        # Create 2x2 collage
-        collage_width = frame_size[0] * 2
-        collage_height = frame_size[1] * 2
-        collage = np.zeros((collage_height, collage_width, 3), dtype=np.uint8)
-
-        # Extract 4 evenly spaced frames
-        for i in range(total_frames):
-            frame_index = int(frame_count * ((i + 1) / (total_frames + 1)))
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-            ret, frame = cap.read()
-            if ret:
-                resized = cv2.resize(frame, frame_size)
-                # Position in 2x2 grid
-                row = i // 2
-                col = i % 2
-                y_start = row * frame_size[1]
-                x_start = col * frame_size[0]
-                collage[y_start:y_start + frame_size[1], x_start:x_start + frame_size[0]] = resized
+        # Layout, tile size and quality are picked by the renderer to fit the token budget
+        collage = render_collage(frames, QUICK_COLLAGE_TOKEN_BUDGET, stage="quick_collage")
 
-        cap.release()
-        
         collage_path = os.path.join(output_dir, "quick_collage.jpg")
-        success = cv2.imwrite(collage_path, collage, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        
-        if not success:
-            raise ValueError("Failed to save collage image")
+        collage.save(collage_path)
             
         return [collage_path]
         
@@ -71,10 +84,98 @@ def simple_export_evenly_spaced_collage(video_path: str, total_frames: int = 4,
         print(f"❌ Collage generation error: {str(e)}")
         raise e
 
+
+def _accept_strip_answer(prediction: dict) -> bool:
+    if "error" in prediction or not is_valid_prediction(prediction):
+        return False
+    return prediction["confidence"] >= CASCADE_THRESHOLDS.get(prediction["equipment"], 90)
+
+
+def progressive_predict_exercise(video_path: str, deadline=None) -> dict:
+    """
+    Predicts the exercise with a cheap first look and a detailed second look only if needed.
+
+    Tier 1 sends a tiny low-detail strip of a few frames to the fast model. If that answer
+    fails the schema check or is below the per-equipment confidence threshold, tier 2 sends
+    a larger, high-detail collage with more frames to the full model. Both collages are
+    rendered from one pass over the video and never touch disk.
+
+    Returns:
+        dict: predict_exercise output, plus "quick_tier" ("strip" or "collage").
+    """
+    frames = read_evenly_spaced_frames(video_path, QUICK_DETAIL_FRAMES)
+    image_store = ImageStore()
+
+    strip_frames = frames[::max(1, QUICK_DETAIL_FRAMES // QUICK_STRIP_FRAMES)][:QUICK_STRIP_FRAMES]
+    strip = render_collage(strip_frames, QUICK_STRIP_TOKEN_BUDGET, cols=len(strip_frames), stage="quick_strip")
+    image_store.put_bytes("quick_strip.jpg", strip.data, detail=strip.detail)
+
+    start = time.monotonic()
+    prediction = predict_exercise(
+        "quick_strip.jpg", model=CASCADE_FAST_MODEL, deadline=deadline, priority="interactive",
+        cascade=False, image_store=image_store, budget_cap=QUICK_STRIP_TIMEOUT_SEC,
+    )
+    metrics.observe("quick_prediction_latency_sec", time.monotonic() - start, tier="strip")
+
+    if _accept_strip_answer(prediction):
+        metrics.increment("quick_prediction_total", tier="strip", outcome="accepted")
+        prediction["quick_tier"] = "strip"
+        return prediction
+
+    outcome = "low_confidence" if "error" not in prediction and is_valid_prediction(prediction) else "invalid"
+    metrics.increment("quick_prediction_total", tier="strip", outcome=outcome)
+    print(f"🔍 Strip answer not trusted ({outcome}: {prediction.get('movement')} "
+          f"{prediction.get('confidence')}%), escalating to detailed collage")
+
+    collage = render_collage(frames, QUICK_DETAIL_TOKEN_BUDGET, stage="quick_detail")
+    image_store.put_bytes("quick_detail.jpg", collage.data, detail=collage.detail)
+
+    start = time.monotonic()
+    prediction = predict_exercise(
+        "quick_detail.jpg", model="gpt-4o", deadline=deadline, priority="interactive",
+        cascade=False, image_store=image_store,
+    )
+    metrics.observe("quick_prediction_latency_sec", time.monotonic() - start, tier="collage")
+    metrics.increment("quick_prediction_total", tier="collage", outcome="error" if "error" in prediction else "answered")
+    prediction["quick_tier"] = "collage"
+    return prediction
+
+
+def _quick_response(prediction: dict) -> dict:
+    """Shapes a predict_exercise result into the /quick_exercise_prediction response."""
+    # Handle prediction errors
+    if "error" in prediction:
+        print(f"⚠️ AI Prediction Error: {prediction['error']}")
+        return {
+            "exercise_name": "Unable to Detect: Enter Manually",
+            "equipment": "Unknown", 
+            "variation": "",
+            "confidence": 0,
+            "prediction_details": prediction
+        }
+
+    # Ensure safe access to prediction results
+    exercise_name = prediction.get("movement") or "Unknown"
+    equipment = prediction.get("equipment") or "Unknown"
+    variation = prediction.get("variation") or ""
+    confidence = prediction.get("confidence", 0)
+
+    print(f"🎯 Predicted: {exercise_name} using {equipment} (variation: {variation}, confidence: {confidence})")
+
+    return {
+        "exercise_name": exercise_name,
+        "equipment": equipment,
+        "variation": variation,
+        "confidence": confidence,
+        "prediction_details": prediction
+    }
+
+
 @app.post("/quick_exercise_prediction")
 async def quick_exercise_prediction(video: UploadFile = File(...)):
     tmp_path = None
     collage_path = None
+    deadline = RequestDeadline(QUICK_PREDICTION_DEADLINE_SEC, stages=["exercise_prediction"])
     try:
         print("🎬 === QUICK EXERCISE PREDICTION STARTED ===")
         print(f"🎬 BASE_DISK_PATH: {BASE_DISK_PATH}")
@@ -97,23 +198,29 @@ async def quick_exercise_prediction(video: UploadFile = File(...)):
         if ext not in [".mp4", ".mov", ".webm", ".avi"]:
             ext = ".mp4"
 
-        # Save uploaded video to a proper temp file
-        # Create a secure temp file
+        # Stream the upload into a unique temp file (hashed and size-checked on the way)
         with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=BASE_DISK_PATH) as tmp_file:
-            contents = await video.read()
-            if not contents:
-                raise ValueError("Uploaded video file is empty or could not be read.")
-            tmp_file.write(contents)
             tmp_path = tmp_file.name
+        saved = await save_upload(video, tmp_path, MAX_VIDEO_UPLOAD_BYTES)
 
         print(f"📼 Saved temp video to: {tmp_path}")
-        print(f"📼 Video size: {len(contents)} bytes")
-        print(f"📼 Temp file exists: {os.path.exists(tmp_path)}")
+        print(f"📼 Video size: {saved.size} bytes ({saved.container})")
+        track_submission(tmp_path, "quick_exercise_prediction", fingerprint=saved.sha256)
+        model_usage.set_request("quick_exercise_prediction")
+
+        if QUICK_PROGRESSIVE_ENABLED:
+            try:
+                # Scheduler waits, model calls and collage rendering all block, so they run off the event loop
+                # (to_thread copies the request's context, which model_usage and track_submission read)
+                prediction = await asyncio.to_thread(progressive_predict_exercise, tmp_path, deadline=deadline)
+                return _quick_response(prediction)
+            except Exception as progressive_error:
+                print(f"⚠️ Progressive prediction failed, using single collage: {progressive_error}")
 
         # Use simple, robust collage generation
         try:
             print("🖼️ Starting collage generation...")
-            collage_paths = simple_export_evenly_spaced_collage(tmp_path, total_frames=4)
+            collage_paths = await asyncio.to_thread(simple_export_evenly_spaced_collage, tmp_path, total_frames=4)
             collage_path = collage_paths[0]
             print(f"🖼️ Primary collage method succeeded: {collage_path}")
         except Exception as collage_error:
@@ -121,7 +228,7 @@ async def quick_exercise_prediction(video: UploadFile = File(...)):
             # Try fallback method using different approach
             try:
                 from backend.ai.analyze.export_quick_keyframes import export_evenly_spaced_collage
-                collage_paths = export_evenly_spaced_collage(tmp_path, total_frames=4)
+                collage_paths = await asyncio.to_thread(export_evenly_spaced_collage, tmp_path, total_frames=4)
                 collage_path = collage_paths[0]
                 print("✅ Used fallback collage generation method")
             except Exception as fallback_error:
@@ -141,7 +248,8 @@ async def quick_exercise_prediction(video: UploadFile = File(...)):
         # Call exercise prediction with error handling
         try:
             print("🤖 Calling AI prediction service...")
-            prediction = predict_exercise(collage_path, model="gpt-4o")
+            prediction = await asyncio.to_thread(predict_exercise, collage_path, model="gpt-4o", deadline=deadline,
+                                                 priority="interactive")
             print(f"🤖 AI prediction completed: {prediction}")
         except Exception as prediction_error:
             print(f"❌ AI Prediction failed: {str(prediction_error)}")
@@ -155,32 +263,7 @@ async def quick_exercise_prediction(video: UploadFile = File(...)):
                 "prediction_details": {"error": str(prediction_error)}
             })
 
-        # Handle prediction errors
-        if "error" in prediction:
-            print(f"⚠️ AI Prediction Error: {prediction['error']}")
-            return {
-                "exercise_name": "Unable to Detect: Enter Manually",
-                "equipment": "Unknown", 
-                "variation": "",
-                "confidence": 0,
-                "prediction_details": prediction
-            }
-
-        # Ensure safe access to prediction results
-        exercise_name = prediction.get("movement") or "Unknown"
-        equipment = prediction.get("equipment") or "Unknown"
-        variation = prediction.get("variation") or ""
-        confidence = prediction.get("confidence", 0)
-
-        print(f"🎯 Predicted: {exercise_name} using {equipment} (variation: {variation}, confidence: {confidence})")
-
-        return {
-            "exercise_name": exercise_name,
-            "equipment": equipment,
-            "variation": variation,
-            "confidence": confidence,
-            "prediction_details": prediction
-        }
+        return _quick_response(prediction)
 
     except Exception as e:
         import traceback
@@ -9,7 +9,9 @@ from fastapi.responses import JSONResponse
 sys.path.append(os.path.abspath("."))
 
 from backend.ai.analyze.video_analysis import analyze_video
+from backend.ai.analyze import cpu_pool
 from backend.ai.analyze.rep_detection import run_rep_detection_from_landmark_y
+from backend.utils.upload_sink import save_upload, MAX_VIDEO_UPLOAD_BYTES
 
 app = FastAPI()
 
@@ -23,16 +25,13 @@ async def quick_rep_detection(video: UploadFile = File(...)):
         if ext not in [".mp4", ".mov", ".webm"]:
             ext = ".mp4"
 
-        # ✅ Save uploaded file to temp
+        # ✅ Stream uploaded file to temp
         with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            contents = await video.read()
-            if not contents:
-                raise ValueError("Uploaded video file is empty.")
-            tmp.write(contents)
             tmp_path = tmp.name
+        await save_upload(video, tmp_path, MAX_VIDEO_UPLOAD_BYTES)
 
-        # ✅ Analyze video
-        video_data = analyze_video(tmp_path)
+        # ✅ Analyze video (in a warm CPU worker, off the event loop)
+        video_data = await cpu_pool.analyze_video_async(tmp_path)
         rep_data = run_rep_detection_from_landmark_y(
             raw_y=video_data["raw_y"],
             fps=video_data["fps"],
@@ -56,6 +55,9 @@ async def quick_rep_detection(video: UploadFile = File(...)):
             "best_landmark": video_data.get("best_landmark")
         }
 
+    except cpu_pool.CpuPoolBusy as busy:
+        return JSONResponse(status_code=503, headers={"Retry-After": "10"}, content={"error": str(busy), "error_type": "server_busy"})
+
     except Exception as e:
         import traceback
         return JSONResponse(status_code=500, content={
@@ -0,0 +1,78 @@
+import os
+
+import requests
+from botocore.exceptions import ConnectionError as BotoConnectionError, HTTPClientError
+
+from backend.ai.analyze import analyze_set, model_usage
+from backend.ai.analyze.gpt_client import is_retryable
+from backend.ai.analyze.gpt_schemas import track_submission
+from backend.utils.save_set_to_supabase import save_set_to_supabase
+from backend.utils.generate_thumbnail import generate_thumbnail
+from backend.utils.content_store import enqueue_content
+from backend.utils import job_queue
+
+# ✅ Set analysis as a background job (see job_queue); progress comes from the pipeline's stage timers
+
+# Network failures talking to S3 or over plain HTTP; worth another attempt
+_TRANSIENT_NETWORK_ERRORS = (BotoConnectionError, HTTPClientError, requests.ConnectionError, requests.Timeout)
+
+
+def _is_transient(error: Exception) -> bool:
+    """OpenAI timeouts, connection errors, 429s and 5xx, deadline overruns, and S3/HTTP network errors (or a wrapper of one)."""
+    while error is not None:
+        if is_retryable(error) or isinstance(error, _TRANSIENT_NETWORK_ERRORS):
+            return True
+        error = error.__cause__
+    return False
+
+
+def run_log_set(job) -> dict:
+    """
+    Runs the /analyze/log_set pipeline on the job's video and saves the set. Transient failures are
+    raised as RetryableJobError so the job queue runs the job again; anything else fails it.
+
+    Payload:
+        user_provided_exercise, known_exercise_info, user_id (optional), endpoint,
+        thumbnail (bool): also render and upload a thumbnail (backend/api/log_set does).
+    """
+    try:
+        return _run_log_set(job)
+    except Exception as e:
+        if _is_transient(e):
+            raise job_queue.RetryableJobError(f"{type(e).__name__}: {e}") from e
+        raise
+
+
+def _run_log_set(job) -> dict:
+    payload = job.payload
+    video_path = job.files["video"]
+    track_submission(video_path, payload.get("endpoint", "log_set"), fingerprint=payload.get("video_sha256"))
+    model_usage.set_request(payload.get("endpoint", "log_set"), payload.get("user_id"))
+
+    args = [video_path]
+    if payload.get("user_provided_exercise"):
+        args.append(payload["user_provided_exercise"])
+    if payload.get("known_exercise_info"):
+        args.append(payload["known_exercise_info"])
+
+    job.progress("analysis")
+    final_result = analyze_set.run_cli_args(args)
+    if payload.get("user_id"):
+        final_result["user_id"] = payload["user_id"]
+
+    if payload.get("thumbnail"):
+        job.progress("thumbnail")
+        video_filename = os.path.splitext(payload.get("filename") or os.path.basename(video_path))[0]
+        thumbnail_path = f"{video_path}_thumb.jpg"
+        if generate_thumbnail(video_path, thumbnail_path):
+            thumbnail = enqueue_content(thumbnail_path, f"manual_logs/thumbnails/{video_filename}_thumb.jpg",
+                                        "manual_logs/thumbnails", content_type="image/jpeg")
+            final_result["thumbnail_url"] = thumbnail["url"]
+            final_result["thumbnail_key"] = thumbnail["s3_key"]
+
+    job.progress("saving")
+    save_set_to_supabase(final_result)
+    return final_result
+
+
+job_queue.register("log_set", run_log_set)
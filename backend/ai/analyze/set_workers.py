@@ -0,0 +1,198 @@
+import os
+import time
+import queue
+import logging
+import threading
+import traceback
+import multiprocessing
+
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ /process_set runs in long-lived worker processes instead of a fresh analyze_set.py per request.
+# A worker keeps the isolation of a subprocess (a crash, leak or hang only costs that worker) but
+# imports MediaPipe, OpenCV and the API clients once instead of on every request.
+SET_WORKERS = int(os.getenv("GYMVID_SET_WORKERS", "2"))
+# A job running longer than this has its worker killed and replaced
+SET_JOB_TIMEOUT_SEC = float(os.getenv("GYMVID_SET_JOB_TIMEOUT_SEC", "300"))
+# How long a request waits for an idle worker before it's turned away
+SET_WORKER_WAIT_SEC = float(os.getenv("GYMVID_SET_WORKER_WAIT_SEC", "30"))
+# How long a new worker may take to import everything and report ready
+SET_WORKER_START_SEC = float(os.getenv("GYMVID_SET_WORKER_START_SEC", "120"))
+# Workers are recycled after this many jobs, or once their resident memory passes the limit
+SET_WORKER_MAX_JOBS = int(os.getenv("GYMVID_SET_WORKER_MAX_JOBS", "200"))
+SET_WORKER_MAX_RSS_MB = float(os.getenv("GYMVID_SET_WORKER_MAX_RSS_MB", "1536"))
+
+_idle = queue.Queue()
+_start_lock = threading.Lock()
+_started = False
+
+
+class SetWorkerError(RuntimeError):
+    """A job didn't produce a result; `error_type` is worker_busy, timeout, worker_crashed or analysis_failed."""
+
+    def __init__(self, message: str, error_type: str, detail: str = None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.detail = detail
+
+
+# ✅ Worker process
+
+def _rss_mb() -> float:
+    """Current resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _worker_main(conn):
+    """
+    Worker loop. Messages over `conn` (pickled dicts, one per job):
+        -> {"op": "run", "args": [video_path, exercise?, known_exercise_info_json?], "coaching": bool}
+        <- {"ok": True, "result": {...}, "rss_mb": float}
+        <- {"ok": False, "error": str, "error_type": str, "traceback": str, "rss_mb": float}
+        -> {"op": "stop"}
+    The first message a worker sends is {"ready": pid} once everything is imported.
+    """
+    # Same environment the analyze_set.py subprocess ran with (quiet logging, no nested CPU pool)
+    os.environ["GYMVID_MODE"] = "subprocess"
+    from backend.ai.analyze import analyze_set, cpu_pool
+    cpu_pool.warm_worker()
+    conn.send({"ready": os.getpid()})
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            # The server went away
+            return
+        if message.get("op") == "stop":
+            return
+
+        try:
+            result = analyze_set.run_cli_args(message["args"], include_feedback=message.get("coaching", False))
+            reply = {"ok": True, "result": result}
+        except Exception as e:
+            reply = {"ok": False, "error": str(e), "error_type": "analysis_failed", "traceback": traceback.format_exc()}
+        reply["rss_mb"] = _rss_mb()
+        conn.send(reply)
+
+
+# ✅ Server side
+
+class _Worker:
+    def __init__(self):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True, name="gymvid-set-worker")
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.jobs = 0
+        self.rss_mb = 0.0
+
+    def wait_ready(self):
+        if self.ready:
+            return
+        if not self.conn.poll(SET_WORKER_START_SEC):
+            raise SetWorkerError(f"Worker did not start within {SET_WORKER_START_SEC:.0f}s", "worker_crashed")
+        self.conn.recv()
+        self.ready = True
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self, kill: bool = False):
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send({"op": "stop"})
+                self.process.join(5)
+                if self.process.is_alive():
+                    self.process.kill()
+        except (OSError, ValueError, BrokenPipeError):
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+
+def start():
+    """Pre-forks the workers; they import in the background (call at app startup)."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        for _ in range(SET_WORKERS):
+            _idle.put(_Worker())
+    logger.info(f"🏭 Started {SET_WORKERS} set analysis workers")
+
+
+def _replace(worker: _Worker, reason: str, kill: bool = False):
+    metrics.increment("set_worker_recycled_total", reason=reason)
+    logger.info(f"♻️ Replacing set worker {worker.process.pid} ({reason}, {worker.jobs} jobs, {worker.rss_mb:.0f}MB)")
+    worker.stop(kill=kill)
+    _idle.put(_Worker())
+
+
+def run_set(args: list, coaching: bool = False, timeout: float = SET_JOB_TIMEOUT_SEC) -> dict:
+    """
+    Runs analyze_set on an idle worker and returns its result (blocking).
+
+    Args:
+        args (list): [video_path, user_provided_exercise?, known_exercise_info_json?], as for run_cli_args.
+        coaching (bool): Include coaching feedback.
+        timeout (float): Seconds before the worker is killed and the job fails.
+
+    Raises:
+        SetWorkerError: No worker was free, the job timed out, the worker crashed, or the analysis raised.
+    """
+    start()
+    try:
+        worker = _idle.get(timeout=SET_WORKER_WAIT_SEC)
+    except queue.Empty:
+        metrics.increment("set_worker_jobs_total", outcome="busy")
+        raise SetWorkerError("All set analysis workers are busy. Please try again shortly.", "worker_busy")
+
+    if not worker.alive():
+        # Died while idle; its replacement still has to import, so this request waits for it
+        _replace(worker, "died_idle", kill=True)
+        worker = _idle.get()
+
+    started = time.monotonic()
+    outcome = "crashed"
+    try:
+        worker.wait_ready()
+        worker.conn.send({"op": "run", "args": list(args), "coaching": coaching})
+        if not worker.conn.poll(timeout):
+            outcome = "timeout"
+            raise SetWorkerError(f"Set analysis took longer than {timeout:.0f}s", "timeout")
+        reply = worker.conn.recv()
+    except (EOFError, OSError) as e:
+        worker.process.join(1)
+        raise SetWorkerError(f"Set analysis worker exited unexpectedly (exit code {worker.process.exitcode})",
+                             "worker_crashed", detail=str(e))
+    else:
+        worker.jobs += 1
+        worker.rss_mb = reply.get("rss_mb", 0.0)
+        outcome = "succeeded" if reply["ok"] else "failed"
+        if not reply["ok"]:
+            raise SetWorkerError(reply["error"], reply.get("error_type", "analysis_failed"), detail=reply.get("traceback"))
+        return reply["result"]
+    finally:
+        metrics.increment("set_worker_jobs_total", outcome=outcome)
+        metrics.observe("set_worker_job_sec", time.monotonic() - started, outcome=outcome)
+        if outcome in ("crashed", "timeout"):
+            _replace(worker, outcome, kill=True)
+        elif worker.rss_mb > SET_WORKER_MAX_RSS_MB:
+            _replace(worker, "memory")
+        elif worker.jobs >= SET_WORKER_MAX_JOBS:
+            _replace(worker, "max_jobs")
+        else:
+            _idle.put(worker)
@@ -3,9 +3,13 @@ import numpy as np
 import os
 import mediapipe as mp
 import logging
+from contextlib import nullcontext
 
 logger = logging.getLogger(__name__)
 
+# Shared with the CPU pool's warm graphs so both paths track identically
+POSE_OPTIONS = dict(static_image_mode=False, min_detection_confidence=0.3, min_tracking_confidence=0.3)
+
 def is_visible(y_series, min_frames=10, min_movement=0.002):
     """Check if a landmark is visible with sufficient movement"""
     y_array = np.array(y_series)
@@ -14,15 +18,19 @@ def is_visible(y_series, min_frames=10, min_movement=0.002):
     movement_range = np.max(y_array) - np.min(y_array)
     return movement_range > min_movement
 
-def analyze_video(video_path: str) -> dict:
+def analyze_video(video_path: str, pose=None) -> dict:
     """
     Extracts pose landmarks from the input video and identifies the most active or available landmark.
 
     Args:
         video_path (str): Path to the input workout video.
+        pose: An already-built mp.solutions.pose.Pose to reuse (see cpu_pool); it is reset
+              first so tracking doesn't carry over from the previous video. A new one is
+              built and closed when omitted.
 
     Returns:
-        dict: Metadata including frame dimensions, FPS, best tracking landmark, and raw Y-axis data.
+        dict: Metadata including frame dimensions, FPS, best tracking landmark, raw Y-axis data
+              and the X/Y trajectory of every tracked landmark.
     """
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"Video not found: {video_path}")
@@ -60,13 +68,16 @@ def analyze_video(video_path: str) -> dict:
     }
 
     landmark_positions = {k: [] for k in landmark_dict}
+    landmark_x_positions = {k: [] for k in landmark_dict}
     frames_processed = 0
 
-    with mp_pose.Pose(
-        static_image_mode=False,
-        min_detection_confidence=0.3,
-        min_tracking_confidence=0.3
-    ) as pose:
+    if pose is not None and hasattr(pose, "reset"):
+        pose.reset()
+        pose_context = nullcontext(pose)
+    else:
+        pose_context = mp_pose.Pose(**POSE_OPTIONS)
+
+    with pose_context as pose:
         while cap.isOpened():
             ret, frame = cap.read()
             if not ret:
@@ -78,9 +89,11 @@ def analyze_video(video_path: str) -> dict:
             if results.pose_landmarks:
                 for name, lm in landmark_dict.items():
                     landmark_positions[name].append(results.pose_landmarks.landmark[lm].y)
+                    landmark_x_positions[name].append(results.pose_landmarks.landmark[lm].x)
             else:
                 for name in landmark_dict:
                     landmark_positions[name].append(np.nan)
+                    landmark_x_positions[name].append(np.nan)
 
             frames_processed += 1
 
@@ -133,5 +146,8 @@ def analyze_video(video_path: str) -> dict:
         "best_landmark": best_landmark,
         "raw_y": raw_y.tolist(),
         "raw_left_y": landmark_positions.get("left_wrist", []),
-        "raw_right_y": landmark_positions.get("right_wrist", [])
+        "raw_right_y": landmark_positions.get("right_wrist", []),
+        # Full per-landmark trajectories (NaN where no pose was found), used by the pose classifier
+        "landmark_y": landmark_positions,
+        "landmark_x": landmark_x_positions
     }
@@ -0,0 +1,107 @@
+import base64
+import json
+import math
+import struct
+
+# ✅ Vision pricing constants for gpt-4o class models
+LOW_DETAIL_TOKENS = 85
+TILE_TOKENS = 170
+TILE_SIZE = 512
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+
+# Used when an image's size can't be read (e.g. a remote URL)
+UNKNOWN_IMAGE_TOKENS = 765
+
+# Rough chars-per-token ratio for English prompt text
+CHARS_PER_TOKEN = 4
+
+# JPEG start-of-frame markers that carry the image dimensions
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Estimates the prompt tokens an image costs, following the vision API tiling rules.
+
+    The image is scaled to fit 2048x2048, then its short side to 768px, and billed as
+    85 base tokens plus 170 per 512px tile. Low detail is a flat 85 tokens.
+    """
+    if detail == "low":
+        return LOW_DETAIL_TOKENS
+    if not width or not height:
+        return UNKNOWN_IMAGE_TOKENS
+
+    scale = min(1.0, MAX_LONG_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, MAX_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return LOW_DETAIL_TOKENS + TILE_TOKENS * tiles
+
+
+def jpeg_dimensions(data: bytes):
+    """Returns (width, height) read from a JPEG header, or None if it can't be found."""
+    if len(data) < 4 or data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        segment_length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        i += 2 + segment_length
+    return None
+
+
+def data_url_dimensions(url: str):
+    """Reads the image size from a base64 JPEG data URL without decoding the whole payload."""
+    if not url.startswith("data:image/jpeg;base64,"):
+        return None
+    encoded = url.split(",", 1)[1][:87380]  # ~64KB of header bytes is plenty to reach the SOF marker
+    encoded = encoded[:len(encoded) - len(encoded) % 4]
+    try:
+        return jpeg_dimensions(base64.b64decode(encoded))
+    except Exception:
+        return None
+
+
+def estimate_request_tokens(params: dict) -> int:
+    """
+    Estimates the tokens a chat completion will be charged against a tokens-per-minute quota:
+    prompt text, every attached image, and the requested completion budget.
+    """
+    text_chars = 0
+    image_tokens = 0
+    for message in params.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            text_chars += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                text_chars += len(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                image = part.get("image_url", {})
+                detail = image.get("detail", "auto")
+                size = data_url_dimensions(image.get("url", ""))
+                if detail == "low":
+                    image_tokens += LOW_DETAIL_TOKENS
+                elif size:
+                    image_tokens += estimate_image_tokens(size[0], size[1], detail)
+                else:
+                    image_tokens += UNKNOWN_IMAGE_TOKENS
+
+    if params.get("response_format"):
+        text_chars += len(json.dumps(params["response_format"]))
+
+    prompt_tokens = math.ceil(text_chars / CHARS_PER_TOKEN) + image_tokens
+    return prompt_tokens + int(params.get("max_tokens") or 0)
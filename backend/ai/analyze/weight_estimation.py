@@ -1,37 +1,53 @@
 import os
 import base64
-import json
-import re
-from openai import OpenAI
-from dotenv import load_dotenv
+import cv2
+import numpy as np
 
-# ✅ Load environment variables and initialize OpenAI client
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from backend.ai.analyze.gpt_schemas import structured_completion, WeightEstimate
+from backend.ai.analyze.frame_quality import rank_image_files
+from backend.ai.analyze.plate_detector import (
+    estimate_weight_from_plates,
+    PLATE_DETECTOR_ENABLED,
+    PLATE_CONFIDENCE_THRESHOLD,
+)
+from backend.utils import metrics
 
 # ✅ Check for subprocess mode
 IS_SUBPROCESS = os.getenv("GYMVID_MODE") == "subprocess"
 
-# ✅ Extract clean JSON from GPT response
-def extract_json_block(text):
-    match = re.search(r"```json\n(.*?)```", text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    return text.strip()
-
-def estimate_weight_from_keyframes(keyframe_dir, movement_name=None):
+def estimate_weight_from_keyframes(keyframe_dir, movement_name=None, deadline=None, image_store=None, equipment=None):
+    # ✅ Send at most 3 keyframes, chosen for plate readability (pick before encoding anything)
+    MAX_IMAGES = 3
     images = []
-    for fname in sorted(os.listdir(keyframe_dir)):
-        if fname.endswith(".jpg"):
-            with open(os.path.join(keyframe_dir, fname), "rb") as f:
-                b64 = base64.b64encode(f.read()).decode("utf-8")
-                images.append({"name": fname, "data": b64})
+    if image_store is not None:
+        # This request's own frames; the sharpness-ranked selection if it ran, else its raw keyframes
+        names = image_store.names("weight_frames/")
+        if not names:
+            names = image_store.names("keyframes/")
+            if len(names) > MAX_IMAGES:
+                step = max(len(names) // MAX_IMAGES, 1)
+                names = [names[i] for i in range(0, len(names), step)][:MAX_IMAGES]
+        for name in names:
+            stored = image_store.get(name)
+            images.append({"name": name, "data": stored.b64, "detail": stored.detail, "bytes": stored.data})
+    else:
+        paths = [os.path.join(keyframe_dir, fname) for fname in sorted(os.listdir(keyframe_dir)) if fname.endswith(".jpg")]
+        for path in rank_image_files(paths, max_frames=MAX_IMAGES):
+            with open(path, "rb") as f:
+                data = f.read()
+            images.append({"name": os.path.basename(path), "data": base64.b64encode(data).decode("utf-8"), "detail": "auto", "bytes": data})
 
-    # ✅ Limit keyframes to 3 max to avoid token overflow
-    MAX_IMAGES = 3
-    if len(images) > MAX_IMAGES:
-        step = max(len(images) // MAX_IMAGES, 1)
-        images = [images[i] for i in range(0, len(images), step)][:MAX_IMAGES]
+    # ✅ Barbell with colour-coded plates: try the local detector before paying for a vision call
+    if PLATE_DETECTOR_ENABLED and equipment == "Barbell" and images:
+        # Decoded straight from the JPEG bytes, not back out of the base64 payload
+        frames = [cv2.imdecode(np.frombuffer(img["bytes"], np.uint8), cv2.IMREAD_COLOR) for img in images]
+        plate_estimate = estimate_weight_from_plates(frames)
+        if plate_estimate and plate_estimate["confidence"] >= PLATE_CONFIDENCE_THRESHOLD:
+            metrics.increment("weight_estimation_source_total", source="plate_detector")
+            if not IS_SUBPROCESS:
+                print(f"🎨 Weight from plate colours: {plate_estimate['estimated_weight_kg']}kg ({plate_estimate['confidence']}%)")
+            return plate_estimate
+    metrics.increment("weight_estimation_source_total", source="gpt")
 
     if not IS_SUBPROCESS:
         print(f"⚖️ Estimating weight from {len(images)} keyframes...")
@@ -70,22 +86,23 @@ Do not include any explanation or extra text — only the JSON block.
     for img in images:
         messages.append({
             "role": "user",
-            "content": [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img['data']}"}}]
+            "content": [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img['data']}", "detail": img["detail"]}}]
         })
 
     try:
-        response = client.chat.completions.create(
+        estimate = structured_completion(
+            stage="weight_estimation",
+            schema_cls=WeightEstimate,
+            deadline=deadline,
             model="gpt-4o",
             messages=messages,
             max_tokens=300
         )
-        raw_text = response.choices[0].message.content.strip()
 
         if not IS_SUBPROCESS:
-            print("📦 Raw GPT Response:\n", raw_text)
+            print("📦 GPT weight estimate:", estimate)
 
-        json_text = extract_json_block(raw_text)
-        return json.loads(json_text)
+        return estimate
 
     except Exception as e:
         return {
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
+import os
 from backend.utils.download_from_s3 import download_video_from_url
-from backend.ai.analyze.video_analysis import analyze_video
+from backend.ai.analyze import cpu_pool
 from backend.ai.analyze.rep_detection import run_rep_detection_from_landmark_y
 from backend.ai.analyze.keyframe_exporter import export_keyframes
 from backend.ai.analyze.coaching_feedback import generate_feedback
@@ -15,18 +16,19 @@ class FeedbackRequest(BaseModel):
 
 @router.post("/analyze/feedback")
 async def analyze_feedback(request: FeedbackRequest):
+    video_path = None
     try:
         # ✅ Step 1: Download video from S3
         video_path = download_video_from_url(request.video_url)
 
         # ✅ Step 2: Run MediaPipe analysis
-        video_data = analyze_video(video_path)  # returns raw_y and fps
+        video_data = await cpu_pool.analyze_video_async(video_path)  # returns raw_y and fps
 
         # ✅ Step 3: Detect reps from landmark motion
         rep_data = run_rep_detection_from_landmark_y(video_data["raw_y"], video_data["fps"])
 
         # ✅ Step 4: Optionally extract keyframes (for visual QA or logging)
-        export_keyframes(video_path, rep_data)
+        await cpu_pool.run_async(export_keyframes, video_path, rep_data)
 
         # ✅ Step 5: Generate GPT-based form feedback
         feedback = generate_feedback(
@@ -49,3 +51,6 @@ async def analyze_feedback(request: FeedbackRequest):
                 }]
             }
         }
+    finally:
+        if video_path and os.path.exists(video_path):
+            os.remove(video_path)
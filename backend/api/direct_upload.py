@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Form
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import os
+import re
+import uuid
+
+from backend.ai.analyze import analyze_set
+from backend.ai.analyze.gpt_schemas import track_submission
+from backend.ai.analyze import model_usage
+from backend.utils.save_set_to_supabase import save_set_to_supabase
+from backend.utils.s3_uploads import object_url
+from backend.utils.s3_direct import (
+    presign_put,
+    start_multipart,
+    complete_multipart,
+    abort_multipart,
+    object_size,
+    download_ranged,
+    DIRECT_UPLOAD_PREFIX,
+    MAX_DIRECT_UPLOAD_BYTES,
+    MULTIPART_THRESHOLD,
+    PRESIGN_EXPIRES_SEC,
+)
+
+router = APIRouter()
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".webm", ".avi"}
+
+@router.post("/uploads/presign")
+def presign_upload(
+    user_id: str = Form(...),
+    filename: str = Form(...),
+    content_type: str = Form("video/mp4"),
+    size_bytes: int = Form(...)
+):
+    """
+    Signs a direct upload to the bucket, so the video never passes through the API.
+    Returns:
+        - method "PUT": one `url` to PUT the file to
+        - method "MULTIPART": `upload_id` and a presigned `url` per part of `part_size` bytes;
+          PUT each part, then POST the parts' ETags to /uploads/complete
+    """
+    if not content_type.startswith("video/"):
+        return JSONResponse(status_code=400, content={"success": False, "error": "Only video uploads are supported", "error_type": "invalid_input"})
+    if size_bytes <= 0 or size_bytes > MAX_DIRECT_UPLOAD_BYTES:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Video must be under {MAX_DIRECT_UPLOAD_BYTES // (1024 * 1024)}MB", "error_type": "file_too_large"})
+
+    ext = os.path.splitext(filename)[-1].lower()
+    if ext not in VIDEO_EXTENSIONS:
+        ext = ".mp4"
+    safe_user_id = re.sub(r"[^A-Za-z0-9_-]", "", user_id) or "anonymous"
+    s3_key = f"{DIRECT_UPLOAD_PREFIX}{safe_user_id}/{uuid.uuid4().hex}{ext}"
+
+    response = {"success": True, "s3_key": s3_key, "url": None, "expires_in": PRESIGN_EXPIRES_SEC}
+    if size_bytes < MULTIPART_THRESHOLD:
+        response.update({"method": "PUT", "url": presign_put(s3_key, content_type, size_bytes),
+                         "headers": {"Content-Type": content_type, "Content-Length": str(size_bytes)}})
+    else:
+        response.update({"method": "MULTIPART", **start_multipart(s3_key, content_type, size_bytes)})
+    response["object_url"] = object_url(s3_key)
+    return response
+
+
+class CompletedPart(BaseModel):
+    part_number: int
+    etag: str
+
+class CompleteUploadRequest(BaseModel):
+    s3_key: str
+    upload_id: str
+    parts: List[CompletedPart]
+    abort: bool = False
+
+@router.post("/uploads/complete")
+def complete_upload(request: CompleteUploadRequest):
+    """Finishes (or, with abort=true, cancels) a multipart direct upload."""
+    if not request.s3_key.startswith(DIRECT_UPLOAD_PREFIX):
+        return JSONResponse(status_code=400, content={"success": False, "error": "Not a direct upload key", "error_type": "invalid_input"})
+    try:
+        if request.abort:
+            abort_multipart(request.s3_key, request.upload_id)
+            return {"success": True, "s3_key": request.s3_key, "aborted": True}
+        complete_multipart(request.s3_key, request.upload_id, [part.model_dump() for part in request.parts])
+        return {"success": True, "s3_key": request.s3_key, "object_url": object_url(request.s3_key)}
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e), "error_type": "multipart_complete_failed"})
+
+
+@router.post("/uploads/process")
+def process_uploaded_video(
+    s3_key: str = Form(...),
+    user_provided_exercise: Optional[str] = Form(None),
+    known_exercise_info: Optional[str] = Form(None)
+):
+    """
+    Runs set analysis (as /analyze/log_set does) on a video already uploaded with /uploads/presign.
+    The object is streamed down in parallel byte ranges into this request's own temp file.
+    """
+    if not s3_key.startswith(DIRECT_UPLOAD_PREFIX) or ".." in s3_key:
+        return JSONResponse(status_code=400, content={"success": False, "error": "Not a direct upload key", "error_type": "invalid_input"})
+
+    size_bytes = object_size(s3_key)
+    if size_bytes is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Upload not found; finish uploading first", "error_type": "upload_not_found"})
+    if size_bytes > MAX_DIRECT_UPLOAD_BYTES:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Video must be under {MAX_DIRECT_UPLOAD_BYTES // (1024 * 1024)}MB", "error_type": "file_too_large"})
+
+    os.makedirs("temp_uploads", exist_ok=True)
+    temp_video_path = f"temp_uploads/{uuid.uuid4().hex}{os.path.splitext(s3_key)[-1]}"
+    try:
+        download_ranged(s3_key, temp_video_path, size_bytes)
+        track_submission(temp_video_path, "uploads_process")
+        model_usage.set_request("uploads_process")
+
+        final_result = analyze_set.run_cli_args([temp_video_path, user_provided_exercise, known_exercise_info])
+        final_result["video_url"] = object_url(s3_key)
+        save_set_to_supabase(final_result)
+        return JSONResponse({"success": True, "data": final_result})
+    finally:
+        if os.path.exists(temp_video_path):
+            os.remove(temp_video_path)
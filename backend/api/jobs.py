@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, StreamingResponse
+import json
+import asyncio
+
+from backend.utils import job_queue
+
+router = APIRouter()
+
+def _not_found(job_id: str) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"success": False, "error": f"Unknown job {job_id}", "error_type": "job_not_found"})
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    Status of a background job (e.g. /analyze/log_set with wait=false).
+    Returns:
+        - state: queued, running, succeeded, failed or cancelled
+        - progress: the pipeline stage currently running
+        - timings: seconds per finished stage, plus queued_sec and run_sec
+        - result / error once done
+    """
+    job = await asyncio.to_thread(job_queue.get_job, job_id)
+    if job is None:
+        return _not_found(job_id)
+    return {"success": True, **job}
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: one `job` event per state or progress change, ending when the job finishes."""
+    if await asyncio.to_thread(job_queue.get_job, job_id) is None:
+        return _not_found(job_id)
+
+    async def stream():
+        async for job in job_queue.watch(job_id):
+            yield f"event: job\ndata: {json.dumps(job)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-store"})
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancels a queued job at once, or a running one before its next pipeline stage."""
+    job = await asyncio.to_thread(job_queue.cancel, job_id)
+    if job is None:
+        return _not_found(job_id)
+    return {"success": True, **job}
@@ -2,10 +2,13 @@ from fastapi import APIRouter, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from typing import Optional
 import os
-import shutil
+import uuid
+import asyncio
 
 from backend.utils.save_set_to_supabase import supabase
-from backend.utils.aws_utils import upload_file_to_s3
+from backend.utils.content_store import enqueue_content
+from backend.utils.resumable_uploads import claim_upload, UPLOAD_TARGET_MAX_BYTES
+from backend.utils.upload_sink import save_upload, UploadRejected
 from backend.utils.generate_thumbnail import generate_thumbnail
 
 router = APIRouter()
@@ -20,7 +23,8 @@ async def manual_log(
     reps: int = Form(...),
     rpe: Optional[float] = Form(None),
     rir: Optional[float] = Form(None),
-    video: Optional[UploadFile] = File(None)
+    video: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None)  # ✅ A completed /uploads/resumable upload, instead of `video`
 ):
     # ✅ Provide fallback for dev
     if not user_id:
@@ -33,26 +37,45 @@ async def manual_log(
 
     video_url = None
     thumbnail_url = None
+    video_key = None
+    thumbnail_key = None
 
-    if video:
-        temp_video_path = f"temp_uploads/{video.filename}"
-        with open(temp_video_path, "wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
-
-        s3_key = f"manual_logs/videos/{video.filename}"
-        if upload_file_to_s3(temp_video_path, s3_key):
-            video_url = f"https://{os.getenv('S3_BUCKET_NAME')}.s3.amazonaws.com/{s3_key}"
+    if video or upload_id:
+        video_sha256 = None
+        if upload_id:
+            try:
+                saved = claim_upload(upload_id, f"temp_uploads/{upload_id}", user_id)
+            except UploadRejected as e:
+                return JSONResponse(status_code=400, content={"success": False, "error": str(e), "error_type": e.error_type})
+            filename = saved.filename
+            content_type = saved.content_type
+            video_sha256 = saved.sha256
+            temp_video_path = saved.path
+        else:
+            filename = video.filename
+            content_type = video.content_type
+            temp_video_path = f"temp_uploads/{uuid.uuid4().hex}_{os.path.basename(filename)}"
+            # Hashed while it streams to disk, so the content key doesn't need a second pass over the file
+            try:
+                saved = await save_upload(video, temp_video_path, UPLOAD_TARGET_MAX_BYTES["manual_log"], require_video=False)
+            except UploadRejected as e:
+                return JSONResponse(status_code=400, content={"success": False, "error": str(e), "error_type": e.error_type})
+            video_sha256 = saved.sha256
 
-        thumb_path = f"temp_uploads/{video.filename}_thumb.jpg"
-        if generate_thumbnail(temp_video_path, thumb_path):
-            thumb_key = f"manual_logs/thumbnails/{video.filename}_thumb.jpg"
-            if upload_file_to_s3(thumb_path, thumb_key):
-                thumbnail_url = f"https://{os.getenv('S3_BUCKET_NAME')}.s3.amazonaws.com/{thumb_key}"
-            if os.path.exists(thumb_path):
-                os.remove(thumb_path)
+        # ✅ Thumbnail first (it needs the local video), then both files upload in the background
+        # under content-hash keys (skipped if identical content is already stored);
+        # the row is inserted with their final URLs straight away.
+        # Frame decoding and the S3 existence checks block, so they run off the event loop
+        thumb_path = f"{temp_video_path}_thumb.jpg"
+        if await asyncio.to_thread(generate_thumbnail, temp_video_path, thumb_path):
+            thumbnail = await asyncio.to_thread(enqueue_content, thumb_path, f"manual_logs/thumbnails/{filename}_thumb.jpg",
+                                                "manual_logs/thumbnails", content_type="image/jpeg")
+            thumbnail_key, thumbnail_url = thumbnail["s3_key"], thumbnail["url"]
 
-        if os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
+        stored_video = await asyncio.to_thread(enqueue_content, temp_video_path, f"manual_logs/videos/{filename}",
+                                               "manual_logs/videos", sha256=video_sha256,
+                                               content_type=content_type or "video/mp4")
+        video_key, video_url = stored_video["s3_key"], stored_video["url"]
 
     weight_kg = weight if weight_unit.lower() == "kg" else round(weight * 0.453592, 2)
 
@@ -74,6 +97,7 @@ async def manual_log(
             "success": True,
             "video_url": video_url,
             "thumbnail_url": thumbnail_url,
+            "upload_keys": [k for k in (video_key, thumbnail_key) if k],
             "data": insert_result.data[0]
         })
 
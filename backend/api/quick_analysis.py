@@ -1,15 +1,18 @@
 from fastapi import APIRouter, UploadFile, File
 from fastapi.responses import JSONResponse
-import numpy as np
 import tempfile
 import os
 import cv2
 
 from backend.ai.analyze.exercise_prediction import predict_exercise
+from backend.ai.analyze.collage_renderer import render_collage
+from backend.utils.upload_sink import save_upload, MAX_VIDEO_UPLOAD_BYTES
 
 app = APIRouter()
 
-# ✅ Export collage from 4 evenly spaced frames at 192x192 with JPEG compression
+# ✅ Export a single-row strip of 4 evenly spaced frames, sized to the token budget
+QUICK_STRIP_TOKEN_BUDGET = int(os.getenv("GYMVID_QUICK_STRIP_TOKEN_BUDGET", "425"))
+
 def export_evenly_spaced_collage(video_path: str, total_frames: int = 4, output_dir: str = "quick_collages") -> list:
     os.makedirs(output_dir, exist_ok=True)
     cap = cv2.VideoCapture(video_path)
@@ -17,21 +20,17 @@ def export_evenly_spaced_collage(video_path: str, total_frames: int = 4, output_
         raise ValueError(f"Unable to open video: {video_path}")
 
     frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    height, width = 192, 192
-    collage_width = width * total_frames
-    collage = 255 * np.ones((height, collage_width, 3), dtype=np.uint8)
-
+    frames = []
     for i in range(total_frames):
         frame_index = int(frame_count * ((i + 1) / (total_frames + 1)))
         cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
         ret, frame = cap.read()
-        if ret:
-            resized = cv2.resize(frame, (width, height))
-            collage[:, i * width:(i + 1) * width] = resized
+        frames.append(frame if ret else None)
+    cap.release()
 
+    collage = render_collage(frames, QUICK_STRIP_TOKEN_BUDGET, cols=total_frames, stage="quick_strip")
     collage_path = os.path.join(output_dir, "quick_collage.jpg")
-    cv2.imwrite(collage_path, collage, [cv2.IMWRITE_JPEG_QUALITY, 60])
-    cap.release()
+    collage.save(collage_path)
 
     return [collage_path]
 
@@ -39,8 +38,8 @@ def export_evenly_spaced_collage(video_path: str, total_frames: int = 4, output_
 async def quick_exercise_prediction(video: UploadFile = File(...)):
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-            tmp.write(await video.read())
             tmp_path = tmp.name
+        await save_upload(video, tmp_path, MAX_VIDEO_UPLOAD_BYTES)
 
         collage_paths = export_evenly_spaced_collage(tmp_path, total_frames=4)
         print("✅ Collage paths:", collage_paths)
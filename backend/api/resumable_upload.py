@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Form, Request, Header
+from fastapi.responses import JSONResponse, Response
+from typing import Optional
+
+from backend.utils.resumable_uploads import (
+    ChunkRejected,
+    create_upload,
+    get_upload,
+    write_chunk,
+    delete_upload,
+    RESUMABLE_MAX_CHUNK_BYTES,
+    RESUMABLE_SUGGESTED_CHUNK_BYTES,
+    CHECKSUM_ALGORITHMS,
+)
+
+router = APIRouter()
+
+
+def _rejected(e: ChunkRejected) -> JSONResponse:
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    content = {"success": False, "error": str(e), "error_type": e.error_type}
+    if e.offset is not None:
+        content["offset"] = e.offset
+    return JSONResponse(status_code=e.status_code, content=content, headers=headers)
+
+
+@router.post("/uploads/resumable")
+def create_resumable_upload(
+    user_id: str = Form(...),
+    filename: str = Form(...),
+    size_bytes: int = Form(...),
+    content_type: str = Form("video/mp4"),
+    sha256: Optional[str] = Form(None),
+    target: Optional[str] = Form(None)
+):
+    """
+    Starts a resumable upload for flaky connections.
+    Send the file as PATCH /uploads/resumable/{upload_id} requests, each with an `Upload-Offset`
+    header (and optionally `Upload-Checksum: sha256 <base64>`). After a dropped connection,
+    HEAD or GET the upload to find the offset to resume from. Once `complete` is true, pass
+    `upload_id` to /analyze/feedback_upload or /manual_log instead of the video. Set `target`
+    to "feedback_upload" or "manual_log" to have that endpoint's size limit checked now.
+    """
+    try:
+        upload = create_upload(user_id, filename, size_bytes, content_type, sha256, target=target)
+    except ChunkRejected as e:
+        return _rejected(e)
+    return {
+        "success": True,
+        **upload,
+        "url": f"/uploads/resumable/{upload['upload_id']}",
+        "chunk_size": RESUMABLE_SUGGESTED_CHUNK_BYTES,
+        "max_chunk_size": RESUMABLE_MAX_CHUNK_BYTES,
+        "checksum_algorithms": list(CHECKSUM_ALGORITHMS),
+    }
+
+
+@router.head("/uploads/resumable/{upload_id}")
+def resumable_upload_offset(upload_id: str):
+    """The tus-style offset probe: `Upload-Offset` and `Upload-Length` headers, no body."""
+    try:
+        upload = get_upload(upload_id)
+    except ChunkRejected as e:
+        return Response(status_code=e.status_code)
+    return Response(status_code=200, headers={
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["size_bytes"]),
+        "Cache-Control": "no-store",
+    })
+
+
+@router.get("/uploads/resumable/{upload_id}")
+def resumable_upload_status(upload_id: str):
+    try:
+        return {"success": True, **get_upload(upload_id)}
+    except ChunkRejected as e:
+        return _rejected(e)
+
+
+@router.patch("/uploads/resumable/{upload_id}")
+async def resumable_upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum")
+):
+    """
+    Appends the request body at `Upload-Offset`.
+    Errors: 409 offset_mismatch (resume from the returned offset), 460 checksum_mismatch
+    (resend the chunk), 413 chunk_too_large, 404 upload_not_found (expired; start again).
+    """
+    try:
+        upload = await write_chunk(upload_id, upload_offset, request.stream(), upload_checksum)
+    except ChunkRejected as e:
+        return _rejected(e)
+    return JSONResponse(
+        {"success": True, **upload},
+        headers={"Upload-Offset": str(upload["offset"]), "Cache-Control": "no-store"},
+    )
+
+
+@router.delete("/uploads/resumable/{upload_id}")
+def cancel_resumable_upload(upload_id: str):
+    try:
+        deleted = delete_upload(upload_id)
+    except ChunkRejected as e:
+        return _rejected(e)
+    return {"success": True, "upload_id": upload_id, "deleted": deleted}
@@ -2,8 +2,9 @@
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
-from backend.utils.aws_utils import upload_fileobj_to_s3
-import uuid
+from backend.utils.profile_images import process_profile_image, InvalidImage
+import asyncio
+from functools import partial
 from datetime import datetime
 
 router = APIRouter()
@@ -26,25 +27,31 @@ async def upload_profile_image(file: UploadFile = File(...), user_id: str = Form
         if len(content) > MAX_SIZE:
             raise HTTPException(status_code=413, detail="File too large. Max is 3MB")
 
-        # Reset file pointer after reading
-        file.file.seek(0)
-
-        # Generate unique filename
+        # Decode, resize to every avatar size and upload all variants off the event loop
         file_ext = file.filename.rsplit('.', 1)[1].lower()
-        key = f"profile_images/{user_id}/{uuid.uuid4()}.{file_ext}"
-
-        # Upload to S3
-        image_url = upload_fileobj_to_s3(file.file, key, content_type=file.content_type)
-
-        if not image_url:
+        loop = asyncio.get_event_loop()
+        try:
+            processed = await loop.run_in_executor(
+                None, partial(process_profile_image, content, user_id, file.content_type or "image/jpeg", file_ext)
+            )
+        except InvalidImage as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except IOError:
             raise HTTPException(status_code=500, detail="Failed to upload to S3")
 
+        # image_url stays a JPEG so every existing client can show it, at the largest avatar size
+        variants = processed["variants"]
+        largest = variants[max(variants, key=int)]
+        image_url = largest.get("jpeg") or largest.get("webp")
+
         return JSONResponse(
             status_code=200,
             content={
                 "success": True,
                 "message": "Profile image uploaded to S3 successfully",
                 "image_url": image_url,
+                "original_url": processed["original_url"],
+                "variants": variants,
                 "timestamp": datetime.now().isoformat()
             }
         )
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Query
+from typing import List
+
+from backend.utils.upload_queue import upload_status
+from backend.utils.s3_uploads import object_url, object_exists
+from backend.utils.content_store import resolve
+
+router = APIRouter()
+
+@router.get("/uploads/status")
+async def uploads_status(key: List[str] = Query(..., description="S3 key(s) returned by a write-behind upload")):
+    """
+    Readiness of background uploads (e.g. a manual log's video and thumbnail).
+    Returns:
+        - uploads: One entry per key; `ready` is true once the object is in the bucket
+    """
+    uploads = []
+    for s3_key in key:
+        status = upload_status(s3_key)
+        if status is None:
+            # Deduplicated content is never queued; it was already in the bucket
+            ready = object_exists(s3_key)
+            status = {"s3_key": s3_key, "url": object_url(s3_key), "state": "uploaded" if ready else "unknown", "ready": ready}
+        uploads.append(status)
+    return {"success": True, "uploads": uploads}
+
+
+@router.get("/uploads/content")
+async def uploads_content(name: str = Query(..., description="Logical name, e.g. collages/<user_id>/collage_full.jpg")):
+    """
+    Looks up which content-addressed object a logical name currently points at.
+    Returns:
+        - content: s3_key, url, sha256, size and content_type; URLs are immutable and safe to cache forever
+    """
+    content = resolve(name)
+    if content is None:
+        return {"success": False, "error": "Unknown name", "error_type": "not_found"}
+    return {"success": True, "content": content}
@@ -0,0 +1,168 @@
+"""
+Compares video download strategies against a local HTTP server serving large files.
+
+The server answers HEAD and byte-range GETs like S3 does, and can cap each connection's
+bandwidth and add a first-byte delay, since a localhost download otherwise hides what
+a single TCP stream from a remote bucket costs.
+
+Strategies:
+    legacy  requests.get without a session, 8KB chunks (the old download_video_from_url)
+    stream  the pooled session, one stream with 1MB buffered writes
+    ranged  the pooled session, parallel range requests into a preallocated file
+
+Usage:
+    python -m backend.dev.download_benchmark --size-mb 128 --per-conn-mbps 200 --ttfb-ms 40
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+sys.path.append(os.path.abspath("."))
+
+from backend.utils import http_downloads
+
+
+class RangeFileHandler(BaseHTTPRequestHandler):
+    """Serves files from `root` with Accept-Ranges, optional per-connection throttling and TTFB."""
+
+    protocol_version = "HTTP/1.1"
+    root = "."
+    bytes_per_sec = 0
+    ttfb_sec = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        path = os.path.join(self.root, os.path.basename(self.path.split("?")[0]))
+        return path if os.path.isfile(path) else None
+
+    def do_HEAD(self):
+        path = self._resolve()
+        if not path:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        path = self._resolve()
+        if not path:
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        if self.ttfb_sec:
+            time.sleep(self.ttfb_sec)
+        self.send_response(206 if match else 200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        block = 256 * 1024
+        sent = 0
+        began = time.monotonic()
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                data = f.read(min(block, remaining))
+                self.wfile.write(data)
+                remaining -= len(data)
+                sent += len(data)
+                if self.bytes_per_sec:
+                    ahead = sent / self.bytes_per_sec - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+
+def start_file_server(root: str, per_conn_mbps: float = 0, ttfb_ms: float = 0):
+    handler = type("Handler", (RangeFileHandler,), {
+        "root": root,
+        "bytes_per_sec": per_conn_mbps * 1024 * 1024 / 8,
+        "ttfb_sec": ttfb_ms / 1000,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def legacy_download(url: str, dest_path: str) -> str:
+    response = requests.get(url, stream=True)
+    with open(dest_path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+    return dest_path
+
+
+def sha256_of(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Video download benchmark")
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--per-conn-mbps", type=float, default=200, help="Bandwidth cap per connection (0 = none)")
+    parser.add_argument("--ttfb-ms", type=float, default=40, help="Delay before each response's first byte")
+    parser.add_argument("--workers", type=int, default=http_downloads.DOWNLOAD_WORKERS)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="gymvid_download_bench_")
+    source = os.path.join(root, "bench_video.mp4")
+    with open(source, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+    expected = sha256_of(source)
+    server, base_url = start_file_server(root, args.per_conn_mbps, args.ttfb_ms)
+    url = f"{base_url}/bench_video.mp4"
+    http_downloads.DOWNLOAD_WORKERS = args.workers
+
+    out_dir = os.path.join(root, "out")
+    os.makedirs(out_dir)
+    strategies = {
+        "legacy": legacy_download,
+        "stream": lambda url, dest: http_downloads._fetch_stream(url, dest),
+        "ranged": lambda url, dest: http_downloads.download_url(url, dest),
+    }
+    timings = {name: [] for name in strategies}
+    for _ in range(args.rounds):
+        for name, download in strategies.items():
+            dest = os.path.join(out_dir, f"{name}.mp4")
+            start = time.monotonic()
+            download(url, dest)
+            timings[name].append(time.monotonic() - start)
+            assert sha256_of(dest) == expected, f"{name} produced a corrupt file"
+            os.remove(dest)
+
+    cap = f"{args.per_conn_mbps:.0f}Mbit/s per connection" if args.per_conn_mbps else "no bandwidth cap"
+    print(f"📥 {args.size_mb}MB file, {cap}, {args.ttfb_ms:.0f}ms TTFB, {args.workers} range workers")
+    for name, values in timings.items():
+        median = float(np.median(values))
+        print(f"   {name:<7} median={median:.2f}s ({args.size_mb / median:.0f}MB/s) max={max(values):.2f}s")
+
+    server.shutdown()
+    shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,257 @@
+"""
+Local stand-in for the OpenAI chat-completions API.
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 to exercise
+the model stages without network access or spend. Latency follows a configurable
+distribution (optionally per stage), a fraction of calls can be answered with 429s,
+and `"stream": true` requests get server-sent event chunks like the real API.
+
+Usage:
+    python -m backend.dev.fake_openai_server --port 8765 --latency-ms 300 --slow-fraction 0.1 --slow-ms 8000
+    python -m backend.dev.fake_openai_server --distribution lognormal --sigma 0.5 \
+        --stage-latency coaching_feedback=4000 --rate-limit-fraction 0.05 --replies replies.json
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ✅ Canned replies, picked by keywords found in the prompt
+CANNED_REPLIES = {
+    "exercise_prediction": {
+        "equipment": "Barbell",
+        "movement_pattern": "Squat",
+        "variation": "High Bar",
+        "movement": "Barbell Back Squat",
+        "confidence": 92,
+    },
+    "weight_estimation": {
+        "equipment": "Barbell",
+        "estimated_weight_kg": 100,
+        "confidence": 85,
+    },
+    "coaching_feedback": {
+        "coaching_feedback": {
+            "form_rating": 8,
+            "observations": [
+                {"header": "Bar Path", "observation": "Bar stays over mid-foot.", "tip": "Keep it there as you fatigue."}
+            ],
+            "summary": "Solid set with consistent depth.",
+        }
+    },
+}
+
+
+def classify_prompt(payload: dict) -> str:
+    """Works out which pipeline stage a request came from by looking at its prompt text."""
+    text = json.dumps(payload.get("messages", [])).lower()
+    if "coach" in text:
+        return "coaching_feedback"
+    if "estimate the total weight" in text or "estimated_weight_kg" in text:
+        return "weight_estimation"
+    return "exercise_prediction"
+
+
+class FakeModelConfig:
+    """
+    Latency, rate-limit and streaming settings shared by all handler threads.
+
+    Args:
+        latency_ms (float): Base latency for every response (the median for "lognormal").
+        jitter_ms (float): Spread on top of the base latency: the uniform range for
+            "uniform", the mean of the exponential tail for "exponential".
+        slow_fraction (float): Fraction of requests that take `slow_ms` instead (tail latency).
+        slow_ms (float): Latency of the slow requests.
+        seed (int, optional): Seed for repeatable runs.
+        distribution (str): "uniform", "lognormal" or "exponential".
+        sigma (float): Shape of the lognormal distribution.
+        stage_latency_ms (dict, optional): Base latency per stage, overriding `latency_ms`.
+        rate_limit_fraction (float): Fraction of requests answered with a 429.
+        retry_after_sec (float): Retry-After sent with each 429.
+        stream_chunk_ms (float): Delay between streamed chunks.
+    """
+
+    def __init__(self, latency_ms=200, jitter_ms=50, slow_fraction=0.0, slow_ms=5000, seed=None,
+                 distribution="uniform", sigma=0.4, stage_latency_ms=None, rate_limit_fraction=0.0,
+                 retry_after_sec=1.0, stream_chunk_ms=20):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_fraction = slow_fraction
+        self.slow_ms = slow_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.stage_latency_ms = stage_latency_ms or {}
+        self.rate_limit_fraction = rate_limit_fraction
+        self.retry_after_sec = retry_after_sec
+        self.stream_chunk_ms = stream_chunk_ms
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.rate_limited = 0
+
+    def next_latency_sec(self, stage: str = None) -> float:
+        base = self.stage_latency_ms.get(stage, self.latency_ms)
+        with self.lock:
+            self.requests_served += 1
+            if self.random.random() < self.slow_fraction:
+                return self.slow_ms / 1000
+            if self.distribution == "lognormal":
+                return base * math.exp(self.random.gauss(0, self.sigma)) / 1000
+            if self.distribution == "exponential":
+                return (base + self.random.expovariate(1 / max(self.jitter_ms, 1e-3))) / 1000
+            return (base + self.random.uniform(0, self.jitter_ms)) / 1000
+
+    def should_rate_limit(self) -> bool:
+        with self.lock:
+            limited = self.random.random() < self.rate_limit_fraction
+            self.rate_limited += limited
+            return limited
+
+
+def load_replies(path: str):
+    """Merges a JSON file of {stage: reply} over the canned replies."""
+    with open(path) as f:
+        CANNED_REPLIES.update(json.load(f))
+
+
+def make_handler(config: FakeModelConfig):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, completion_id, model, content):
+            """Sends `content` as server-sent event chunks, ending with [DONE]."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def event(delta, finish_reason=None):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                write(f"data: {json.dumps(chunk)}\n\n")
+
+            def write(text):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            event({"role": "assistant", "content": ""})
+            for i in range(0, len(content), 16):
+                time.sleep(config.stream_chunk_ms / 1000)
+                event({"content": content[i:i + 16]})
+            event({}, finish_reason="stop")
+            write("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+
+            if config.should_rate_limit():
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}},
+                    headers={"Retry-After": f"{config.retry_after_sec:g}"},
+                )
+                return
+
+            stage = classify_prompt(payload)
+            time.sleep(config.next_latency_sec(stage))
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = payload.get("model", "gpt-4o")
+            content = json.dumps(CANNED_REPLIES[stage])
+            if payload.get("stream"):
+                self._send_stream(completion_id, model, content)
+                return
+
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+            })
+
+    return FakeOpenAIHandler
+
+
+def start_server(config: FakeModelConfig, host="127.0.0.1", port=0):
+    """Starts the fake server on a background thread and returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def parse_stage_latency(values):
+    """["coaching_feedback=4000", ...] -> {"coaching_feedback": 4000.0}"""
+    latencies = {}
+    for value in values or []:
+        stage, _, ms = value.partition("=")
+        latencies[stage] = float(ms)
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    parser.add_argument("--distribution", choices=["uniform", "lognormal", "exponential"], default="uniform")
+    parser.add_argument("--sigma", type=float, default=0.4)
+    parser.add_argument("--stage-latency", action="append", metavar="STAGE=MS", help="Base latency for one stage")
+    parser.add_argument("--rate-limit-fraction", type=float, default=0.0)
+    parser.add_argument("--retry-after-sec", type=float, default=1.0)
+    parser.add_argument("--stream-chunk-ms", type=float, default=20)
+    parser.add_argument("--replies", help="JSON file of {stage: reply} overriding the canned replies")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.replies:
+        load_replies(args.replies)
+    config = FakeModelConfig(
+        args.latency_ms, args.jitter_ms, args.slow_fraction, args.slow_ms, seed=args.seed,
+        distribution=args.distribution, sigma=args.sigma, stage_latency_ms=parse_stage_latency(args.stage_latency),
+        rate_limit_fraction=args.rate_limit_fraction, retry_after_sec=args.retry_after_sec,
+        stream_chunk_ms=args.stream_chunk_ms,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"🤖 Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,80 @@
+"""
+Measures hedged model calls against the fake OpenAI server with injected tail latency.
+
+Runs the same batch of exercise-prediction calls with hedging off and on and prints
+p50/p95/p99 latency, hedge counts and how many calls fell back after their deadline.
+
+Usage:
+    python -m backend.dev.hedging_harness --calls 200 --slow-fraction 0.1 --slow-ms 8000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from backend.dev.fake_openai_server import FakeModelConfig, start_server
+
+
+def run_batch(calls, hedge, deadline_sec, image_path):
+    from backend.ai.analyze import gpt_client
+    from backend.ai.analyze.deadline import RequestDeadline
+    from backend.ai.analyze.exercise_prediction import predict_exercise
+    from backend.utils import metrics
+
+    metrics.reset()
+    gpt_client.HEDGING_ENABLED = hedge
+
+    latencies = []
+    fallbacks = 0
+    for _ in range(calls):
+        deadline = RequestDeadline(deadline_sec, stages=["exercise_prediction"])
+        start = time.monotonic()
+        result = predict_exercise(image_path, deadline=deadline)
+        latencies.append(time.monotonic() - start)
+        if "error" in result:
+            fallbacks += 1
+
+    snapshot = metrics.snapshot()["counters"]
+    return {
+        "hedging": hedge,
+        "p50": np.percentile(latencies, 50),
+        "p95": np.percentile(latencies, 95),
+        "p99": np.percentile(latencies, 99),
+        "hedges": snapshot.get("gpt_hedges_total{stage=exercise_prediction}", 0),
+        "hedge_wins": snapshot.get("gpt_hedge_wins_total{stage=exercise_prediction}", 0),
+        "fallbacks": fallbacks,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hedged request latency harness")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--slow-ms", type=float, default=8000)
+    parser.add_argument("--deadline-sec", type=float, default=10)
+    parser.add_argument("--image", default="keyframe_collages/collage_full.jpg")
+    args = parser.parse_args()
+
+    config = FakeModelConfig(args.latency_ms, 50, args.slow_fraction, args.slow_ms, seed=7)
+    server, base_url = start_server(config)
+
+    # The shared client reads these at import time, so set them before importing the pipeline
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+    print(f"🤖 Fake model server at {base_url} "
+          f"({args.slow_fraction:.0%} of calls take {args.slow_ms:.0f}ms)")
+    for hedge in (False, True):
+        stats = run_batch(args.calls, hedge, args.deadline_sec, args.image)
+        print(
+            f"hedging={'on ' if stats['hedging'] else 'off'} "
+            f"p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s p99={stats['p99']:.2f}s "
+            f"hedges={stats['hedges']:.0f} wins={stats['hedge_wins']:.0f} fallbacks={stats['fallbacks']}"
+        )
+
+    server.shutdown()
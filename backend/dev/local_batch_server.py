@@ -0,0 +1,99 @@
+"""
+File-backed stand-in for the provider's batch API.
+
+Watches GYMVID_LOCAL_BATCH_DIR for batches written by LocalBatchBackend, runs each
+request in input.jsonl against a chat-completions endpoint (the real API, or the fake
+server via OPENAI_BASE_URL), and writes output.jsonl in the provider's format.
+
+Usage:
+    GYMVID_BATCH_BACKEND=local python -m backend.dev.local_batch_server --base-url http://127.0.0.1:8765/v1
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from openai import OpenAI
+
+sys.path.append(os.path.abspath("."))
+
+from backend.ai.analyze.batch_coaching import LOCAL_BATCH_DIR
+
+
+def read_status(batch_dir: str) -> dict:
+    try:
+        with open(os.path.join(batch_dir, "status.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_status(batch_dir: str, status: dict):
+    tmp = os.path.join(batch_dir, "status.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp, os.path.join(batch_dir, "status.json"))
+
+
+def process_batch(batch_dir: str, client: OpenAI):
+    """Runs one batch's requests in order and marks it completed."""
+    status = read_status(batch_dir)
+    write_status(batch_dir, {**status, "status": "in_progress"})
+
+    with open(os.path.join(batch_dir, "input.jsonl")) as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+
+    output = []
+    for request in requests:
+        line = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"], "response": None, "error": None}
+        try:
+            completion = client.chat.completions.create(**request["body"])
+            line["response"] = {"status_code": 200, "request_id": completion.id, "body": completion.model_dump()}
+        except Exception as e:
+            line["error"] = {"code": type(e).__name__, "message": str(e)}
+        output.append(line)
+
+    with open(os.path.join(batch_dir, "output.jsonl"), "w") as f:
+        f.writelines(json.dumps(line) + "\n" for line in output)
+    write_status(batch_dir, {**status, "status": "completed", "completed_at": time.time()})
+    return len(output)
+
+
+def pending_batches(root: str):
+    for name in sorted(os.listdir(root)):
+        if read_status(os.path.join(root, name)).get("status") == "validating":
+            yield os.path.join(root, name)
+
+
+def serve(root: str, client: OpenAI, interval_sec: float = 1.0, stop: threading.Event = None):
+    """Processes new batches until `stop` is set (or forever)."""
+    os.makedirs(root, exist_ok=True)
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        for batch_dir in pending_batches(root):
+            count = process_batch(batch_dir, client)
+            print(f"📦 Processed {os.path.basename(batch_dir)}: {count} request(s)")
+        stop.wait(interval_sec)
+
+
+def start_server(client: OpenAI, root: str = None, interval_sec: float = 0.2):
+    """Starts the batch server on a background thread and returns a stop event."""
+    stop = threading.Event()
+    thread = threading.Thread(target=serve, args=(root or LOCAL_BATCH_DIR, client, interval_sec, stop), daemon=True)
+    thread.start()
+    return stop
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local batch API stand-in")
+    parser.add_argument("--dir", default=LOCAL_BATCH_DIR)
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"))
+    parser.add_argument("--interval-sec", type=float, default=1.0)
+    args = parser.parse_args()
+
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", "local"), base_url=args.base_url)
+    print(f"🗂️ Local batch server watching {args.dir}")
+    serve(args.dir, client, args.interval_sec)
@@ -0,0 +1,64 @@
+"""
+Local S3-compatible stand-in (moto's server mode) for uploads, presigned URLs and ranged reads.
+
+The app talks to it through the same settings it uses for AWS, so set them before the
+backend is imported:
+
+    S3_ENDPOINT_URL=http://127.0.0.1:<port> S3_BUCKET_NAME=gymvid-local AWS_REGION=us-east-1
+
+Usage:
+    python -m backend.dev.local_s3 --port 9000 --bucket gymvid-local
+"""
+import argparse
+import os
+import time
+
+import boto3
+from botocore.config import Config
+
+DEFAULT_BUCKET = "gymvid-local"
+DEFAULT_REGION = "us-east-1"
+
+
+def start_local_s3(bucket: str = DEFAULT_BUCKET, port: int = 0):
+    """Starts the stand-in on a background thread, creates `bucket` and returns (server, endpoint_url)."""
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f"http://{host}:{port}"
+
+    client = boto3.client(
+        "s3", endpoint_url=endpoint, region_name=DEFAULT_REGION,
+        aws_access_key_id="local", aws_secret_access_key="local",
+        config=Config(s3={"addressing_style": "path"}),
+    )
+    client.create_bucket(Bucket=bucket)
+    return server, endpoint
+
+
+def use_local_s3(endpoint: str, bucket: str = DEFAULT_BUCKET):
+    """Points this process's S3 settings at the stand-in (call before importing the backend)."""
+    os.environ["S3_ENDPOINT_URL"] = endpoint
+    os.environ["S3_BUCKET_NAME"] = bucket
+    os.environ["AWS_REGION"] = DEFAULT_REGION
+    os.environ["AWS_ACCESS_KEY_ID"] = "local"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "local"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local S3-compatible server")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--bucket", default=DEFAULT_BUCKET)
+    args = parser.parse_args()
+
+    server, endpoint = start_local_s3(args.bucket, args.port)
+    print(f"🪣 Local S3 at {endpoint} with bucket {args.bucket}")
+    print(f"   export S3_ENDPOINT_URL={endpoint} S3_BUCKET_NAME={args.bucket} AWS_REGION={DEFAULT_REGION} "
+          f"AWS_ACCESS_KEY_ID=local AWS_SECRET_ACCESS_KEY=local")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
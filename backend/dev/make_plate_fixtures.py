@@ -0,0 +1,114 @@
+"""
+Generates a labelled fixture set for the plate-colour detector.
+
+Each fixture is a synthetic gym frame, either a front view with both sleeves edge-on or a side view
+with one plate face towards the camera. Scale, position, lighting, blur and noise are randomised.
+Frames are written next to a labels.jsonl in the same format used for hand-labelled
+real frames:
+
+    {"file": "0001.jpg", "equipment": "Barbell", "weight_kg": 140, "view": "front"}
+
+Usage:
+    python -m backend.dev.make_plate_fixtures --out fixtures/plates --count 200
+"""
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from backend.ai.analyze.plate_detector import PLATES, BAR_WEIGHT_KG
+
+# BGR colours as they look on typical bumper plates
+PLATE_BGR = {
+    "red": (40, 40, 200),
+    "blue": (190, 90, 30),
+    "yellow": (40, 200, 230),
+    "green": (60, 160, 40),
+    "white": (235, 235, 235),
+}
+
+
+def random_side_load(rng):
+    """Heaviest-first plate list for one sleeve, the way plates are actually loaded."""
+    colours = []
+    for colour in ["red", "blue", "yellow", "green", "white"]:
+        colours.extend([colour] * int(rng.integers(0, 3 if colour == "red" else 2)))
+    return colours or ["green"]
+
+
+def draw_front_view(rng, size=(1280, 720)):
+    # Landscape, so both sleeves fit in frame
+    width, height = size
+    frame = np.full((height, width, 3), rng.integers(60, 140), dtype=np.uint8)
+    plate_h = int(height * rng.uniform(0.18, 0.3))
+    bar_y = int(height * rng.uniform(0.35, 0.65))
+    centre_x = width // 2 + int(rng.integers(-40, 40))
+    grip_half = int(plate_h * rng.uniform(1.5, 1.8))
+
+    # Lifter and bar
+    cv2.rectangle(frame, (centre_x - plate_h // 2, bar_y - plate_h), (centre_x + plate_h // 2, height), (50, 45, 40), -1)
+    cv2.line(frame, (0, bar_y), (width, bar_y), (170, 170, 170), max(3, plate_h // 30))
+
+    side = random_side_load(rng)
+    for direction in (-1, 1):
+        x = centre_x + direction * grip_half
+        for colour in side:
+            spec = PLATES[colour]
+            thickness = int(round(plate_h * spec["thickness"]))
+            disc_h = plate_h if colour != "white" else int(plate_h * 0.55)
+            x0, x1 = (x, x + thickness) if direction > 0 else (x - thickness, x)
+            cv2.rectangle(frame, (x0, bar_y - disc_h // 2), (x1 - 1, bar_y + disc_h // 2), PLATE_BGR[colour], -1)
+            # Thin dark seam between discs, as on real plates
+            cv2.line(frame, (x1 if direction > 0 else x0, bar_y - disc_h // 2),
+                     (x1 if direction > 0 else x0, bar_y + disc_h // 2), (25, 25, 25), 1)
+            x = x1 + 1 if direction > 0 else x0 - 1
+
+    weight = BAR_WEIGHT_KG + 2 * sum(PLATES[c]["kg"] for c in side)
+    return frame, weight
+
+
+def draw_side_view(rng, size=(720, 1280)):
+    width, height = size
+    frame = np.full((height, width, 3), rng.integers(60, 140), dtype=np.uint8)
+    plate_h = int(height * rng.uniform(0.2, 0.35))
+    centre = (width // 2 + int(rng.integers(-80, 80)), int(height * rng.uniform(0.35, 0.65)))
+    side = random_side_load(rng)
+    cv2.circle(frame, centre, plate_h // 2, PLATE_BGR[side[-1] if side[-1] != "white" else side[0]], -1)
+    cv2.circle(frame, centre, plate_h // 12, (170, 170, 170), -1)
+    weight = BAR_WEIGHT_KG + 2 * sum(PLATES[c]["kg"] for c in side)
+    return frame, weight
+
+
+def degrade(rng, frame):
+    frame = cv2.convertScaleAbs(frame, alpha=rng.uniform(0.75, 1.15), beta=rng.uniform(-20, 20))
+    if rng.random() < 0.3:
+        k = int(rng.choice([3, 5, 7]))
+        frame = cv2.GaussianBlur(frame, (k, k), 0)
+    noise = rng.normal(0, rng.uniform(2, 8), frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic plate-detector fixtures")
+    parser.add_argument("--out", default="fixtures/plates")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--side-view-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "labels.jsonl"), "w") as labels:
+        for i in range(args.count):
+            view = "side" if rng.random() < args.side_view_fraction else "front"
+            frame, weight = (draw_side_view if view == "side" else draw_front_view)(rng)
+            filename = f"{i:04d}.jpg"
+            cv2.imwrite(os.path.join(args.out, filename), degrade(rng, frame), [cv2.IMWRITE_JPEG_QUALITY, 90])
+            labels.write(json.dumps({"file": filename, "equipment": "Barbell", "weight_kg": weight, "view": view}) + "\n")
+
+    print(f"✅ Wrote {args.count} fixtures to {args.out}")
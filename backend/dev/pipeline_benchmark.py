@@ -0,0 +1,215 @@
+"""
+End-to-end latency benchmark for the upload endpoints, run fully offline.
+
+Starts the fake OpenAI server and the FastAPI app in-process, then drives
+/analyze/log_set, /analyze/feedback_upload and /quick_exercise_prediction with
+synthetic lifting videos (or a real clip via --video). Reports client-side p50/p95/p99
+per endpoint and the per-stage summaries the pipeline records (stage_latency_sec,
+gpt_latency_sec, llm_queue_wait_sec, ...).
+
+Uploads go to the local S3 stand-in and the Supabase write is a no-op unless
+--live-storage is passed, so a run needs no credentials.
+
+Usage:
+    python -m backend.dev.pipeline_benchmark --requests 20 --concurrency 4
+    python -m backend.dev.pipeline_benchmark --distribution lognormal --latency-ms 800 \\
+        --stage-latency coaching_feedback=4000 --rate-limit-fraction 0.05 --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from backend.dev.fake_openai_server import FakeModelConfig, start_server, parse_stage_latency
+from backend.dev.local_s3 import start_local_s3, use_local_s3
+
+ENDPOINTS = {
+    "log_set": "/analyze/log_set",
+    "feedback_upload": "/analyze/feedback_upload",
+    "quick_exercise_prediction": "/quick_exercise_prediction",
+}
+
+# Metric series reported per stage, in this order
+STAGE_SERIES = [
+    "stage_latency_sec",
+    "gpt_latency_sec",
+    "llm_queue_wait_sec",
+    "quick_prediction_latency_sec",
+    "exercise_cascade_latency_sec",
+]
+
+
+def make_synthetic_video(path, reps=5, fps=30, rep_sec=2.0, size=(720, 1280), seed=0):
+    """
+    Writes a portrait clip of a loaded bar moving through `reps` squat-like reps.
+
+    The figure is simple shapes, so pose detection may or may not lock on; the
+    pipeline's fallbacks (static collage, model prediction) get exercised either way.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    frames = int(reps * rep_sec * fps) + fps
+    top, bottom = int(height * 0.3), int(height * 0.55)
+    background = np.full((height, width, 3), 90, dtype=np.uint8)
+    cv2.rectangle(background, (0, int(height * 0.85)), (width, height), (60, 60, 60), -1)
+
+    for i in range(frames):
+        phase = (i / fps) / rep_sec * 2 * np.pi
+        bar_y = int(top + (bottom - top) * (1 - np.cos(phase)) / 2) if i < frames - fps else top
+        frame = background.copy()
+        cx = width // 2
+        cv2.circle(frame, (cx, bar_y - 60), 40, (150, 170, 200), -1)                               # head
+        cv2.rectangle(frame, (cx - 60, bar_y - 20), (cx + 60, bar_y + 180), (70, 60, 50), -1)      # torso
+        cv2.line(frame, (cx - 40, bar_y + 180), (cx - 60, int(height * 0.85)), (60, 50, 40), 30)   # legs
+        cv2.line(frame, (cx + 40, bar_y + 180), (cx + 60, int(height * 0.85)), (60, 50, 40), 30)
+        cv2.line(frame, (40, bar_y), (width - 40, bar_y), (170, 170, 170), 8)                      # bar
+        for x in (90, width - 120):
+            cv2.rectangle(frame, (x, bar_y - 110), (x + 30, bar_y + 110), (40, 40, 200), -1)       # red plates
+        noise = rng.normal(0, 3, frame.shape)
+        writer.write(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    writer.release()
+    return path
+
+
+def skip_database_writes():
+    """Turns the Supabase insert after /analyze/log_set into a no-op."""
+    import main
+    main.save_set_to_supabase = lambda result: None
+
+
+def start_app():
+    """Serves the FastAPI app on a free port in a background thread and returns its base URL."""
+    import uvicorn
+    import main
+
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+def send(client, endpoint, video_path, index):
+    with open(video_path, "rb") as f:
+        files = {"video": (f"bench_{endpoint}_{index}.mp4", f.read(), "video/mp4")}
+    data = {}
+    if endpoint == "feedback_upload":
+        data = {"user_id": f"bench{index}", "movement": "Barbell Back Squat"}
+
+    start = time.monotonic()
+    response = client.post(ENDPOINTS[endpoint], files=files, data=data)
+    latency = time.monotonic() - start
+    ok = response.status_code == 200 and response.json().get("success", True) is not False
+    return latency, ok
+
+
+def run_endpoint(base_url, endpoint, videos, requests, concurrency):
+    import httpx
+
+    with httpx.Client(base_url=base_url, timeout=300) as client, ThreadPoolExecutor(concurrency) as pool:
+        futures = [pool.submit(send, client, endpoint, videos[i % len(videos)], i) for i in range(requests)]
+        results = [future.result() for future in futures]
+    latencies = [latency for latency, _ in results]
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "p99": float(np.percentile(latencies, 99)),
+    }
+
+
+def stage_summaries(snapshot):
+    rows = {}
+    for series in STAGE_SERIES:
+        for key, summary in sorted(snapshot["summaries"].items()):
+            if key == series or key.startswith(series + "{"):
+                rows[key] = summary
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end latency benchmark")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=20, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--video", action="append", help="Real clip(s) to upload instead of synthetic ones")
+    parser.add_argument("--synthetic-videos", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=600)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--distribution", choices=["uniform", "lognormal", "exponential"], default="lognormal")
+    parser.add_argument("--sigma", type=float, default=0.4)
+    parser.add_argument("--slow-fraction", type=float, default=0.02)
+    parser.add_argument("--slow-ms", type=float, default=8000)
+    parser.add_argument("--stage-latency", action="append", metavar="STAGE=MS")
+    parser.add_argument("--rate-limit-fraction", type=float, default=0.0)
+    parser.add_argument("--live-storage", action="store_true", help="Really upload to S3 and save to Supabase")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fake_config = FakeModelConfig(
+        args.latency_ms, args.jitter_ms, args.slow_fraction, args.slow_ms, seed=args.seed,
+        distribution=args.distribution, sigma=args.sigma, stage_latency_ms=parse_stage_latency(args.stage_latency),
+        rate_limit_fraction=args.rate_limit_fraction,
+    )
+    fake_server, fake_url = start_server(fake_config)
+
+    # The shared client reads these at import time, so set them before importing the app
+    os.environ["OPENAI_BASE_URL"] = fake_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+    work_dir = tempfile.mkdtemp(prefix="gymvid_bench_")
+    videos = args.video or [
+        make_synthetic_video(os.path.join(work_dir, f"synthetic_{i}.mp4"), reps=3 + i, seed=args.seed + i)
+        for i in range(args.synthetic_videos)
+    ]
+    s3_server = None
+    if not args.live_storage:
+        # S3 settings are read at import time too
+        s3_server, s3_endpoint = start_local_s3()
+        use_local_s3(s3_endpoint)
+        skip_database_writes()
+
+    from backend.utils import metrics
+
+    app_server, base_url = start_app()
+    print(f"🤖 Fake model server at {fake_url} ({args.distribution}, base {args.latency_ms:.0f}ms)")
+    print(f"🚀 App at {base_url}, {args.requests} request(s) per endpoint, concurrency {args.concurrency}")
+
+    results = {"config": vars(args), "endpoints": {}, "stages": {}}
+    for endpoint in args.endpoints:
+        metrics.reset()
+        stats = run_endpoint(base_url, endpoint, videos, args.requests, args.concurrency)
+        results["endpoints"][endpoint] = stats
+        results["stages"][endpoint] = stage_summaries(metrics.snapshot())
+
+        print(f"\n📍 {ENDPOINTS[endpoint]}: p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s "
+              f"p99={stats['p99']:.2f}s errors={stats['errors']}/{stats['requests']}")
+        for key, summary in results["stages"][endpoint].items():
+            print(f"   {key:<60} n={summary['count']:<4} p50={summary['p50']:.3f}s "
+                  f"p95={summary['p95']:.3f}s p99={summary['p99']:.3f}s")
+
+    print(f"\n🚦 Fake server: {fake_config.requests_served} call(s), {fake_config.rate_limited} injected 429(s)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Wrote {args.json}")
+
+    app_server.should_exit = True
+    fake_server.shutdown()
+    if s3_server:
+        s3_server.stop()
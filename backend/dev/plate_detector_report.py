@@ -0,0 +1,103 @@
+"""
+Measures the plate-colour detector's accuracy and latency on a labelled fixture set.
+
+The fixture directory holds JPEG frames and a labels.jsonl with one
+{"file", "equipment", "weight_kg"} row per frame (see make_plate_fixtures for synthetic
+ones; real frames can be labelled in the same format). For each confidence threshold the
+report shows how many frames would skip GPT and how accurate the detector was on those.
+
+Usage:
+    python -m backend.dev.plate_detector_report --fixtures fixtures/plates --report plate_report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from backend.ai.analyze.plate_detector import estimate_weight_from_plates, PLATE_CONFIDENCE_THRESHOLD
+
+THRESHOLDS = [50, 60, 70, 80, 90]
+
+
+def run(fixtures_dir):
+    rows = []
+    with open(os.path.join(fixtures_dir, "labels.jsonl")) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            label = json.loads(line)
+            frame = cv2.imread(os.path.join(fixtures_dir, label["file"]))
+            start = time.perf_counter()
+            result = estimate_weight_from_plates([frame]) or {}
+            latency_ms = (time.perf_counter() - start) * 1000
+            rows.append({
+                "file": label["file"],
+                "view": label.get("view"),
+                "expected_kg": label["weight_kg"],
+                "predicted_kg": result.get("estimated_weight_kg"),
+                "confidence": result.get("confidence", 0),
+                "latency_ms": latency_ms,
+            })
+    return rows
+
+
+def summarise(rows):
+    exact = np.array([r["predicted_kg"] == r["expected_kg"] for r in rows])
+    confidence = np.array([r["confidence"] for r in rows])
+    latencies = [r["latency_ms"] for r in rows]
+
+    by_threshold = []
+    for threshold in THRESHOLDS:
+        answered = confidence >= threshold
+        by_threshold.append({
+            "threshold": threshold,
+            "coverage": round(float(answered.mean()), 3),
+            "accuracy_when_answered": round(float(exact[answered].mean()), 3) if answered.any() else None,
+        })
+
+    by_view = {}
+    for view in sorted({r["view"] for r in rows if r["view"]}):
+        mask = np.array([r["view"] == view for r in rows])
+        by_view[view] = {"count": int(mask.sum()), "accuracy": round(float(exact[mask].mean()), 3)}
+
+    return {
+        "samples": len(rows),
+        "overall_accuracy": round(float(exact.mean()), 3),
+        "by_threshold": by_threshold,
+        "by_view": by_view,
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 2),
+            "p95": round(float(np.percentile(latencies, 95)), 2),
+            "max": round(float(np.max(latencies)), 2),
+        },
+        "misses": [r for r in rows if r["confidence"] >= PLATE_CONFIDENCE_THRESHOLD and r["predicted_kg"] != r["expected_kg"]][:20],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plate detector accuracy/latency report")
+    parser.add_argument("--fixtures", required=True, help="Directory with frames and labels.jsonl")
+    parser.add_argument("--report", default=None, help="Optional path for the JSON report")
+    args = parser.parse_args()
+
+    report = summarise(run(args.fixtures))
+    print(f"🎯 Exact-load accuracy on {report['samples']} frames: {report['overall_accuracy']:.1%}")
+    print(f"⏱️ Latency per frame: {report['latency_ms']['p50']}ms p50, {report['latency_ms']['p95']}ms p95")
+    for row in report["by_threshold"]:
+        accuracy = row["accuracy_when_answered"]
+        print(f"   threshold {row['threshold']:>3}: skips GPT on {row['coverage']:.0%} of frames, "
+              f"accuracy {accuracy:.1%}" if accuracy is not None else
+              f"   threshold {row['threshold']:>3}: answers no frames")
+    for view, stats in report["by_view"].items():
+        print(f"   {view} view: {stats['accuracy']:.1%} of {stats['count']}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.report}")
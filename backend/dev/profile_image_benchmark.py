@@ -0,0 +1,73 @@
+"""
+Measures the profile image pipeline (decode + EXIF fix, resize/encode of every variant,
+parallel upload) per upload, against the local S3 stand-in.
+
+The test image is a ~3MB phone-style JPEG with an EXIF rotation tag. Each round uses
+fresh pixels so content-addressed dedupe doesn't skip the uploads.
+
+Usage:
+    python -m backend.dev.profile_image_benchmark --rounds 10 --rtt-ms 40
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath("."))
+
+from backend.dev.local_s3 import start_local_s3, use_local_s3
+
+
+def make_phone_photo(rng, width=4032, height=3024, quality=85) -> bytes:
+    """A photo-sized JPEG tagged as rotated 90 degrees (EXIF orientation 6), like an iPhone portrait shot."""
+    base = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+    image = Image.fromarray(base).resize((width, height), Image.Resampling.BILINEAR)
+    noise = rng.integers(0, 24, (height, width, 3), dtype=np.uint8)
+    image = Image.fromarray(np.asarray(image, dtype=np.uint8) + noise)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile image pipeline benchmark")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--rtt-ms", type=float, default=40, help="Delay injected before every S3 request")
+    parser.add_argument("--bucket", default="gymvid-local")
+    args = parser.parse_args()
+
+    server, endpoint = start_local_s3(args.bucket)
+    use_local_s3(endpoint, args.bucket)
+
+    from backend.utils import s3_uploads
+    from backend.utils.profile_images import process_profile_image, render_variant, decode, square_crop, PROFILE_IMAGE_SIZES
+
+    if args.rtt_ms:
+        s3_uploads.get_client().meta.events.register("before-send.s3.*", lambda **kwargs: time.sleep(args.rtt_ms / 1000))
+
+    rng = np.random.default_rng(11)
+    timings = {"decode": [], "resize": [], "upload": [], "total": []}
+    for round_number in range(args.rounds):
+        content = make_phone_photo(rng)
+        start = time.monotonic()
+        processed = process_profile_image(content, f"bench-{round_number}")
+        timings["total"].append(time.monotonic() - start)
+        for stage, seconds in processed["timings"].items():
+            timings[stage].append(seconds)
+
+    image = decode(content)
+    print(f"🖼️ {len(content) / 1024 / 1024:.1f}MB {image.width}x{image.height} upload (after EXIF rotation), "
+          f"{args.rounds} rounds, {args.rtt_ms:.0f}ms injected per S3 request")
+    for stage, values in timings.items():
+        print(f"   {stage:<7} p50={np.percentile(values, 50) * 1000:.0f}ms p95={np.percentile(values, 95) * 1000:.0f}ms")
+    print(f"   original  {len(content) / 1024:.0f}KB")
+    image = square_crop(image, max(PROFILE_IMAGE_SIZES))
+    for size in PROFILE_IMAGE_SIZES:
+        sizes = {fmt: len(render_variant(image, size, fmt)) / 1024 for fmt in ("webp", "jpeg")}
+        print(f"   {size:>4}px   webp {sizes['webp']:.1f}KB, jpeg {sizes['jpeg']:.1f}KB")
@@ -0,0 +1,125 @@
+"""
+Trains the pose-trajectory exercise classifier from logged sets and writes an evaluation report.
+
+Logged sets come from analyze_set when GYMVID_POSE_DATASET_PATH is set: one JSON row per
+set with its trajectory features and the label GPT gave it. Evaluation is leave-one-out,
+so the agreement figures show how often the classifier would have matched GPT on sets it
+had never seen, and how many sets would have skipped GPT at each confidence threshold.
+
+Usage:
+    python -m backend.dev.train_pose_classifier --dataset data/pose_sets.jsonl \\
+        --out backend/ai/models/pose_knn.npz --report pose_report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from backend.ai.analyze.pose_classifier import (
+    FEATURE_VERSION,
+    LABEL_FIELDS,
+    fit_knn,
+    predict_features,
+    save_model,
+)
+
+THRESHOLDS = [50, 60, 70, 80, 85, 90, 95]
+
+
+def load_dataset(path, min_label_confidence):
+    features, labels, label_info = [], [], {}
+    skipped = 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            label = row.get("label") or {}
+            if (row.get("feature_version") != FEATURE_VERSION
+                    or not label.get("movement")
+                    or (row.get("label_confidence") or 0) < min_label_confidence):
+                skipped += 1
+                continue
+            features.append([np.nan if v is None else v for v in row["features"]])
+            labels.append(label["movement"])
+            label_info.setdefault(label["movement"], {field: label.get(field) for field in LABEL_FIELDS})
+    return np.array(features, dtype=float), labels, label_info, skipped
+
+
+def evaluate(model, features, labels):
+    """Leave-one-out agreement with the GPT labels, plus per-prediction latency."""
+    predictions = []
+    latencies = []
+    for i in range(len(features)):
+        start = time.perf_counter()
+        prediction = predict_features(model, features[i], exclude_index=i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(prediction)
+
+    agree = np.array([p["movement"] == label for p, label in zip(predictions, labels)])
+    confidence = np.array([p["confidence"] for p in predictions])
+
+    by_threshold = []
+    for threshold in THRESHOLDS:
+        answered = confidence >= threshold
+        by_threshold.append({
+            "threshold": threshold,
+            "coverage": round(float(answered.mean()), 3),
+            "agreement_when_answered": round(float(agree[answered].mean()), 3) if answered.any() else None,
+        })
+
+    per_movement = {}
+    for movement in sorted(set(labels)):
+        mask = np.array([label == movement for label in labels])
+        per_movement[movement] = {"count": int(mask.sum()), "agreement": round(float(agree[mask].mean()), 3)}
+
+    return {
+        "samples": len(labels),
+        "overall_agreement": round(float(agree.mean()), 3),
+        "by_threshold": by_threshold,
+        "per_movement": per_movement,
+        "latency_ms": {
+            "mean": round(float(np.mean(latencies)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the pose-trajectory exercise classifier")
+    parser.add_argument("--dataset", required=True, help="JSONL written via GYMVID_POSE_DATASET_PATH")
+    parser.add_argument("--out", default="backend/ai/models/pose_knn.npz")
+    parser.add_argument("--report", default=None, help="Optional path for the JSON evaluation report")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-label-confidence", type=float, default=70,
+                        help="Ignore sets GPT itself was unsure about")
+    args = parser.parse_args()
+
+    features, labels, label_info, skipped = load_dataset(args.dataset, args.min_label_confidence)
+    if len(labels) < 2:
+        raise SystemExit(f"Not enough usable samples in {args.dataset} ({len(labels)} usable, {skipped} skipped)")
+
+    print(f"📚 Training on {len(labels)} sets ({len(label_info)} movements, {skipped} rows skipped)")
+    model = fit_knn(features, labels, label_info, k=args.k)
+    save_model(model, args.out)
+    print(f"✅ Saved model to {args.out}")
+
+    report = evaluate(model, features, labels)
+    print(f"🎯 Leave-one-out agreement with GPT: {report['overall_agreement']:.1%}")
+    print(f"⏱️ Latency per prediction: {report['latency_ms']['mean']:.2f}ms mean, "
+          f"{report['latency_ms']['p95']:.2f}ms p95")
+    for row in report["by_threshold"]:
+        agreement = row["agreement_when_answered"]
+        print(f"   threshold {row['threshold']:>3}: answers {row['coverage']:.0%} of sets, "
+              f"agreement {agreement:.1%}" if agreement is not None else
+              f"   threshold {row['threshold']:>3}: answers no sets")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.report}")
@@ -0,0 +1,82 @@
+"""
+Compares sequential and parallel S3 uploads against the local S3 stand-in.
+
+A per-request delay can be injected into every S3 call to mimic the round trip to a
+real region, since localhost uploads hide the cost of doing them one at a time.
+
+Usage:
+    python -m backend.dev.upload_benchmark --collages 6 --rtt-ms 80 --video-mb 64
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath("."))
+
+from backend.dev.local_s3 import start_local_s3, use_local_s3
+
+
+def make_collage_bytes(rng, size_kb):
+    return rng.integers(0, 256, size_kb * 1024, dtype=np.uint8).tobytes()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="S3 upload benchmark")
+    parser.add_argument("--collages", type=int, default=6)
+    parser.add_argument("--collage-kb", type=int, default=150)
+    parser.add_argument("--video-mb", type=int, default=0, help="Also upload a video of this size")
+    parser.add_argument("--rtt-ms", type=float, default=80, help="Delay injected before every S3 request")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--endpoint", help="Use an already running S3-compatible server instead")
+    parser.add_argument("--bucket", default="gymvid-local")
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if not endpoint:
+        server, endpoint = start_local_s3(args.bucket)
+    use_local_s3(endpoint, args.bucket)
+
+    from backend.utils import metrics, s3_uploads
+    from backend.utils.s3_uploads import UploadItem, upload_many, upload_one
+
+    if args.rtt_ms:
+        s3_uploads.get_client().meta.events.register("before-send.s3.*", lambda **kwargs: time.sleep(args.rtt_ms / 1000))
+
+    rng = np.random.default_rng(7)
+    items = [UploadItem(f"bench/collage_{i}.jpg", data=make_collage_bytes(rng, args.collage_kb)) for i in range(args.collages)]
+
+    timings = {"sequential": [], "parallel": []}
+    for _ in range(args.rounds):
+        start = time.monotonic()
+        sequential = [upload_one(item) for item in items]
+        timings["sequential"].append(time.monotonic() - start)
+
+        start = time.monotonic()
+        parallel = upload_many(items)
+        timings["parallel"].append(time.monotonic() - start)
+        assert all(r.ok for r in sequential + parallel), [r.error for r in sequential + parallel if not r.ok]
+
+    print(f"🪣 {args.collages} x {args.collage_kb}KB collages, {args.rtt_ms:.0f}ms injected per request")
+    for mode, values in timings.items():
+        print(f"   {mode:<10} median={np.median(values):.3f}s max={max(values):.3f}s")
+
+    if args.video_mb:
+        path = os.path.join(tempfile.mkdtemp(), "bench_video.mp4")
+        with open(path, "wb") as f:
+            f.write(os.urandom(args.video_mb * 1024 * 1024))
+        result = upload_one(UploadItem("bench/video.mp4", path=path, content_type="video/mp4"))
+        print(f"🎞️ {args.video_mb}MB video: {result.seconds:.2f}s ({'ok' if result.ok else result.error})")
+        os.remove(path)
+
+    summaries = metrics.snapshot()["summaries"]
+    for key in sorted(summaries):
+        if key.startswith("s3_"):
+            print(f"   {key:<40} p50={summaries[key]['p50']:.3f}s p95={summaries[key]['p95']:.3f}s n={summaries[key]['count']}")
+
+    if server:
+        server.stop()
@@ -1,20 +1,13 @@
-import boto3
 import os
 import subprocess
 from botocore.exceptions import BotoCoreError, ClientError
 import logging
 
-# Load environment variables
-AWS_REGION = os.getenv("AWS_REGION")
-S3_BUCKET = os.getenv("S3_BUCKET_NAME")
+from backend.utils.s3_uploads import AWS_REGION, S3_BUCKET, VIDEO_TRANSFER_CONFIG, get_client, object_url
+from backend.utils.s3_direct import download_ranged
 
-# Initialize S3 client
-s3 = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-)
+# Shared, pooled S3 client (see s3_uploads)
+s3 = get_client()
 
 def upload_file_to_s3(local_path, s3_key):
     """
@@ -38,11 +31,12 @@ def upload_file_to_s3(local_path, s3_key):
         s3.upload_file(
             Filename=local_path,
             Bucket=S3_BUCKET,
-            Key=s3_key
+            Key=s3_key,
+            Config=VIDEO_TRANSFER_CONFIG
         )
         
         # Return the S3 URL
-        s3_url = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+        s3_url = object_url(s3_key)
         logger.info(f"✅ Successfully uploaded to {s3_url}")
         print(f"✅ Uploaded to {s3_url}")
         return s3_url
@@ -57,15 +51,43 @@ def upload_file_to_s3(local_path, s3_key):
         print(f"❌ {error_msg}")
         raise Exception(error_msg)
 
+def upload_bytes_to_s3(data, s3_key, content_type="image/jpeg"):
+    """
+    Uploads an in-memory payload (e.g. an encoded collage) to S3 and returns the URL.
+    """
+    logger = logging.getLogger(__name__)
+
+    try:
+        if not S3_BUCKET:
+            raise ValueError("S3_BUCKET_NAME environment variable not set")
+        if not AWS_REGION:
+            raise ValueError("AWS_REGION environment variable not set")
+
+        logger.info(f"🔄 Uploading {len(data)} bytes to s3://{S3_BUCKET}/{s3_key}")
+        s3.put_object(Bucket=S3_BUCKET, Key=s3_key, Body=data, ContentType=content_type)
+
+        s3_url = object_url(s3_key)
+        logger.info(f"✅ Successfully uploaded to {s3_url}")
+        return s3_url
+    except (BotoCoreError, ClientError) as e:
+        error_msg = f"S3 Upload failed (AWS Error): {e}"
+        logger.error(f"❌ {error_msg}")
+        raise Exception(error_msg)
+    except Exception as e:
+        error_msg = f"Unexpected error during S3 upload: {e}"
+        logger.error(f"❌ {error_msg}")
+        raise Exception(error_msg)
+
 def download_file_from_s3(s3_key, local_path):
     """
     Downloads a file from S3 to a local path.
     """
     try:
-        s3.download_file(S3_BUCKET, s3_key, local_path)
+        # Parallel ranged GETs over the shared pool, written straight to their offsets
+        download_ranged(s3_key, local_path)
         print(f"✅ Downloaded from s3://{S3_BUCKET}/{s3_key}")
         return True
-    except (BotoCoreError, ClientError) as e:
+    except (BotoCoreError, ClientError, IOError) as e:
         print(f"❌ Download failed: {e}")
         return False
 
@@ -106,7 +128,7 @@ def upload_fileobj_to_s3(file_obj, s3_key, content_type="image/jpeg", public=Tru
             }
         )
         print(f"✅ Upload successful: s3://{S3_BUCKET}/{s3_key}")
-        return f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+        return object_url(s3_key)
     except (BotoCoreError, ClientError) as e:
         print(f"❌ Upload failed: {e}")
         return None
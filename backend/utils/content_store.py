@@ -0,0 +1,154 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import tempfile
+from contextlib import closing
+
+from backend.utils import metrics
+from backend.utils.s3_uploads import UploadItem, UploadResult, upload_many, object_url, object_exists
+from backend.utils.upload_queue import enqueue_upload
+
+logger = logging.getLogger(__name__)
+
+# ✅ Stored media is keyed by its SHA-256, so identical content is uploaded once and never overwritten.
+# The index maps the names the app used to store things under (e.g. collages/<user>/collage_full.jpg)
+# to the content they currently point at.
+CONTENT_INDEX_DIR = os.getenv("GYMVID_CONTENT_INDEX_DIR", os.path.join(tempfile.gettempdir(), "gymvid_content_index"))
+CONTENT_INDEX_DB = os.path.join(CONTENT_INDEX_DIR, "index.sqlite")
+
+_HASH_READ_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_index (
+    name TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    s3_key TEXT NOT NULL,
+    content_type TEXT,
+    size INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS content_index_sha256 ON content_index (sha256);
+"""
+
+
+def _connect():
+    os.makedirs(CONTENT_INDEX_DIR, exist_ok=True)
+    conn = sqlite3.connect(CONTENT_INDEX_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_key(area: str, sha256: str, ext: str) -> str:
+    """Key for content in an area of the bucket, e.g. collages/3f/3fa1...c9.jpg."""
+    ext = ext if ext.startswith(".") or not ext else f".{ext}"
+    return f"{area.rstrip('/')}/{sha256[:2]}/{sha256}{ext.lower()}"
+
+
+class ContentItem(UploadItem):
+    """
+    An immutable, content-addressed upload of what used to be stored at `name`.
+
+    Args:
+        name (str): Logical name (the old fixed key); recorded in the index once uploaded.
+        area (str): Bucket prefix the content goes under, e.g. "collages".
+        data (bytes, optional): In-memory payload.
+        path (str, optional): Local file.
+        sha256 (str, optional): Digest if already known (e.g. from the upload sink), to skip rehashing.
+        content_type (str): Content-Type stored with the object.
+    """
+
+    def __init__(self, name: str, area: str, data: bytes = None, path: str = None, sha256: str = None,
+                 content_type: str = "image/jpeg"):
+        if sha256 is None:
+            sha256 = hashlib.sha256(data).hexdigest() if data is not None else file_sha256(path)
+        super().__init__(content_key(area, sha256, os.path.splitext(name)[-1]), data=data, path=path,
+                         content_type=content_type, immutable=True)
+        self.name = name
+        self.sha256 = sha256
+
+
+def record(name: str, s3_key: str, sha256: str, content_type: str = None, size: int = None):
+    """Points a logical name at a content-addressed object."""
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO content_index (name, sha256, s3_key, content_type, size, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, sha256, s3_key, content_type, size, time.time()),
+        )
+
+
+def resolve(name: str):
+    """What a logical name currently points at, or None if it was never stored this way."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM content_index WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "name": row["name"],
+        "sha256": row["sha256"],
+        "s3_key": row["s3_key"],
+        "url": object_url(row["s3_key"]),
+        "content_type": row["content_type"],
+        "size": row["size"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def upload_content(items: list) -> list:
+    """
+    Uploads content items in parallel (skipping any already in the bucket) and indexes
+    the ones that made it.
+
+    Returns:
+        list: UploadResult per item, in the same order.
+    """
+    # Identical items in one batch (e.g. two identical collages) are sent once
+    unique = list({item.s3_key: item for item in items}.values())
+    by_key = {result.item.s3_key: result for result in upload_many(unique)}
+    results = []
+    for item in items:
+        sent = by_key[item.s3_key]
+        result = UploadResult(item, url=sent.url, error=sent.error, seconds=sent.seconds, attempts=sent.attempts,
+                              skipped=sent.skipped or sent.item is not item)
+        if result.ok:
+            record(item.name, item.s3_key, item.sha256, item.content_type, item.size_bytes)
+        results.append(result)
+    skipped = sum(1 for result in results if result.skipped)
+    if skipped:
+        metrics.increment("content_dedupe_hits_total", skipped)
+        logger.info(f"♻️ {skipped} of {len(results)} object(s) were already stored")
+    return results
+
+
+def enqueue_content(path: str, name: str, area: str, sha256: str = None, content_type: str = "application/octet-stream") -> dict:
+    """
+    Write-behind version of upload_content for one file: takes ownership of `path`, indexes
+    it under `name` and uploads it in the background, unless the bucket already has it.
+
+    Returns:
+        dict: {"s3_key", "url", "sha256", "deduplicated"}; the URL is final straight away.
+    """
+    item = ContentItem(name, area, path=path, sha256=sha256, content_type=content_type)
+    size = item.size_bytes
+    deduplicated = object_exists(item.s3_key)
+    if deduplicated:
+        os.remove(path)
+        metrics.increment("content_dedupe_hits_total")
+        logger.info(f"♻️ {name} is already stored as {item.s3_key}")
+        url = object_url(item.s3_key)
+    else:
+        url = enqueue_upload(path, item.s3_key, content_type=content_type, immutable=True)
+    record(name, item.s3_key, item.sha256, content_type, size)
+    return {"s3_key": item.s3_key, "url": url, "sha256": item.sha256, "deduplicated": deduplicated}
@@ -1,16 +1,10 @@
-import os
-import requests
+from backend.utils.http_downloads import download_url
 
-def download_video_from_url(url):
-    os.makedirs("temp_uploads", exist_ok=True)
-    local_path = f"temp_uploads/{os.path.basename(url)}"
-
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        with open(local_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"✅ Video downloaded: {local_path}")
-        return local_path
-    else:
-        raise Exception(f"❌ Failed to download video: {response.status_code}")
+def download_video_from_url(url, dest_path=None):
+    """
+    Downloads a video to a unique path under temp_uploads (parallel byte ranges when the
+    server supports them). The caller owns the returned file and should remove it when done.
+    """
+    local_path = download_url(url, dest_path)
+    print(f"✅ Video downloaded: {local_path}")
+    return local_path
@@ -0,0 +1,178 @@
+import os
+import re
+import time
+import uuid
+import random
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.utils import metrics
+from backend.utils.upload_sink import MAX_VIDEO_UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+# ✅ One pooled session for every video download (keep-alive, no per-request TLS handshake)
+DOWNLOAD_POOL_SIZE = int(os.getenv("GYMVID_DOWNLOAD_POOL_SIZE", "32"))
+DOWNLOAD_WORKERS = int(os.getenv("GYMVID_DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_TIMEOUT = (5, 60)
+
+# Files smaller than this, or servers without range support, are fetched as one stream
+RANGED_THRESHOLD = int(os.getenv("GYMVID_RANGED_DOWNLOAD_THRESHOLD", str(8 * 1024 * 1024)))
+RANGE_PART_SIZE = 8 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+RANGE_ATTEMPTS = 3
+
+# Same cap as uploaded videos; checked against Content-Length before any disk is reserved, and while streaming
+MAX_DOWNLOAD_BYTES = int(os.getenv("GYMVID_MAX_DOWNLOAD_BYTES", str(MAX_VIDEO_UPLOAD_BYTES)))
+
+DOWNLOAD_DIR = "temp_uploads"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """The process-wide download session; its connection pool is shared by all range workers."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_POOL_SIZE, pool_maxsize=DOWNLOAD_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def unique_download_path(url: str, directory: str = DOWNLOAD_DIR) -> str:
+    """A per-request path that keeps the URL's file name (and extension) but never collides."""
+    name = os.path.basename(urlparse(url).path) or "video.mp4"
+    name = re.sub(r"[^A-Za-z0-9._-]", "_", name)[-100:]
+    return os.path.join(directory, f"{uuid.uuid4().hex}_{name}")
+
+
+def probe(url: str) -> dict:
+    """
+    HEADs the URL for its size and range support.
+
+    Returns:
+        dict: {"size": int or None, "ranges": bool}
+    """
+    try:
+        response = get_session().head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+        if response.status_code >= 400:
+            return {"size": None, "ranges": False}
+        length = response.headers.get("Content-Length")
+        return {
+            "size": int(length) if length and length.isdigit() else None,
+            "ranges": response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        }
+    except requests.RequestException:
+        return {"size": None, "ranges": False}
+
+
+def _fetch_stream(url: str, dest_path: str) -> int:
+    with get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code != 200:
+            raise Exception(f"❌ Failed to download video: {response.status_code}")
+        size = 0
+        with open(dest_path, "wb", buffering=READ_SIZE) as f:
+            for chunk in response.iter_content(chunk_size=READ_SIZE):
+                size += len(chunk)
+                if size > MAX_DOWNLOAD_BYTES:
+                    raise ValueError(f"Video is larger than {MAX_DOWNLOAD_BYTES // (1024 * 1024)}MB")
+                f.write(chunk)
+    return size
+
+
+def _fetch_range(url: str, fd: int, start: int, end: int):
+    for attempt in range(1, RANGE_ATTEMPTS + 1):
+        offset = start
+        try:
+            headers = {"Range": f"bytes={start}-{end}"}
+            with get_session().get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code != 206:
+                    raise IOError(f"Range request for bytes {start}-{end} returned {response.status_code}")
+                for chunk in response.iter_content(chunk_size=READ_SIZE):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+            if offset != end + 1:
+                raise IOError(f"Short read for bytes {start}-{end}: got {offset - start} bytes")
+            return
+        except (IOError, requests.RequestException) as e:
+            if attempt == RANGE_ATTEMPTS:
+                raise
+            delay = 0.25 * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
+            logger.warning(f"⚠️ Range {start}-{end} failed (attempt {attempt}), retrying in {delay:.2f}s: {e}")
+            time.sleep(delay)
+
+
+def _fetch_ranged(url: str, dest_path: str, size: int) -> int:
+    if size > MAX_DOWNLOAD_BYTES:
+        raise ValueError(f"Video is larger than {MAX_DOWNLOAD_BYTES // (1024 * 1024)}MB")
+    ranges = [(start, min(start + RANGE_PART_SIZE, size) - 1) for start in range(0, size, RANGE_PART_SIZE)]
+    fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # Reserve the whole file up front so parts can land at their offsets in any order
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(ranges))) as pool:
+            for future in [pool.submit(_fetch_range, url, fd, start, end) for start, end in ranges]:
+                future.result()
+    finally:
+        os.close(fd)
+    return size
+
+
+def download_url(url: str, dest_path: str = None) -> str:
+    """
+    Downloads `url` to a unique local file.
+
+    Large files on servers that accept byte ranges (S3, CloudFront) are fetched as parallel
+    range requests written at their offsets; anything else is one buffered stream.
+
+    Args:
+        url (str): File to fetch.
+        dest_path (str, optional): Where to write it; defaults to a unique path in temp_uploads.
+
+    Returns:
+        str: The local path.
+
+    Raises:
+        ValueError: The file is larger than MAX_DOWNLOAD_BYTES.
+    """
+    dest_path = dest_path or unique_download_path(url)
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+
+    start = time.monotonic()
+    info = probe(url)
+    if info["size"] is not None and info["size"] > MAX_DOWNLOAD_BYTES:
+        raise ValueError(f"Video is {info['size']} bytes; the limit is {MAX_DOWNLOAD_BYTES}")
+    ranged = info["ranges"] and info["size"] is not None and info["size"] >= RANGED_THRESHOLD
+    try:
+        if ranged:
+            try:
+                size = _fetch_ranged(url, dest_path, info["size"])
+            except Exception as e:
+                logger.warning(f"⚠️ Ranged download of {url} failed, falling back to one stream: {e}")
+                ranged = False
+        if not ranged:
+            size = _fetch_stream(url, dest_path)
+    except Exception:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+
+    seconds = time.monotonic() - start
+    mode = "ranged" if ranged else "stream"
+    metrics.observe("http_download_latency_sec", seconds, mode=mode)
+    metrics.increment("http_download_bytes_total", size, mode=mode)
+    logger.info(f"✅ Downloaded {size} bytes to {dest_path} ({mode}) in {seconds:.2f}s")
+    return dest_path
@@ -0,0 +1,430 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import logging
+import tempfile
+import threading
+import contextvars
+from contextlib import closing
+
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Background jobs: requests submit work and get a job id; a bounded pool of workers runs it.
+# Jobs live in SQLite, so they survive a restart and several processes can share one queue.
+JOBS_DIR = os.getenv("GYMVID_JOBS_DIR", os.path.join(tempfile.gettempdir(), "gymvid_jobs"))
+JOBS_DB = os.path.join(JOBS_DIR, "jobs.sqlite")
+JOBS_WORK_DIR = os.path.join(JOBS_DIR, "work")
+JOB_WORKERS = int(os.getenv("GYMVID_JOB_WORKERS", "2"))
+
+JOB_DEFAULT_MAX_ATTEMPTS = 2
+JOB_DEFAULT_TIMEOUT_SEC = float(os.getenv("GYMVID_JOB_TIMEOUT_SEC", "600"))
+JOB_RETRY_BACKOFF_SEC = 5.0
+
+# How long a request that waits for its job (e.g. /analyze/log_set with wait=true) holds on before
+# answering with the job id instead
+JOB_WAIT_SEC = float(os.getenv("GYMVID_JOB_WAIT_SEC", "300"))
+
+# A running job not heard from for its timeout plus this long belonged to a dead worker; it's run again
+# (or failed, once it has used up its attempts)
+JOB_LEASE_GRACE_SEC = 60
+# While a handler runs, its lease is refreshed this often, so a long stage is never mistaken for a dead worker
+JOB_HEARTBEAT_SEC = 15
+
+# Finished jobs are kept this long so clients can still poll them
+JOB_RECORD_TTL_SEC = 7 * 24 * 3600
+
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    state TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    files TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    timings TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    timeout_sec REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, next_attempt_at);
+"""
+
+_handlers = {}
+_schema_ready = False
+_schema_lock = threading.Lock()
+_wake = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobTimedOut(Exception):
+    pass
+
+
+class RetryableJobError(Exception):
+    """Raised by a handler for a transient failure (network, throttling); only these are retried."""
+
+
+def _init_db():
+    """Creates the jobs table and switches the database to WAL, once per process."""
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        with closing(sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        _schema_ready = True
+
+
+def _connect():
+    if not _schema_ready:
+        _init_db()
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def register(kind: str, handler, max_attempts: int = JOB_DEFAULT_MAX_ATTEMPTS, timeout_sec: float = JOB_DEFAULT_TIMEOUT_SEC):
+    """
+    Declares how jobs of `kind` run.
+
+    Args:
+        kind (str): Job type, e.g. "log_set".
+        handler: `handler(job: JobContext) -> dict`; its return value is stored as the job's result.
+        max_attempts (int): Runs allowed before a job that keeps raising RetryableJobError is marked failed.
+            Any other exception fails the job straight away.
+        timeout_sec (float): Budget per run, enforced between pipeline stages.
+    """
+    _handlers[kind] = {"handler": handler, "max_attempts": max_attempts, "timeout_sec": timeout_sec}
+
+
+def submit(kind: str, payload: dict, files: dict = None) -> str:
+    """
+    Queues a job.
+
+    Args:
+        kind (str): A registered job type.
+        payload (dict): JSON-serialisable arguments for the handler.
+        files (dict, optional): {name: path} of files the job needs (e.g. the uploaded video); they're
+            moved into the job's workspace, which is deleted once the job finishes.
+
+    Returns:
+        str: The job id.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    job_id = uuid.uuid4().hex
+    workspace = os.path.join(JOBS_WORK_DIR, job_id)
+    os.makedirs(workspace, exist_ok=True)
+    moved = {}
+    for name, path in (files or {}).items():
+        moved[name] = os.path.join(workspace, f"{name}{os.path.splitext(path)[-1]}")
+        shutil.move(path, moved[name])
+
+    spec = _handlers[kind]
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, state, payload, files, progress, max_attempts, timeout_sec, "
+            "created_at, updated_at, next_attempt_at) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), json.dumps(moved), json.dumps({"stage": "queued"}),
+             spec["max_attempts"], spec["timeout_sec"], now, now, now),
+        )
+    metrics.increment("jobs_submitted_total", kind=kind)
+    logger.info(f"📮 Queued {kind} job {job_id}")
+    ensure_workers()
+    _wake.set()
+    return job_id
+
+
+def _to_dict(row) -> dict:
+    return {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "state": row["state"],
+        "done": row["state"] in TERMINAL_STATES,
+        "progress": json.loads(row["progress"]) if row["progress"] else None,
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "timings": json.loads(row["timings"]) if row["timings"] else {},
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "cancel_requested": bool(row["cancel_requested"]),
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def get_job(job_id: str):
+    """A job's state, progress, timings and (once done) result or error; None if unknown."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _to_dict(row) if row else None
+
+
+def cancel(job_id: str):
+    """
+    Cancels a job. A queued job is cancelled at once; a running one stops before its next
+    pipeline stage. Returns the job, or None if unknown.
+    """
+    now = time.time()
+    with closing(_connect()) as conn:
+        cancelled = conn.execute(
+            "UPDATE jobs SET state = 'cancelled', finished_at = ?, updated_at = ? WHERE id = ? AND state = 'queued'",
+            (now, now, job_id),
+        ).rowcount
+        if not cancelled:
+            conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND state = 'running'",
+                         (now, job_id))
+    if cancelled:
+        _finish_files(job_id)
+        metrics.increment("jobs_finished_total", state="cancelled")
+    return get_job(job_id)
+
+
+def _finish_files(job_id: str):
+    shutil.rmtree(os.path.join(JOBS_WORK_DIR, job_id), ignore_errors=True)
+
+
+class JobContext:
+    """What a handler sees of its job: payload, files, and progress reporting that honours cancellation."""
+
+    def __init__(self, row):
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.payload = json.loads(row["payload"])
+        self.files = json.loads(row["files"])
+        self.attempt = row["attempts"]
+        self.timeout_sec = row["timeout_sec"]
+        self.started_at = time.time()
+        self.timings = {}
+
+    def check(self):
+        """Raises JobCancelled or JobTimedOut if the job should stop now."""
+        if time.time() - self.started_at > self.timeout_sec:
+            raise JobTimedOut(f"Job exceeded its {self.timeout_sec:.0f}s budget")
+        with closing(_connect()) as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.id,)).fetchone()
+        if row is None or row["cancel_requested"]:
+            raise JobCancelled("Job was cancelled")
+
+    def progress(self, stage: str, message: str = None):
+        """Records the current stage after checking for cancellation (the lease itself is kept by _heartbeat)."""
+        self.check()
+        with closing(_connect()) as conn:
+            conn.execute("UPDATE jobs SET progress = ?, timings = ?, updated_at = ? WHERE id = ?",
+                         (json.dumps({"stage": stage, "message": message}), json.dumps(self.timings), time.time(), self.id))
+
+    def _on_stage(self, stage: str, seconds):
+        if seconds is None:
+            self.progress(stage)
+        else:
+            self.timings[stage] = round(self.timings.get(stage, 0.0) + seconds, 3)
+
+
+def _fail_exhausted(conn, now: float):
+    """Fails stale running jobs that have no attempts left, instead of handing them to another worker."""
+    stale = conn.execute(
+        "SELECT id, kind FROM jobs WHERE state = 'running' AND updated_at <= ? - timeout_sec - ? AND attempts >= max_attempts",
+        (now, JOB_LEASE_GRACE_SEC),
+    ).fetchall()
+    for row in stale:
+        failed = conn.execute(
+            "UPDATE jobs SET state = 'failed', error = ?, progress = ?, finished_at = ?, updated_at = ? "
+            "WHERE id = ? AND state = 'running' AND updated_at <= ? - timeout_sec - ?",
+            ("The worker running this job stopped responding", json.dumps({"stage": "failed"}), now, now,
+             row["id"], now, JOB_LEASE_GRACE_SEC),
+        ).rowcount
+        if failed:
+            _finish_files(row["id"])
+            metrics.increment("jobs_finished_total", kind=row["kind"], state="failed")
+            logger.error(f"❌ {row['kind']} job {row['id']} failed: its worker stopped responding on the last attempt")
+
+
+def _claim(conn):
+    """Atomically takes the oldest due job (or one whose worker died), like the upload queue does."""
+    now = time.time()
+    _fail_exhausted(conn, now)
+    row = conn.execute(
+        "SELECT id FROM jobs WHERE (state = 'queued' AND next_attempt_at <= ?) "
+        "OR (state = 'running' AND updated_at <= ? - timeout_sec - ? AND attempts < max_attempts) "
+        "ORDER BY next_attempt_at LIMIT 1",
+        (now, now, JOB_LEASE_GRACE_SEC),
+    ).fetchone()
+    if row is None:
+        return None
+    claimed = conn.execute(
+        "UPDATE jobs SET state = 'running', attempts = attempts + 1, started_at = ?, updated_at = ?, progress = ? "
+        "WHERE id = ? AND (state = 'queued' OR (state = 'running' AND updated_at <= ? - timeout_sec - ? AND attempts < max_attempts))",
+        (now, now, json.dumps({"stage": "starting"}), row["id"], now, JOB_LEASE_GRACE_SEC),
+    ).rowcount
+    if not claimed:
+        return _claim(conn)
+    return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+
+def _heartbeat(job_id: str, stop: threading.Event):
+    """Refreshes a running job's lease until `stop` is set (runs beside the handler)."""
+    conn = None
+    while not stop.wait(JOB_HEARTBEAT_SEC):
+        try:
+            conn = conn or _connect()
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND state = 'running'", (time.time(), job_id))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Couldn't refresh the lease of job {job_id}: {e}")
+    if conn is not None:
+        conn.close()
+
+
+def _run(conn, row):
+    spec = _handlers.get(row["kind"])
+    job = JobContext(row)
+    metrics.observe("job_queue_wait_sec", job.started_at - row["created_at"], kind=row["kind"])
+    state, result, error = "succeeded", None, None
+    try:
+        if spec is None:
+            raise ValueError(f"No handler registered for job kind {row['kind']!r}")
+        job.check()
+
+        def run():
+            with metrics.listen_to_stages(job._on_stage):
+                return spec["handler"](job)
+
+        # A fresh context per job, so one job's request-scoped values never leak into the next
+        stop_heartbeat = threading.Event()
+        threading.Thread(target=_heartbeat, args=(row["id"], stop_heartbeat), name=f"job-heartbeat-{row['id'][:8]}",
+                         daemon=True).start()
+        try:
+            result = contextvars.Context().run(run)
+        finally:
+            stop_heartbeat.set()
+        result = json.dumps(result) if result is not None else None
+    except JobCancelled as e:
+        state, error = "cancelled", str(e)
+    except JobTimedOut as e:
+        state, error = "failed", str(e)
+    except RetryableJobError as e:
+        logger.error(f"❌ {row['kind']} job {row['id']} failed (attempt {row['attempts']}): {e}")
+        state, error = ("queued" if row["attempts"] < row["max_attempts"] else "failed"), str(e)
+    except Exception as e:
+        # Bad input or a pipeline error: running it again would only fail the same way
+        logger.error(f"❌ {row['kind']} job {row['id']} failed: {e}")
+        state, error, result = "failed", str(e), None
+
+    now = time.time()
+    job.timings["run_sec"] = round(now - job.started_at, 3)
+    job.timings["queued_sec"] = round(job.started_at - row["created_at"], 3)
+    if state == "queued":
+        delay = JOB_RETRY_BACKOFF_SEC * 2 ** (row["attempts"] - 1)
+        conn.execute(
+            "UPDATE jobs SET state = 'queued', error = ?, timings = ?, progress = ?, updated_at = ?, next_attempt_at = ? WHERE id = ?",
+            (error, json.dumps(job.timings), json.dumps({"stage": "retrying"}), now, now + delay, row["id"]),
+        )
+        metrics.increment("jobs_retried_total", kind=row["kind"])
+        logger.warning(f"⚠️ Retrying {row['kind']} job {row['id']} in {delay:.0f}s")
+        return
+
+    try:
+        conn.execute(
+            "UPDATE jobs SET state = ?, result = ?, error = ?, timings = ?, progress = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+            (state, result, error, json.dumps(job.timings), json.dumps({"stage": state}), now, now, row["id"]),
+        )
+    except sqlite3.Error as e:
+        # Never leave it 'running': the lease would expire and the whole job (and its save) would run again
+        logger.error(f"❌ Couldn't store the outcome of {row['kind']} job {row['id']}: {e}")
+        state = "failed"
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', result = NULL, error = ?, progress = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+            (f"Couldn't store the job's result: {e}", json.dumps({"stage": state}), now, now, row["id"]),
+        )
+    _finish_files(row["id"])
+    metrics.observe("job_run_sec", now - job.started_at, kind=row["kind"])
+    metrics.increment("jobs_finished_total", kind=row["kind"], state=state)
+    logger.info(f"✅ {row['kind']} job {row['id']} {state} in {now - job.started_at:.2f}s")
+
+
+def _prune(conn):
+    cutoff = time.time() - JOB_RECORD_TTL_SEC
+    for row in conn.execute("SELECT id FROM jobs WHERE state IN ('succeeded', 'failed', 'cancelled') AND updated_at < ?",
+                            (cutoff,)).fetchall():
+        _finish_files(row["id"])
+        conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+    depth = conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')").fetchone()[0]
+    metrics.set_gauge("job_queue_depth", depth)
+
+
+def _run_worker():
+    conn = _connect()
+    while True:
+        try:
+            row = _claim(conn)
+            if row is not None:
+                _run(conn, row)
+                continue
+            _prune(conn)
+        except Exception as e:
+            logger.error(f"❌ Job worker error: {e}")
+        _wake.wait(timeout=JOB_RETRY_BACKOFF_SEC)
+        _wake.clear()
+
+
+def ensure_workers():
+    """Starts the job workers on first use; they also pick up jobs left over from a previous run."""
+    _init_db()
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        while len(_workers) < JOB_WORKERS:
+            worker = threading.Thread(target=_run_worker, name=f"job-worker-{len(_workers)}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+async def wait_for(job_id: str, timeout: float = None, poll_sec: float = 0.25):
+    """Awaits a job reaching a final state without blocking the event loop. Returns the job (or None if unknown)."""
+    give_up_at = time.monotonic() + timeout if timeout else None
+    while True:
+        job = await asyncio.to_thread(get_job, job_id)
+        if job is None or job["done"]:
+            return job
+        if give_up_at and time.monotonic() >= give_up_at:
+            return job
+        await asyncio.sleep(poll_sec)
+
+
+async def watch(job_id: str, poll_sec: float = 0.5):
+    """Yields the job each time it changes, ending after its final state (used for SSE)."""
+    last_seen = None
+    while True:
+        job = await asyncio.to_thread(get_job, job_id)
+        if job is None:
+            return
+        if job["updated_at"] != last_seen:
+            last_seen = job["updated_at"]
+            yield job
+        if job["done"]:
+            return
+        await asyncio.sleep(poll_sec)
@@ -0,0 +1,128 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict, deque
+
+import numpy as np
+
+# ✅ Keep a bounded window of recent samples per series so percentiles track current behaviour
+MAX_SAMPLES = 2048
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+# ✅ Optional listener told when each timed pipeline stage starts and ends (background jobs use it for progress)
+_stage_listener = contextvars.ContextVar("gymvid_stage_listener", default=None)
+
+
+def _key(name, tags):
+    if not tags:
+        return name
+    labels = ",".join(f"{k}={tags[k]}" for k in sorted(tags))
+    return f"{name}{{{labels}}}"
+
+
+def increment(name, value=1, **tags):
+    """Adds `value` to a monotonically increasing counter."""
+    with _lock:
+        _counters[_key(name, tags)] += value
+
+
+def set_gauge(name, value, **tags):
+    """Records the current value of a gauge (e.g. a queue depth)."""
+    with _lock:
+        _gauges[_key(name, tags)] = value
+
+
+def observe(name, value, **tags):
+    """Records one sample (e.g. a latency in seconds) for percentile summaries."""
+    with _lock:
+        _samples[_key(name, tags)].append(float(value))
+
+
+@contextmanager
+def timer(name, **tags):
+    """Observes how long the `with` block took, in seconds (also when it raises)."""
+    listener = _stage_listener.get() if "stage" in tags else None
+    if listener:
+        listener(tags["stage"], None)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        seconds = time.monotonic() - start
+        observe(name, seconds, **tags)
+        if listener:
+            listener(tags["stage"], seconds)
+
+
+@contextmanager
+def listen_to_stages(callback):
+    """
+    Calls `callback(stage, None)` as each `timer(..., stage=...)` block in this context starts
+    and `callback(stage, seconds)` as it ends. Raising from the start call stops the pipeline
+    before that stage runs; the end call must not raise.
+    """
+    token = _stage_listener.set(callback)
+    try:
+        yield
+    finally:
+        _stage_listener.reset(token)
+
+
+def sample_count(name, **tags):
+    with _lock:
+        return len(_samples.get(_key(name, tags), ()))
+
+
+def percentile(name, q, default=None, **tags):
+    """Returns the q-th percentile of the recent samples, or `default` if there are none."""
+    with _lock:
+        values = list(_samples.get(_key(name, tags), ()))
+    if not values:
+        return default
+    return float(np.percentile(values, q))
+
+
+def get_counter(name, **tags):
+    with _lock:
+        return _counters.get(_key(name, tags), 0)
+
+
+def snapshot():
+    """
+    Returns every counter, gauge and sample summary recorded in this process.
+
+    Returns:
+        dict: {"counters": {...}, "gauges": {...}, "summaries": {key: {count, p50, p95, p99, max}}}
+    """
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples = {k: list(v) for k, v in _samples.items()}
+
+    summaries = {}
+    for key, values in samples.items():
+        if not values:
+            continue
+        arr = np.array(values)
+        summaries[key] = {
+            "count": len(values),
+            "p50": round(float(np.percentile(arr, 50)), 4),
+            "p95": round(float(np.percentile(arr, 95)), 4),
+            "p99": round(float(np.percentile(arr, 99)), 4),
+            "max": round(float(np.max(arr)), 4),
+        }
+
+    return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+
+def reset():
+    """Clears all recorded metrics (used by the dev harnesses between runs)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _samples.clear()
@@ -0,0 +1,134 @@
+import io
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from backend.utils import metrics
+from backend.utils.content_store import ContentItem, upload_content
+
+logger = logging.getLogger(__name__)
+
+# ✅ Avatars are served as small square variants instead of the original upload
+PROFILE_IMAGE_SIZES = tuple(int(size) for size in os.getenv("GYMVID_PROFILE_IMAGE_SIZES", "64,128,512").split(","))
+PROFILE_IMAGE_FORMATS = ("webp", "jpeg")
+PROFILE_IMAGE_QUALITY = {"webp": 80, "jpeg": 85}
+PROFILE_IMAGE_WORKERS = int(os.getenv("GYMVID_PROFILE_IMAGE_WORKERS", "4"))
+
+# Refuse images that would decode to more pixels than this (a 3MB PNG can still be huge)
+MAX_PROFILE_IMAGE_PIXELS = 40_000_000
+
+_CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+# Pillow releases the GIL while resampling and encoding, so variants render in parallel
+_pool = ThreadPoolExecutor(max_workers=PROFILE_IMAGE_WORKERS, thread_name_prefix="profile-image")
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def decode(content: bytes, max_side: int = None) -> Image.Image:
+    """
+    Decodes an upload and applies its EXIF orientation, so phone photos aren't sideways.
+    With `max_side`, JPEGs are decoded at a reduced DCT scale that still covers it, which
+    is several times faster than decoding all 12MP of a phone photo and shrinking it.
+    """
+    try:
+        image = Image.open(io.BytesIO(content))
+        if image.width * image.height > MAX_PROFILE_IMAGE_PIXELS:
+            raise InvalidImage(f"Image is too large ({image.width}x{image.height})")
+        if max_side and image.format == "JPEG":
+            image.draft("RGB", (max_side, max_side))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(f"Could not read image: {e}")
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white; JPEG has no alpha and avatars sit on light backgrounds
+        rgba = image.convert("RGBA")
+        flattened = Image.new("RGB", rgba.size, (255, 255, 255))
+        flattened.paste(rgba, mask=rgba.getchannel("A"))
+        return flattened
+    return image.convert("RGB")
+
+
+def square_crop(image: Image.Image, size: int) -> Image.Image:
+    """Centre-crops to a square of at most `size` pixels, the source for every variant."""
+    side = min(size, image.width, image.height)
+    return ImageOps.fit(image, (side, side), method=Image.Resampling.LANCZOS)
+
+
+def render_variant(image: Image.Image, size: int, fmt: str) -> bytes:
+    """Centre-crops to a square and encodes at `size` x `size`."""
+    square = image if image.size == (size, size) else ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        square.save(buffer, "JPEG", quality=PROFILE_IMAGE_QUALITY[fmt], optimize=True, progressive=True)
+    else:
+        square.save(buffer, "WEBP", quality=PROFILE_IMAGE_QUALITY[fmt], method=4)
+    return buffer.getvalue()
+
+
+def process_profile_image(content: bytes, user_id: str, content_type: str = "image/jpeg", ext: str = "jpg") -> dict:
+    """
+    Decodes a profile image, renders every size/format variant in parallel and uploads
+    them (plus the original) in parallel under content-addressed keys.
+
+    Args:
+        content (bytes): The uploaded image.
+        user_id (str): Owner, used for the logical names in the content index.
+        content_type (str): The upload's Content-Type (stored with the original).
+        ext (str): The upload's extension.
+
+    Returns:
+        dict: {"original_url", "variants": {"<size>": {"webp": url, "jpeg": url}}, "timings": {stage: seconds}}
+
+    Raises:
+        InvalidImage: The upload isn't a readable image.
+        IOError: No variant could be uploaded.
+    """
+    timings = {}
+    largest = max(PROFILE_IMAGE_SIZES)
+    start = time.monotonic()
+    # Decoded at up to 2x the largest variant, then cropped once; smaller sizes resample from that
+    image = square_crop(decode(content, max_side=largest * 2), largest)
+    timings["decode"] = time.monotonic() - start
+
+    start = time.monotonic()
+    jobs = [(size, fmt) for size in PROFILE_IMAGE_SIZES for fmt in PROFILE_IMAGE_FORMATS]
+    rendered = list(_pool.map(lambda job: render_variant(image, *job), jobs))
+    timings["resize"] = time.monotonic() - start
+
+    items = [
+        ContentItem(f"profile_images/{user_id}/{size}{_EXTENSIONS[fmt]}", "profile_images",
+                    data=data, content_type=_CONTENT_TYPES[fmt])
+        for (size, fmt), data in zip(jobs, rendered)
+    ]
+    items.append(ContentItem(f"profile_images/{user_id}/original.{ext}", "profile_images",
+                             data=content, content_type=content_type))
+
+    start = time.monotonic()
+    results = upload_content(items)
+    timings["upload"] = time.monotonic() - start
+
+    variants = {}
+    for (size, fmt), result in zip(jobs, results):
+        if result.ok:
+            variants.setdefault(str(size), {})[fmt] = result.url
+    if not variants:
+        raise IOError(f"Failed to upload profile image: {results[0].error}")
+
+    for stage, seconds in timings.items():
+        metrics.observe("profile_image_stage_sec", seconds, stage=stage)
+    metrics.increment("profile_image_variant_bytes_total", sum(len(data) for data in rendered))
+    logger.info(f"🖼️ Profile image for {user_id}: {len(rendered)} variants, "
+                + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items()))
+    return {
+        "original_url": results[-1].url if results[-1].ok else None,
+        "variants": variants,
+        "timings": timings,
+    }
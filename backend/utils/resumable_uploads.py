@@ -0,0 +1,335 @@
+import os
+import re
+import asyncio
+import json
+import time
+import uuid
+import base64
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+
+from backend.utils import metrics
+from backend.utils.upload_sink import SavedUpload, UploadRejected, sniff_container, MAX_VIDEO_UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+# ✅ Resumable uploads: the client sends the file as offset-addressed chunks and can pick up
+# where a dropped connection left off, instead of starting the whole video again
+RESUMABLE_DIR = os.getenv("GYMVID_RESUMABLE_DIR", os.path.join(tempfile.gettempdir(), "gymvid_resumable"))
+RESUMABLE_MAX_BYTES = int(os.getenv("GYMVID_RESUMABLE_MAX_BYTES", str(500 * 1024 * 1024)))
+RESUMABLE_MAX_CHUNK_BYTES = int(os.getenv("GYMVID_RESUMABLE_MAX_CHUNK_BYTES", str(32 * 1024 * 1024)))
+RESUMABLE_SUGGESTED_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Endpoints an upload can be declared for at creation, so their size limit applies before any bytes are sent
+UPLOAD_TARGET_MAX_BYTES = {
+    "feedback_upload": MAX_VIDEO_UPLOAD_BYTES,
+    "manual_log": RESUMABLE_MAX_BYTES,
+}
+
+# Uploads nobody has touched for this long are deleted, finished or not
+RESUMABLE_EXPIRY_SEC = int(os.getenv("GYMVID_RESUMABLE_EXPIRY_SEC", str(24 * 3600)))
+
+# Algorithms accepted in "Upload-Checksum: <algorithm> <base64 digest>"
+CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+_WRITE_BUFFER = 1024 * 1024
+
+
+class ChunkRejected(Exception):
+    """A PATCH that can't be applied; `status_code` follows the tus conventions."""
+
+    def __init__(self, message: str, error_type: str, status_code: int, offset: int = None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.status_code = status_code
+        self.offset = offset
+
+
+def _upload_dir(upload_id: str) -> str:
+    if not _UPLOAD_ID.match(upload_id or ""):
+        raise ChunkRejected("Unknown upload", "upload_not_found", 404)
+    return os.path.join(RESUMABLE_DIR, upload_id)
+
+
+def _read_info(upload_dir: str) -> dict:
+    try:
+        with open(os.path.join(upload_dir, "info.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise ChunkRejected("Unknown or expired upload", "upload_not_found", 404)
+
+
+def _write_info(upload_dir: str, info: dict):
+    tmp = os.path.join(upload_dir, "info.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(info, f)
+    os.replace(tmp, os.path.join(upload_dir, "info.json"))
+
+
+@contextmanager
+def _locked(upload_dir: str):
+    """Holds the upload's lock so two PATCHes (e.g. a retry racing the original) never interleave."""
+    try:
+        fd = os.open(os.path.join(upload_dir, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        raise ChunkRejected("Unknown or expired upload", "upload_not_found", 404)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkRejected("Another request is writing to this upload", "upload_locked", 409)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _offset(upload_dir: str) -> int:
+    try:
+        return os.path.getsize(os.path.join(upload_dir, "data"))
+    except OSError:
+        return 0
+
+
+def _public(info: dict, offset: int) -> dict:
+    return {
+        "upload_id": info["upload_id"],
+        "filename": info["filename"],
+        "size_bytes": info["size_bytes"],
+        "offset": offset,
+        "complete": info.get("complete", False),
+        "sha256": info.get("sha256"),
+        "container": info.get("container"),
+        "expires_at": info["updated_at"] + RESUMABLE_EXPIRY_SEC,
+    }
+
+
+def parse_checksum(header: str):
+    """Splits an Upload-Checksum header into (algorithm, raw digest); None if absent."""
+    if not header:
+        return None
+    try:
+        algorithm, encoded = header.strip().split(" ", 1)
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except ValueError:
+        raise ChunkRejected("Upload-Checksum must be '<algorithm> <base64 digest>'", "invalid_checksum", 400)
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ChunkRejected(f"Unsupported checksum algorithm {algorithm!r}", "invalid_checksum", 400)
+    return algorithm, digest
+
+
+def create_upload(user_id: str, filename: str, size_bytes: int, content_type: str = "video/mp4",
+                  sha256: str = None, max_bytes: int = RESUMABLE_MAX_BYTES, target: str = None) -> dict:
+    """
+    Registers a new resumable upload.
+
+    Args:
+        user_id (str): Owner; only they can later use the file for analysis.
+        filename (str): Original name (kept for the endpoints that store it).
+        size_bytes (int): Total length the client will send.
+        content_type (str): The video's Content-Type.
+        sha256 (str, optional): Hex digest of the whole file, checked once the last chunk lands.
+        max_bytes (int): Largest upload accepted.
+        target (str, optional): Endpoint the file is for (see UPLOAD_TARGET_MAX_BYTES); its limit applies too.
+
+    Returns:
+        dict: Upload state (upload_id, offset, size_bytes, complete, expires_at, ...).
+    """
+    if target is not None:
+        if target not in UPLOAD_TARGET_MAX_BYTES:
+            raise ChunkRejected(f"Unknown target {target!r}", "invalid_target", 400)
+        max_bytes = min(max_bytes, UPLOAD_TARGET_MAX_BYTES[target])
+    if size_bytes <= 0 or size_bytes > max_bytes:
+        raise ChunkRejected(f"Video must be under {max_bytes // (1024 * 1024)}MB", "file_too_large", 413)
+    expire_abandoned()
+
+    upload_id = uuid.uuid4().hex
+    upload_dir = os.path.join(RESUMABLE_DIR, upload_id)
+    os.makedirs(upload_dir)
+    open(os.path.join(upload_dir, "data"), "wb").close()
+    now = time.time()
+    info = {
+        "upload_id": upload_id,
+        "user_id": user_id,
+        "filename": os.path.basename(filename or "upload.mp4"),
+        "content_type": content_type,
+        "size_bytes": size_bytes,
+        "expected_sha256": (sha256 or "").lower() or None,
+        "target": target,
+        "complete": False,
+        "created_at": now,
+        "updated_at": now,
+    }
+    _write_info(upload_dir, info)
+    metrics.increment("resumable_uploads_created_total")
+    logger.info(f"📮 Created resumable upload {upload_id} ({size_bytes} bytes) for {user_id}")
+    return _public(info, 0)
+
+
+def get_upload(upload_id: str) -> dict:
+    """Current state of an upload; `offset` is where the client should resume from."""
+    upload_dir = _upload_dir(upload_id)
+    return _public(_read_info(upload_dir), _offset(upload_dir))
+
+
+async def write_chunk(upload_id: str, offset: int, chunks, checksum: str = None) -> dict:
+    """
+    Appends one PATCH body at `offset`.
+
+    The body is streamed to disk as it arrives. With a checksum, a chunk that doesn't
+    match (or doesn't arrive whole) is discarded; without one, whatever arrived before a
+    dropped connection is kept, so the client resumes from the last byte received.
+
+    Args:
+        upload_id (str): Upload to append to.
+        offset (int): The client's Upload-Offset; must equal the server's current offset.
+        chunks: Async iterator of the request body's bytes.
+        checksum (str, optional): Upload-Checksum header for this chunk.
+
+    Returns:
+        dict: Upload state after the write (complete once the last byte is in and verified).
+    """
+    upload_dir = _upload_dir(upload_id)
+    expected = parse_checksum(checksum)
+    with _locked(upload_dir):
+        info = _read_info(upload_dir)
+        current = _offset(upload_dir)
+        if info.get("complete"):
+            raise ChunkRejected("Upload is already complete", "upload_complete", 409, current)
+        if offset != current:
+            raise ChunkRejected(f"Upload-Offset {offset} doesn't match the server's offset {current}",
+                                "offset_mismatch", 409, current)
+
+        digest = hashlib.new(expected[0]) if expected else None
+        written = 0
+        data_path = os.path.join(upload_dir, "data")
+        with open(data_path, "r+b", buffering=_WRITE_BUFFER) as f:
+            f.seek(current)
+            try:
+                async for piece in chunks:
+                    if not piece:
+                        continue
+                    if written + len(piece) > RESUMABLE_MAX_CHUNK_BYTES or current + written + len(piece) > info["size_bytes"]:
+                        raise ChunkRejected("Chunk is larger than allowed", "chunk_too_large", 413, current)
+                    written += len(piece)
+                    if digest:
+                        digest.update(piece)
+                    f.write(piece)
+            except BaseException as e:
+                f.flush()
+                if expected or isinstance(e, ChunkRejected):
+                    f.truncate(current)
+                else:
+                    # Dropped connection: keep what arrived so the client can resume from it
+                    info["updated_at"] = time.time()
+                    _write_info(upload_dir, info)
+                raise
+            if digest and digest.digest() != expected[1]:
+                f.truncate(current)
+                metrics.increment("resumable_chunk_rejected_total", reason="checksum_mismatch")
+                raise ChunkRejected("Chunk checksum mismatch", "checksum_mismatch", 460, current)
+
+        new_offset = current + written
+        info["updated_at"] = time.time()
+        metrics.increment("resumable_chunk_bytes_total", written)
+        if new_offset == info["size_bytes"]:
+            # Re-reads the whole file (up to RESUMABLE_MAX_BYTES); keep it off the event loop
+            await asyncio.to_thread(_finish, upload_dir, info)
+        _write_info(upload_dir, info)
+        return _public(info, new_offset)
+
+
+def _finish(upload_dir: str, info: dict):
+    """Hashes and sniffs the assembled file; a file that fails either check is thrown away."""
+    data_path = os.path.join(upload_dir, "data")
+    digest = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        header = f.read(16)
+        f.seek(0)
+        for block in iter(lambda: f.read(_WRITE_BUFFER), b""):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+    container = sniff_container(header)
+
+    if info.get("expected_sha256") and info["expected_sha256"] != sha256:
+        open(data_path, "wb").close()
+        metrics.increment("resumable_uploads_failed_total", reason="checksum_mismatch")
+        raise ChunkRejected("Assembled file doesn't match the declared sha256; upload restarted from 0",
+                            "checksum_mismatch", 460, 0)
+    if container is None:
+        open(data_path, "wb").close()
+        metrics.increment("resumable_uploads_failed_total", reason="unsupported_format")
+        raise ChunkRejected("Upload is not a supported video (expected MP4, MOV, WebM or AVI)",
+                            "unsupported_format", 415, 0)
+
+    info.update({"complete": True, "sha256": sha256, "container": container})
+    metrics.increment("resumable_uploads_completed_total")
+    metrics.observe("resumable_upload_duration_sec", time.time() - info["created_at"])
+    logger.info(f"✅ Resumable upload {info['upload_id']} complete ({info['size_bytes']} bytes, {container})")
+
+
+def delete_upload(upload_id: str) -> bool:
+    """Abandons an upload and frees its space."""
+    upload_dir = _upload_dir(upload_id)
+    if not os.path.isdir(upload_dir):
+        return False
+    shutil.rmtree(upload_dir, ignore_errors=True)
+    return True
+
+
+def claim_upload(upload_id: str, dest_path: str, user_id: str = None, max_bytes: int = None) -> SavedUpload:
+    """
+    Moves a completed upload into a request's workspace so it can be analysed as if it
+    had just been posted. The upload is consumed: it can't be claimed twice. One that is
+    over `max_bytes` is left in place and rejected.
+
+    Raises:
+        UploadRejected: error_type "upload_not_found", "upload_incomplete" or "file_too_large".
+    """
+    try:
+        upload_dir = _upload_dir(upload_id)
+        with _locked(upload_dir):
+            info = _read_info(upload_dir)
+            if user_id and info.get("user_id") and info["user_id"] != user_id:
+                raise ChunkRejected("Unknown upload", "upload_not_found", 404)
+            if not info.get("complete"):
+                raise UploadRejected(
+                    f"Upload is incomplete ({_offset(upload_dir)} of {info['size_bytes']} bytes)", "upload_incomplete"
+                )
+            if max_bytes is not None and info["size_bytes"] > max_bytes:
+                raise UploadRejected(f"Upload is {info['size_bytes']} bytes; the limit is {max_bytes}", "file_too_large")
+            os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+            shutil.move(os.path.join(upload_dir, "data"), dest_path)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+    except ChunkRejected as e:
+        raise UploadRejected(str(e), e.error_type)
+
+    metrics.increment("resumable_uploads_claimed_total")
+    return SavedUpload(dest_path, info["size_bytes"], info["sha256"], info["container"],
+                       filename=info["filename"], content_type=info["content_type"])
+
+
+def expire_abandoned() -> int:
+    """Deletes uploads idle for longer than RESUMABLE_EXPIRY_SEC. Returns how many were removed."""
+    if not os.path.isdir(RESUMABLE_DIR):
+        return 0
+    cutoff = time.time() - RESUMABLE_EXPIRY_SEC
+    removed = 0
+    for upload_id in os.listdir(RESUMABLE_DIR):
+        upload_dir = os.path.join(RESUMABLE_DIR, upload_id)
+        try:
+            updated_at = os.path.getmtime(os.path.join(upload_dir, "info.json"))
+        except OSError:
+            updated_at = os.path.getmtime(upload_dir)
+        if updated_at < cutoff:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            removed += 1
+    if removed:
+        metrics.increment("resumable_uploads_expired_total", removed)
+        logger.info(f"🧹 Expired {removed} abandoned resumable upload(s)")
+    return removed
@@ -0,0 +1,127 @@
+import os
+import math
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.utils import metrics
+from backend.utils.s3_uploads import S3_BUCKET, VIDEO_TRANSFER_CONFIG, get_client
+
+logger = logging.getLogger(__name__)
+
+# ✅ Direct-to-bucket uploads: the phone PUTs to presigned URLs, the API only signs them
+PRESIGN_EXPIRES_SEC = int(os.getenv("GYMVID_PRESIGN_EXPIRES_SEC", "3600"))
+DIRECT_UPLOAD_PREFIX = "uploads/"
+MAX_DIRECT_UPLOAD_BYTES = int(os.getenv("GYMVID_MAX_DIRECT_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+# Same part size as server-side video uploads; S3 allows at most 10,000 parts
+MULTIPART_THRESHOLD = VIDEO_TRANSFER_CONFIG.multipart_threshold
+MULTIPART_PART_SIZE = VIDEO_TRANSFER_CONFIG.multipart_chunksize
+
+# ✅ Ranged downloads for processing: parts fetched in parallel and written at their offsets
+DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+DOWNLOAD_WORKERS = int(os.getenv("GYMVID_S3_DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_READ_SIZE = 1024 * 1024
+
+
+def presign_put(s3_key: str, content_type: str, size_bytes: int) -> str:
+    """URL the client PUTs the whole object to (it must send the same Content-Type and exactly `size_bytes`)."""
+    return get_client().generate_presigned_url(
+        "put_object",
+        Params={"Bucket": S3_BUCKET, "Key": s3_key, "ContentType": content_type, "ContentLength": size_bytes},
+        ExpiresIn=PRESIGN_EXPIRES_SEC,
+    )
+
+
+def start_multipart(s3_key: str, content_type: str, size_bytes: int) -> dict:
+    """
+    Starts a multipart upload and presigns one URL per part, each bound to that part's length.
+
+    Returns:
+        dict: {"upload_id", "part_size", "parts": [{"part_number", "url"}]}
+    """
+    client = get_client()
+    upload_id = client.create_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, ContentType=content_type)["UploadId"]
+    part_count = max(1, math.ceil(size_bytes / MULTIPART_PART_SIZE))
+    parts = [
+        {
+            "part_number": number,
+            "url": client.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": S3_BUCKET, "Key": s3_key, "UploadId": upload_id, "PartNumber": number,
+                        "ContentLength": min(MULTIPART_PART_SIZE, size_bytes - (number - 1) * MULTIPART_PART_SIZE)},
+                ExpiresIn=PRESIGN_EXPIRES_SEC,
+            ),
+        }
+        for number in range(1, part_count + 1)
+    ]
+    return {"upload_id": upload_id, "part_size": MULTIPART_PART_SIZE, "parts": parts}
+
+
+def complete_multipart(s3_key: str, upload_id: str, parts: list):
+    """Assembles the uploaded parts. `parts` is [{"part_number", "etag"}] as the client saw them."""
+    get_client().complete_multipart_upload(
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": [
+            {"PartNumber": int(part["part_number"]), "ETag": part["etag"]}
+            for part in sorted(parts, key=lambda p: int(p["part_number"]))
+        ]},
+    )
+
+
+def abort_multipart(s3_key: str, upload_id: str):
+    get_client().abort_multipart_upload(Bucket=S3_BUCKET, Key=s3_key, UploadId=upload_id)
+
+
+def object_size(s3_key: str):
+    """Size of an object in bytes, or None if it doesn't exist."""
+    try:
+        return get_client().head_object(Bucket=S3_BUCKET, Key=s3_key)["ContentLength"]
+    except Exception:
+        return None
+
+
+def _download_range(s3_key: str, fd: int, start: int, end: int):
+    body = get_client().get_object(Bucket=S3_BUCKET, Key=s3_key, Range=f"bytes={start}-{end}")["Body"]
+    offset = start
+    for chunk in body.iter_chunks(DOWNLOAD_READ_SIZE):
+        os.pwrite(fd, chunk, offset)
+        offset += len(chunk)
+    if offset != end + 1:
+        raise IOError(f"Short read for bytes {start}-{end} of {s3_key}: got {offset - start} bytes")
+
+
+def download_ranged(s3_key: str, dest_path: str, size_bytes: int = None) -> str:
+    """
+    Streams an object to `dest_path` as parallel ranged GETs written at their offsets,
+    so no part is ever held in memory beyond one read buffer.
+
+    Returns:
+        str: `dest_path`.
+    """
+    size_bytes = size_bytes if size_bytes is not None else object_size(s3_key)
+    if size_bytes is None:
+        raise FileNotFoundError(f"s3://{S3_BUCKET}/{s3_key} does not exist")
+
+    start_time = time.monotonic()
+    ranges = [(start, min(start + DOWNLOAD_PART_SIZE, size_bytes) - 1) for start in range(0, size_bytes, DOWNLOAD_PART_SIZE)]
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, size_bytes)
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, max(1, len(ranges)))) as pool:
+            for future in [pool.submit(_download_range, s3_key, fd, start, end) for start, end in ranges]:
+                future.result()
+    except Exception:
+        os.close(fd)
+        os.remove(dest_path)
+        raise
+    os.close(fd)
+
+    seconds = time.monotonic() - start_time
+    metrics.observe("s3_download_latency_sec", seconds)
+    metrics.increment("s3_download_bytes_total", size_bytes)
+    logger.info(f"✅ Downloaded s3://{S3_BUCKET}/{s3_key} ({size_bytes} bytes, {len(ranges)} ranges) in {seconds:.2f}s")
+    return dest_path
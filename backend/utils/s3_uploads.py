@@ -0,0 +1,237 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Bucket settings (S3_ENDPOINT_URL points at an S3-compatible stand-in such as MinIO or moto)
+AWS_REGION = os.getenv("AWS_REGION")
+S3_BUCKET = os.getenv("S3_BUCKET_NAME")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+# ✅ One connection pool shared by every upload; sized for a few requests' parallel uploads
+UPLOAD_POOL_SIZE = int(os.getenv("GYMVID_S3_POOL_SIZE", "32"))
+UPLOAD_WORKERS = int(os.getenv("GYMVID_S3_UPLOAD_WORKERS", "8"))
+
+# Every S3 call gets botocore's standard retries (throttling, 5xx, connection errors); uploads
+# also retry the whole object here, with jittered backoff, so one flaky PUT doesn't fail a request
+S3_CLIENT_MAX_ATTEMPTS = int(os.getenv("GYMVID_S3_CLIENT_ATTEMPTS", "3"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("GYMVID_S3_UPLOAD_ATTEMPTS", "4"))
+UPLOAD_BACKOFF_SEC = 0.25
+UPLOAD_MAX_BACKOFF_SEC = 4.0
+
+# ✅ Content-addressed objects never change, so clients and CDNs may cache them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+KNOWN_KEYS_MAX = 10000
+
+# ✅ Videos: multipart above 16MB, 16MB parts sent 8 at a time
+VIDEO_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+_client = None
+_client_lock = threading.Lock()
+_known_keys = OrderedDict()
+_known_keys_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="s3-upload")
+
+
+def get_client():
+    """The process-wide S3 client (boto3 clients are thread-safe)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client(
+                "s3",
+                region_name=AWS_REGION,
+                endpoint_url=S3_ENDPOINT_URL,
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                config=Config(
+                    max_pool_connections=UPLOAD_POOL_SIZE,
+                    retries={"mode": "standard", "total_max_attempts": S3_CLIENT_MAX_ATTEMPTS},
+                    connect_timeout=5,
+                    read_timeout=60,
+                    tcp_keepalive=True,
+                    # SigV4 presigned URLs sign Content-Length, so a direct upload can't exceed what was declared
+                    signature_version="s3v4",
+                    s3={"addressing_style": "path"} if S3_ENDPOINT_URL else None,
+                ),
+            )
+        return _client
+
+
+def object_url(s3_key: str, bucket: str = None) -> str:
+    """Public URL of an object, in the same form the app has always stored."""
+    bucket = bucket or S3_BUCKET
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{bucket}/{s3_key}"
+    return f"https://{bucket}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+
+
+class UploadItem:
+    """
+    One object to upload, from memory (`data`) or from disk (`path`).
+
+    Args:
+        s3_key (str): Destination key.
+        data (bytes, optional): In-memory payload (e.g. an encoded collage).
+        path (str, optional): Local file to upload (e.g. a video); uses the multipart transfer config.
+        content_type (str): Content-Type stored with the object.
+        immutable (bool): The key is derived from the content (see content_store), so the upload
+            is skipped if the object already exists and it's stored with a cache-forever header.
+    """
+
+    def __init__(self, s3_key: str, data: bytes = None, path: str = None, content_type: str = "image/jpeg",
+                 immutable: bool = False):
+        if (data is None) == (path is None):
+            raise ValueError("UploadItem needs exactly one of data or path")
+        self.s3_key = s3_key
+        self.data = data
+        self.path = path
+        self.content_type = content_type
+        self.immutable = immutable
+
+    @property
+    def kind(self) -> str:
+        return "file" if self.path else "bytes"
+
+    @property
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.path) if self.path else len(self.data)
+
+
+class UploadResult:
+    def __init__(self, item: UploadItem, url: str = None, error: str = None, seconds: float = 0.0, attempts: int = 0,
+                 skipped: bool = False):
+        self.item = item
+        self.url = url
+        self.error = error
+        self.seconds = seconds
+        self.attempts = attempts
+        self.skipped = skipped
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> dict:
+        return {
+            "s3_key": self.item.s3_key,
+            "url": self.url,
+            "ok": self.ok,
+            "error": self.error,
+            "seconds": round(self.seconds, 3),
+            "attempts": self.attempts,
+            "skipped": self.skipped,
+        }
+
+
+def _remember(s3_key: str):
+    with _known_keys_lock:
+        _known_keys[s3_key] = True
+        _known_keys.move_to_end(s3_key)
+        while len(_known_keys) > KNOWN_KEYS_MAX:
+            _known_keys.popitem(last=False)
+
+
+def object_exists(s3_key: str) -> bool:
+    """
+    Whether an object is already in the bucket. Keys seen to exist are remembered, so
+    repeat checks for content-addressed objects (which never change) cost no request.
+    """
+    with _known_keys_lock:
+        if s3_key in _known_keys:
+            return True
+    try:
+        get_client().head_object(Bucket=S3_BUCKET, Key=s3_key)
+    except Exception:
+        return False
+    _remember(s3_key)
+    return True
+
+
+def _send(item: UploadItem):
+    client = get_client()
+    extra_args = {"ContentType": item.content_type}
+    if item.immutable:
+        extra_args["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+    if item.path:
+        client.upload_file(
+            Filename=item.path,
+            Bucket=S3_BUCKET,
+            Key=item.s3_key,
+            ExtraArgs=extra_args,
+            Config=VIDEO_TRANSFER_CONFIG,
+        )
+    else:
+        client.put_object(Bucket=S3_BUCKET, Key=item.s3_key, Body=item.data, **extra_args)
+    if item.immutable:
+        _remember(item.s3_key)
+
+
+def upload_one(item: UploadItem) -> UploadResult:
+    """Uploads one object, retrying with jittered exponential backoff. Never raises."""
+    start = time.monotonic()
+    if item.immutable and S3_BUCKET and object_exists(item.s3_key):
+        metrics.increment("s3_upload_skipped_total", kind=item.kind)
+        metrics.increment("s3_upload_skipped_bytes_total", item.size_bytes, kind=item.kind)
+        logger.info(f"♻️ s3://{S3_BUCKET}/{item.s3_key} already exists, skipping upload")
+        return UploadResult(item, url=object_url(item.s3_key), seconds=time.monotonic() - start, skipped=True)
+
+    error = None
+    for attempt in range(1, UPLOAD_MAX_ATTEMPTS + 1):
+        try:
+            if not S3_BUCKET:
+                raise ValueError("S3_BUCKET_NAME environment variable not set")
+            _send(item)
+            seconds = time.monotonic() - start
+            metrics.observe("s3_upload_latency_sec", seconds, kind=item.kind)
+            metrics.increment("s3_upload_bytes_total", item.size_bytes, kind=item.kind)
+            if attempt > 1:
+                metrics.increment("s3_upload_retried_total", kind=item.kind)
+            logger.info(f"✅ Uploaded s3://{S3_BUCKET}/{item.s3_key} in {seconds:.2f}s")
+            return UploadResult(item, url=object_url(item.s3_key), seconds=seconds, attempts=attempt)
+        except (ValueError, FileNotFoundError) as e:
+            error = str(e)
+            break
+        except Exception as e:
+            error = str(e)
+            if attempt < UPLOAD_MAX_ATTEMPTS:
+                delay = min(UPLOAD_MAX_BACKOFF_SEC, UPLOAD_BACKOFF_SEC * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                logger.warning(f"⚠️ Upload of {item.s3_key} failed (attempt {attempt}), retrying in {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    metrics.increment("s3_upload_failures_total", kind=item.kind)
+    logger.error(f"❌ Upload of {item.s3_key} failed: {error}")
+    return UploadResult(item, error=error, seconds=time.monotonic() - start, attempts=attempt)
+
+
+def upload_many(items: list) -> list:
+    """
+    Uploads several objects in parallel over the shared connection pool.
+
+    One failed object doesn't stop the others; check each result's `ok`.
+
+    Returns:
+        list: UploadResult per item, in the same order.
+    """
+    if len(items) <= 1:
+        return [upload_one(item) for item in items]
+    start = time.monotonic()
+    results = list(_pool.map(upload_one, items))
+    metrics.observe("s3_upload_batch_sec", time.monotonic() - start)
+    return results
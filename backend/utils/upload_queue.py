@@ -0,0 +1,212 @@
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+from contextlib import closing
+
+from backend.utils import metrics
+from backend.utils.s3_uploads import UploadItem, upload_one, object_url
+
+logger = logging.getLogger(__name__)
+
+# ✅ Write-behind uploads: the request hands a file over and responds; a worker uploads it
+UPLOAD_QUEUE_DIR = os.getenv("GYMVID_UPLOAD_QUEUE_DIR", os.path.join(tempfile.gettempdir(), "gymvid_upload_queue"))
+UPLOAD_QUEUE_DB = os.path.join(UPLOAD_QUEUE_DIR, "uploads.sqlite")
+UPLOAD_SPOOL_DIR = os.path.join(UPLOAD_QUEUE_DIR, "spool")
+UPLOAD_QUEUE_WORKERS = int(os.getenv("GYMVID_UPLOAD_QUEUE_WORKERS", "2"))
+
+# upload_one already retries a few times; these are retries of the whole upload, spread out further
+UPLOAD_QUEUE_MAX_ATTEMPTS = int(os.getenv("GYMVID_UPLOAD_QUEUE_MAX_ATTEMPTS", "8"))
+UPLOAD_QUEUE_BACKOFF_SEC = 5.0
+UPLOAD_QUEUE_MAX_BACKOFF_SEC = 600.0
+
+# An upload claimed longer ago than this belonged to a worker that died; it's handed out again
+UPLOAD_LEASE_SEC = 15 * 60
+
+# Finished uploads are kept this long so clients can still poll them
+UPLOAD_RECORD_TTL_SEC = 7 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    s3_key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    bytes INTEGER,
+    immutable INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_due ON uploads (state, next_attempt_at);
+"""
+
+_wake = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def _connect():
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    conn = sqlite3.connect(UPLOAD_QUEUE_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(uploads)")}
+    if "immutable" not in columns:
+        # Queues created before content-addressed uploads
+        conn.execute("ALTER TABLE uploads ADD COLUMN immutable INTEGER NOT NULL DEFAULT 0")
+    return conn
+
+
+def _spool(path: str, s3_key: str) -> str:
+    """Moves the file somewhere it survives the request's cleanup."""
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    spooled = os.path.join(UPLOAD_SPOOL_DIR, s3_key.replace("/", "__"))
+    shutil.move(path, spooled)
+    return spooled
+
+
+def enqueue_upload(path: str, s3_key: str, content_type: str = "application/octet-stream", immutable: bool = False) -> str:
+    """
+    Takes ownership of `path` and uploads it to `s3_key` in the background.
+
+    The file is moved into the queue's spool directory, so the caller can go on cleaning
+    up its temp folder. Enqueuing the same key again replaces the pending upload.
+
+    Args:
+        path (str): Local file to upload.
+        s3_key (str): Destination key.
+        content_type (str): Content-Type stored with the object.
+        immutable (bool): Content-addressed key; skipped if already stored, cached forever (see UploadItem).
+
+    Returns:
+        str: The object's final URL (valid once the upload state is "uploaded").
+    """
+    spooled = _spool(path, s3_key)
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO uploads (s3_key, path, content_type, state, attempts, last_error, bytes, "
+            "immutable, created_at, updated_at, next_attempt_at) VALUES (?, ?, ?, 'pending', 0, NULL, ?, ?, ?, ?, ?)",
+            (s3_key, spooled, content_type, os.path.getsize(spooled), int(immutable), now, now, now),
+        )
+    metrics.increment("upload_queue_enqueued_total")
+    logger.info(f"📮 Queued upload of {s3_key}")
+    ensure_workers()
+    _wake.set()
+    return object_url(s3_key)
+
+
+def upload_status(s3_key: str):
+    """State of a queued upload ("pending", "uploading", "uploaded" or "failed"), or None if unknown."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM uploads WHERE s3_key = ?", (s3_key,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "s3_key": row["s3_key"],
+        "url": object_url(row["s3_key"]),
+        "state": row["state"],
+        "ready": row["state"] == "uploaded",
+        "attempts": row["attempts"],
+        "error": row["last_error"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def _claim(conn):
+    """Atomically takes the oldest due upload, so several workers (or processes) never share one."""
+    now = time.time()
+    row = conn.execute(
+        "SELECT s3_key FROM uploads WHERE (state = 'pending' AND next_attempt_at <= ?) "
+        "OR (state = 'uploading' AND updated_at <= ?) ORDER BY next_attempt_at LIMIT 1",
+        (now, now - UPLOAD_LEASE_SEC),
+    ).fetchone()
+    if row is None:
+        return None
+    claimed = conn.execute(
+        "UPDATE uploads SET state = 'uploading', attempts = attempts + 1, updated_at = ? "
+        "WHERE s3_key = ? AND (state = 'pending' OR (state = 'uploading' AND updated_at <= ?))",
+        (now, row["s3_key"], now - UPLOAD_LEASE_SEC),
+    ).rowcount
+    if not claimed:
+        return _claim(conn)
+    return conn.execute("SELECT * FROM uploads WHERE s3_key = ?", (row["s3_key"],)).fetchone()
+
+
+def _process(conn, row):
+    result = upload_one(UploadItem(row["s3_key"], path=row["path"], content_type=row["content_type"],
+                                   immutable=bool(row["immutable"])))
+    now = time.time()
+    if result.ok:
+        conn.execute("UPDATE uploads SET state = 'uploaded', last_error = NULL, updated_at = ? WHERE s3_key = ?",
+                     (now, row["s3_key"]))
+        if os.path.exists(row["path"]):
+            os.remove(row["path"])
+        metrics.observe("upload_queue_delay_sec", now - row["created_at"])
+        metrics.increment("upload_queue_uploaded_total")
+        return
+
+    if row["attempts"] >= UPLOAD_QUEUE_MAX_ATTEMPTS:
+        conn.execute("UPDATE uploads SET state = 'failed', last_error = ?, updated_at = ? WHERE s3_key = ?",
+                     (result.error, now, row["s3_key"]))
+        metrics.increment("upload_queue_failed_total")
+        logger.error(f"❌ Giving up on upload of {row['s3_key']} after {row['attempts']} attempts: {result.error}")
+        return
+
+    delay = min(UPLOAD_QUEUE_MAX_BACKOFF_SEC, UPLOAD_QUEUE_BACKOFF_SEC * 2 ** (row["attempts"] - 1))
+    conn.execute(
+        "UPDATE uploads SET state = 'pending', last_error = ?, updated_at = ?, next_attempt_at = ? WHERE s3_key = ?",
+        (result.error, now, now + delay, row["s3_key"]),
+    )
+    logger.warning(f"⚠️ Upload of {row['s3_key']} failed, retrying in {delay:.0f}s: {result.error}")
+
+
+def _prune(conn):
+    conn.execute("DELETE FROM uploads WHERE state = 'uploaded' AND updated_at < ?", (time.time() - UPLOAD_RECORD_TTL_SEC,))
+    depth = conn.execute("SELECT COUNT(*) FROM uploads WHERE state IN ('pending', 'uploading')").fetchone()[0]
+    metrics.set_gauge("upload_queue_depth", depth)
+
+
+def _run_worker():
+    conn = _connect()
+    while True:
+        try:
+            row = _claim(conn)
+            if row is not None:
+                _process(conn, row)
+                continue
+            _prune(conn)
+        except Exception as e:
+            logger.error(f"❌ Upload worker error: {e}")
+        _wake.wait(timeout=UPLOAD_QUEUE_BACKOFF_SEC)
+        _wake.clear()
+
+
+def ensure_workers():
+    """Starts the upload workers on first use; they also pick up uploads left over from a previous run."""
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        while len(_workers) < UPLOAD_QUEUE_WORKERS:
+            worker = threading.Thread(target=_run_worker, name=f"upload-queue-{len(_workers)}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def drain(timeout: float = 60.0) -> bool:
+    """Waits until nothing is pending or uploading (used by tests and on shutdown)."""
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        with closing(_connect()) as conn:
+            busy = conn.execute("SELECT COUNT(*) FROM uploads WHERE state IN ('pending', 'uploading')").fetchone()[0]
+        if not busy:
+            return True
+        _wake.set()
+        time.sleep(0.1)
+    return False
@@ -0,0 +1,126 @@
+import os
+import time
+import hashlib
+import logging
+
+from backend.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ✅ Uploads are copied to disk one chunk at a time, so a request holds at most one chunk in memory
+UPLOAD_CHUNK_SIZE = int(os.getenv("GYMVID_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_VIDEO_UPLOAD_BYTES = int(os.getenv("GYMVID_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+
+# Enough of the file to recognise its container
+_HEADER_BYTES = 16
+
+
+class UploadRejected(Exception):
+    """The upload was refused part-way through; `error_type` matches the endpoints' error responses."""
+
+    def __init__(self, message: str, error_type: str):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+class SavedUpload:
+    """
+    An upload written to disk.
+
+    Args:
+        path (str): Where the file was written.
+        size (int): Bytes written.
+        sha256 (str): Hex digest of the whole file, computed while writing.
+        container (str): Sniffed container ("mp4", "mov", "webm", "avi") or None if unrecognised.
+        filename (str, optional): Name the client gave the file.
+        content_type (str, optional): Content-Type the client gave the file.
+    """
+
+    def __init__(self, path: str, size: int, sha256: str, container: str = None,
+                 filename: str = None, content_type: str = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.container = container
+        self.filename = filename
+        self.content_type = content_type
+
+
+def sniff_container(header: bytes):
+    """Names the video container from the first bytes of a file, or returns None."""
+    if len(header) >= 12 and header[4:8] == b"ftyp":
+        return "mov" if header[8:12] == b"qt  " else "mp4"
+    if len(header) >= 8 and header[4:8] in (b"moov", b"mdat", b"wide", b"free", b"skip"):
+        # Older QuickTime files start straight with an atom other than ftyp
+        return "mov"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if len(header) >= 12 and header[:4] == b"RIFF" and header[8:12] == b"AVI ":
+        return "avi"
+    return None
+
+
+async def save_upload(upload, dest_path: str, max_bytes: int, require_video: bool = True,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE) -> SavedUpload:
+    """
+    Streams a FastAPI UploadFile to `dest_path`, hashing it and checking the size as it goes.
+
+    Args:
+        upload (UploadFile): The request's file.
+        dest_path (str): Where to write it (its directory is created if needed).
+        max_bytes (int): Uploads larger than this are refused as soon as they pass it.
+        require_video (bool): Refuse files whose header isn't a known video container.
+        chunk_size (int): Bytes read and written per step.
+
+    Returns:
+        SavedUpload: path, size, sha256 and container of the written file.
+
+    Raises:
+        UploadRejected: error_type "file_too_large", "empty_file" or "unsupported_format";
+            nothing is left at `dest_path`.
+    """
+    declared_size = getattr(upload, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        metrics.increment("upload_rejected_total", reason="file_too_large")
+        raise UploadRejected(f"Upload is {declared_size} bytes; the limit is {max_bytes}", "file_too_large")
+
+    start = time.monotonic()
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(f"Upload passed the {max_bytes} byte limit", "file_too_large")
+                if len(header) < _HEADER_BYTES:
+                    header += chunk[:_HEADER_BYTES - len(header)]
+                    if len(header) >= _HEADER_BYTES and require_video and sniff_container(header) is None:
+                        raise UploadRejected("Upload is not a supported video (expected MP4, MOV, WebM or AVI)", "unsupported_format")
+                digest.update(chunk)
+                f.write(chunk)
+
+        if size == 0:
+            raise UploadRejected("Uploaded video file is empty", "empty_file")
+        container = sniff_container(header)
+        if require_video and container is None:
+            raise UploadRejected("Upload is not a supported video (expected MP4, MOV, WebM or AVI)", "unsupported_format")
+    except BaseException as e:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        if isinstance(e, UploadRejected):
+            metrics.increment("upload_rejected_total", reason=e.error_type)
+            logger.warning(f"⚠️ Rejected upload {getattr(upload, 'filename', '')!r} after {size} bytes: {e}")
+        raise
+
+    seconds = time.monotonic() - start
+    metrics.observe("upload_save_sec", seconds)
+    metrics.increment("upload_bytes_total", size)
+    logger.info(f"📥 Saved upload to {dest_path} ({size} bytes, {container or 'unknown'}) in {seconds:.2f}s")
+    return SavedUpload(dest_path, size, digest.hexdigest(), container,
+                       filename=getattr(upload, "filename", None), content_type=getattr(upload, "content_type", None))
@@ -7,27 +7,36 @@ from dotenv import load_dotenv
 from pydantic import BaseModel
 import os
 import shutil
-import subprocess
-import json
-import re
 import time
+import uuid
+import asyncio
 
 # ✅ Import utils and AI modules
 from backend.utils.aws_utils import download_file_from_s3
-from backend.utils.save_set_to_supabase import save_set_to_supabase
 from backend.api.manual_log import router as manual_log_router
 from backend.api.upload_profile_image import router as profile_image_router
 from backend.api.onboarding import router as onboarding_router
 from backend.api.check_username import router as check_username_router
+from backend.api.upload_status import router as upload_status_router
+from backend.api.direct_upload import router as direct_upload_router
+from backend.api.resumable_upload import router as resumable_upload_router
+from backend.api.jobs import router as jobs_router
 from backend.api.quick_analysis import app as quick_analysis_app
 from backend.ai.analyze.feedback_upload import router as feedback_upload_router
 from backend.ai.analyze import quick_exercise_prediction
 from backend.utils.download_from_s3 import download_video_from_url
-from backend.ai.analyze.video_analysis import analyze_video
+from backend.utils.upload_sink import save_upload, UploadRejected, MAX_VIDEO_UPLOAD_BYTES
+from backend.ai.analyze import cpu_pool, set_workers
 from backend.ai.analyze.rep_detection import run_rep_detection_from_landmark_y
 from backend.ai.analyze.keyframe_exporter import export_keyframes
 from backend.ai.analyze.coaching_feedback import generate_feedback
-from backend.ai.analyze import analyze_set
+from backend.ai.analyze.deadline import RequestDeadline
+from backend.ai.analyze.gpt_schemas import track_submission
+from backend.ai.analyze import model_usage
+from backend.ai.analyze.llm_scheduler import scheduler as llm_scheduler
+from backend.utils import metrics
+from backend.utils import upload_queue, resumable_uploads, job_queue
+from backend.ai.analyze import set_jobs  # registers the log_set job handler
 from backend.ai.analyze.quick_exercise_prediction import app as quick_exercise_prediction_router
 
 # ✅ Load environment variables
@@ -54,6 +63,16 @@ async def log_requests(request: Request, call_next):
     print(f"🌐 Request processed in {process_time:.2f}s - Status: {response.status_code}")
     return response
 
+# ✅ Finish any background uploads and jobs left over from before a restart, drop abandoned resumable uploads
+# and warm the CPU and set workers so the first video doesn't pay for loading MediaPipe
+@app.on_event("startup")
+def start_upload_workers():
+    upload_queue.ensure_workers()
+    job_queue.ensure_workers()
+    resumable_uploads.expire_abandoned()
+    cpu_pool.start()
+    set_workers.start()
+
 # ✅ Global error handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -91,6 +110,10 @@ app.include_router(manual_log_router)
 app.include_router(profile_image_router)
 app.include_router(onboarding_router)
 app.include_router(check_username_router)
+app.include_router(upload_status_router)
+app.include_router(direct_upload_router)
+app.include_router(resumable_upload_router)
+app.include_router(jobs_router)
 # app.include_router(quick_analysis_app, prefix="/analyze")  # REMOVED: Conflicts with newer implementation
 app.include_router(feedback_upload_router, prefix="/analyze")
 app.include_router(quick_exercise_prediction_router, prefix="/analyze")
@@ -105,28 +128,45 @@ print("📍 Quick exercise prediction also available at: /analyze/quick_exercise
 async def log_set(
     video: UploadFile = File(...),
     user_provided_exercise: str = Form(None),
-    known_exercise_info: str = Form(None)
+    known_exercise_info: str = Form(None),
+    wait: bool = Form(True)
 ):
+    """
+    Analyses and saves a set. The pipeline runs as a background job on a bounded worker pool,
+    so it never blocks the event loop. With wait=false the job id is returned straight away;
+    poll /jobs/{job_id} or stream /jobs/{job_id}/events for progress and the result.
+    """
     os.makedirs("temp_uploads", exist_ok=True)
-    temp_video_path = f"temp_uploads/{video.filename}"
+    temp_video_path = f"temp_uploads/{uuid.uuid4().hex}_{os.path.basename(video.filename)}"
     with open(temp_video_path, "wb") as buffer:
         shutil.copyfileobj(video.file, buffer)
 
-    try:
-        args = [temp_video_path]
-        if user_provided_exercise:
-            args.append(user_provided_exercise)
-        if known_exercise_info:
-            args.append(known_exercise_info)
+    job_id = await asyncio.to_thread(job_queue.submit, "log_set", {
+        "endpoint": "log_set",
+        "user_provided_exercise": user_provided_exercise,
+        "known_exercise_info": known_exercise_info,
+    }, files={"video": temp_video_path})
 
-        final_result = analyze_set.run_cli_args(args)
-        save_set_to_supabase(final_result)
-        return JSONResponse({"success": True, "data": final_result})
-    finally:
-        if os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
+    if not wait:
+        return JSONResponse(status_code=202, content={
+            "success": True, "job_id": job_id, "status": "queued",
+            "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"
+        })
+
+    job = await job_queue.wait_for(job_id, timeout=job_queue.JOB_WAIT_SEC)
+    if not job["done"]:
+        # Still queued or running: hand back the job id rather than holding the request open
+        return JSONResponse(status_code=202, content={
+            "success": True, "job_id": job_id, "status": job["state"],
+            "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"
+        })
+    if job["state"] != "succeeded":
+        return JSONResponse(status_code=500, content={
+            "success": False, "error": job["error"] or f"Job {job['state']}", "error_type": "analysis_failed", "job_id": job_id
+        })
+    return JSONResponse({"success": True, "data": job["result"], "job_id": job_id})
 
-# ✅ Legacy subprocess route
+# ✅ Legacy set route (isolated worker processes)
 @app.post("/process_set")
 async def process_set(
     video: UploadFile = File(None),
@@ -135,41 +175,30 @@ async def process_set(
 ):
     os.makedirs("temp_uploads", exist_ok=True)
     if s3_key:
-        save_path = f"temp_uploads/{os.path.basename(s3_key)}"
+        save_path = f"temp_uploads/{uuid.uuid4().hex}_{os.path.basename(s3_key)}"
         success = download_file_from_s3(s3_key, save_path)
         if not success:
             return JSONResponse(status_code=500, content={"success": False, "error": "Failed to download video from S3"})
     elif video:
-        save_path = f"temp_uploads/{video.filename}"
+        save_path = f"temp_uploads/{uuid.uuid4().hex}_{os.path.basename(video.filename)}"
         with open(save_path, "wb") as buffer:
             shutil.copyfileobj(video.file, buffer)
     else:
         return JSONResponse(status_code=400, content={"success": False, "error": "No video or S3 key provided"})
 
-    env = os.environ.copy()
-    env["GYMVID_MODE"] = "subprocess"
-    env["GYMVID_COACHING"] = "true" if coaching else "false"
-    env["PYTHONPATH"] = os.path.abspath(".")
-
+    # ✅ Runs on a pre-started set worker process (see set_workers) rather than a fresh interpreter
     try:
-        result = subprocess.run(
-            ["python", "backend/ai/analyze/analyze_set.py", save_path],
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env
-        )
-        try:
-            match = re.search(r"({.*})", result.stdout.strip(), re.DOTALL)
-            if match:
-                output = json.loads(match.group(1))
-                return JSONResponse({"success": True, "data": output, "stderr": result.stderr})
-            else:
-                raise ValueError("No valid JSON found in output.")
-        except Exception as e:
-            return JSONResponse({"success": False, "error": f"Failed to parse JSON: {str(e)}", "stdout": result.stdout, "stderr": result.stderr})
-    except subprocess.CalledProcessError as e:
-        return JSONResponse(status_code=500, content={"success": False, "error": f"Subprocess failed with exit code {e.returncode}", "stdout": e.stdout, "stderr": e.stderr})
+        output = await asyncio.to_thread(set_workers.run_set, [save_path], coaching)
+        return JSONResponse({"success": True, "data": output})
+    except set_workers.SetWorkerError as e:
+        status_code = {"worker_busy": 503, "timeout": 504}.get(e.error_type, 500)
+        content = {"success": False, "error": str(e), "error_type": e.error_type}
+        if e.detail:
+            content["stderr"] = e.detail
+        return JSONResponse(status_code=status_code, content=content)
+    finally:
+        if os.path.exists(save_path):
+            os.remove(save_path)
 
 # ✅ Coaching Feedback from video URL
 class FeedbackRequest(BaseModel):
@@ -179,18 +208,27 @@ class FeedbackRequest(BaseModel):
 
 @app.post("/analyze/feedback")
 async def analyze_feedback(request: FeedbackRequest):
+    deadline = RequestDeadline(stages=["coaching_feedback"])
+    model_usage.set_request("feedback", request.user_id)
+    local_path = None
     try:
-        local_path = download_video_from_url(request.video_url)
-        video_data = analyze_video(local_path)
+        # The ranged download blocks for the whole transfer, so it runs off the event loop
+        local_path = await asyncio.to_thread(download_video_from_url, request.video_url)
+        video_data = await cpu_pool.analyze_video_async(local_path)
         rep_data = run_rep_detection_from_landmark_y(video_data["raw_y"], video_data["fps"])
-        export_keyframes(local_path, rep_data)
-        feedback = generate_feedback(
+        await cpu_pool.run_async(export_keyframes, local_path, rep_data)
+        feedback = await asyncio.to_thread(
+            generate_feedback,
             video_path=local_path,
             user_id=request.user_id,
             video_data={"predicted_exercise": request.movement},
-            rep_data=rep_data
+            rep_data=rep_data,
+            deadline=deadline
         )
         return {"success": True, "feedback": feedback}
+    except cpu_pool.CpuPoolBusy as busy:
+        return JSONResponse(status_code=503, headers={"Retry-After": "10"},
+                            content={"success": False, "error": str(busy), "error_type": "server_busy"})
     except Exception as e:
         return {
             "success": False,
@@ -204,6 +242,10 @@ async def analyze_feedback(request: FeedbackRequest):
                 "summary": f"👉 Error: {str(e)}"
             }
         }
+    finally:
+        # Downloads get unique names now, so nothing else would ever overwrite or clean them up
+        if local_path and os.path.exists(local_path):
+            os.remove(local_path)
 
 # ✅ Coaching Feedback from uploaded file
 @app.post("/analyze/feedback-file")
@@ -211,22 +253,32 @@ async def analyze_feedback_file(
     movement: str = Form(...),
     file: UploadFile = File(...)
 ):
-    os.makedirs("temp_uploads", exist_ok=True)
-    temp_path = f"temp_uploads/{file.filename}"
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    deadline = RequestDeadline(stages=["coaching_feedback"])
+    # Unique name per request, so concurrent uploads of "video.mp4" can't overwrite each other
+    temp_path = f"temp_uploads/{uuid.uuid4().hex}_{os.path.basename(file.filename or 'upload.mp4')}"
+    try:
+        saved = await save_upload(file, temp_path, MAX_VIDEO_UPLOAD_BYTES)
+    except UploadRejected as rejected:
+        return {"success": False, "error": str(rejected), "error_type": rejected.error_type}
+    track_submission(temp_path, "feedback_file", fingerprint=saved.sha256)
+    model_usage.set_request("feedback_file")
 
     try:
-        video_data = analyze_video(temp_path)
+        video_data = await cpu_pool.analyze_video_async(temp_path)
         rep_data = run_rep_detection_from_landmark_y(video_data["raw_y"], video_data["fps"])
-        export_keyframes(temp_path, rep_data)
-        feedback = generate_feedback(
+        await cpu_pool.run_async(export_keyframes, temp_path, rep_data)
+        feedback = await asyncio.to_thread(
+            generate_feedback,
             video_path=temp_path,
             user_id="anonymous",
             video_data={"predicted_exercise": movement},
-            rep_data=rep_data
+            rep_data=rep_data,
+            deadline=deadline
         )
         return {"success": True, "feedback": feedback}
+    except cpu_pool.CpuPoolBusy as busy:
+        return JSONResponse(status_code=503, headers={"Retry-After": "10"},
+                            content={"success": False, "error": str(busy), "error_type": "server_busy"})
     except Exception as e:
         return {
             "success": False,
@@ -268,6 +320,21 @@ def debug_env():
         "model": os.getenv("GYMVID_AI_MODEL", "gpt-4o"),
     }
 
+# ✅ In-process metrics (model latency, hedging, deadlines)
+@app.get("/debug/metrics")
+def debug_metrics():
+    return metrics.snapshot()
+
+# ✅ Model token usage and estimated cost, rolled up per day by stage, endpoint, model and user
+@app.get("/debug/usage")
+def debug_usage(days: int = 7, top_users: int = 20):
+    return model_usage.daily_rollups(days=days, top_users=top_users)
+
+# ✅ LLM scheduler state (per-lane queue depth, remaining quota, 429 pause)
+@app.get("/debug/llm_scheduler")
+def debug_llm_scheduler():
+    return llm_scheduler.status()
+
 # ✅ Test endpoint for quick exercise prediction
 @app.post("/test-quick-prediction")
 async def test_quick_prediction():